@@ -0,0 +1,71 @@
+"""
+Conditional GET (ETag / Last-Modified) cho các trang nội dung ít thay đổi
+- Mỗi view khai báo 1 hàm version(request, ...) chỉ đọc version của nội dung (1 câu SQL nhỏ)
+- Trùng ETag -> trả 304 ngay, không truy vấn thêm và không render template
+- ETag gồm cả phần phụ thuộc người xem trong base.html (username, avatar, CSRF token)
+  và bản deploy (RELEASE_VERSION, hash manifest static) -> deploy template / CSS / JS mới thì ETag cũ hết hiệu lực
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+
+def viewer_fingerprint(request):
+    """
+    Phần của trang phụ thuộc người xem. None nếu còn thông báo (messages) chưa hiển thị
+    -> trang phải render lại để hiện thông báo.
+    """
+    if len(get_messages(request)):
+        return None
+    user = request.user
+    avatar = user.avatar.name if user.is_authenticated and user.avatar else ''
+    return (user.pk, user.get_username(), avatar, request.META.get('CSRF_COOKIE', ''))
+
+
+def deploy_version():
+    """
+    Phần của trang phụ thuộc bản deploy: template có thể đổi mà nội dung DB không đổi.
+    manifest_hash chỉ có khi dùng ManifestStaticFilesStorage (deploy), đổi khi CSS / JS đổi.
+    """
+    return settings.RELEASE_VERSION, getattr(staticfiles_storage, 'manifest_hash', '')
+
+
+def conditional_page(version_func):
+    """
+    version_func(request, *args, **kwargs) -> (etag_parts, last_modified) hoặc None (không có nội dung -> render bình thường).
+    last_modified = None: trang có phần riêng của user không có mốc thời gian -> chỉ dùng ETag.
+    """
+    def decorator(view):
+        def get_version(request, *args, **kwargs):
+            # condition() gọi cả etag_func và last_modified_func -> chỉ đọc version 1 lần
+            if not hasattr(request, '_content_version'):
+                request._content_version = version_func(request, *args, **kwargs)
+            return request._content_version
+
+        def etag_func(request, *args, **kwargs):
+            version = get_version(request, *args, **kwargs)
+            fingerprint = viewer_fingerprint(request)
+            if version is None or fingerprint is None:
+                return None
+            parts, _ = version
+            return hashlib.md5(
+                repr((view.__name__, parts, fingerprint, deploy_version())).encode('utf-8')
+            ).hexdigest()
+
+        def last_modified_func(request, *args, **kwargs):
+            version = get_version(request, *args, **kwargs)
+            if version is None or viewer_fingerprint(request) is None:
+                return None
+            return version[1]
+
+        # no-cache: trình duyệt luôn hỏi lại server (nhận 304), private: không lưu ở cache dùng chung
+        conditional_view = cache_control(private=True, no_cache=True)(
+            condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        )
+        return wraps(view)(conditional_view)
+    return decorator
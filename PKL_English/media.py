@@ -0,0 +1,216 @@
+"""
+Phục vụ file media (audio từ vựng, ảnh topic, file ghi âm) khi deploy, thay cho static() chỉ chạy lúc DEBUG
+- Hỗ trợ Range (1 đoạn -> 206, nhiều đoạn -> multipart/byteranges), If-Range: tua audio, mobile tải từng phần
+- ETag + Last-Modified theo (kích thước, mtime) của file, Cache-Control theo loại file
+- Không đọc file vào Python:
+    + Có nginx phía trước (settings.MEDIA_ACCEL_REDIRECT): trả X-Accel-Redirect, nginx tự gửi file (sendfile)
+    + Không có: FileResponse -> wsgi.file_wrapper của server WSGI (gunicorn dùng os.sendfile,
+      với 1 đoạn Range cũng gửi đúng đoạn đó vì file đã seek tới đầu đoạn + Content-Length = độ dài đoạn)
+- Kiểm tra quyền (vd file ghi âm chỉ chủ sở hữu xem được) làm ở view gọi serve_file()
+"""
+import io
+import mimetypes
+import os
+import secrets
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Nhiều hơn số đoạn này (sau khi gộp đoạn chồng nhau) thì bỏ qua Range, trả cả file
+MAX_RANGES = 16
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+# --- 1. RANGE ---
+def parse_range_header(header, size):
+    """
+    Đọc header Range ("bytes=0-99,200-", "bytes=-500"...)
+    Trả về None: bỏ qua Range (không có / sai cú pháp / quá nhiều đoạn) -> trả cả file
+           []: không đoạn nào nằm trong file -> 416
+           [(start, end), ...]: các đoạn (end tính cả), đã sắp xếp + gộp đoạn chồng nhau
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+
+    ranges = []
+    for spec in header[len('bytes='):].split(','):
+        first, sep, last = spec.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if not first:
+                # bytes=-N: N byte cuối
+                length = int(last)
+                if length > 0 and size > 0:
+                    ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start < size:
+            ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged if len(merged) <= MAX_RANGES else None
+
+
+class RangeFile:
+    """
+    File chỉ đọc được đoạn [start, end]. Vẫn có fileno() để wsgi.file_wrapper gửi bằng sendfile
+    (offset = vị trí hiện tại của file, số byte = Content-Length do FileResponse tính từ seek/tell)
+    """
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.name = file.name
+        self.start = start
+        self.end = end + 1
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            position = self.end + offset
+        elif whence == io.SEEK_CUR:
+            position = self.file.tell() + offset
+        else:
+            position = offset
+        return self.file.seek(min(max(position, self.start), self.end))
+
+    def read(self, size=-1):
+        remaining = self.end - self.file.tell()
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self.file.read(max(size, 0))
+
+    def close(self):
+        self.file.close()
+
+
+def _multipart_ranges(path, ranges, size, content_type):
+    """Body multipart/byteranges (nhiều đoạn không gửi được bằng sendfile -> đọc từng khối)"""
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+         f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    length = sum(len(h) for h in part_headers) + sum(end - start + 1 for start, end in ranges) + len(closing)
+
+    def body():
+        with open(path, 'rb') as f:
+            for header, (start, end) in zip(part_headers, ranges):
+                yield header
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(STREAM_BLOCK_SIZE, remaining))
+                    if not chunk:
+                        return
+                    remaining -= len(chunk)
+                    yield chunk
+        yield closing
+
+    response = StreamingHttpResponse(body(), status=206,
+                                     content_type=f'multipart/byteranges; boundary={boundary}')
+    response['Content-Length'] = length
+    return response
+
+
+# --- 2. GỬI FILE ---
+def _accel_prefix(root):
+    # settings.MEDIA_ACCEL_REDIRECT: {'media': '/internal/media/', 'recordings': '/internal/recordings/'}
+    return getattr(settings, 'MEDIA_ACCEL_REDIRECT', {}).get(root)
+
+
+def serve_file(request, path, root, relative_path, cache_control):
+    """
+    Trả file path (đã kiểm tra quyền) hỗ trợ conditional GET + Range.
+    root / relative_path: dùng tạo X-Accel-Redirect khi có nginx; cache_control: giá trị header Cache-Control
+    """
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("File không tồn tại")
+    if not os.path.isfile(path):
+        raise Http404("File không tồn tại")
+
+    size = stat.st_size
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = int(stat.st_mtime)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = cache_control
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    accel_prefix = _accel_prefix(root)
+    if accel_prefix:
+        # nginx tự xử lý Range / If-None-Match và gửi file bằng sendfile
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix + quote(relative_path)
+        response['Cache-Control'] = cache_control
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finish(not_modified)
+
+    # If-Range: file đã đổi so với bản client đang có -> bỏ qua Range, gửi cả file
+    ranges = parse_range_header(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if ranges is not None and if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        ranges = None
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return finish(response)
+
+    if ranges is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = FileResponse(RangeFile(open(path, 'rb'), start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = _multipart_ranges(path, ranges, size, content_type)
+    return finish(response)
+
+
+# --- 3. VIEW MEDIA CÔNG KHAI ---
+@require_safe
+def serve_media(request, path):
+    """
+    File trong MEDIA_ROOT (audio từ vựng, ảnh topic, avatar): ai cũng xem được.
+    File ghi âm nằm ngoài MEDIA_ROOT, chỉ phục vụ qua speaking.views.recording (kiểm tra chủ sở hữu)
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File không tồn tại")
+    cache_seconds = getattr(settings, 'MEDIA_CACHE_SECONDS', 7 * 24 * 3600)
+    return serve_file(request, full_path, 'media', path, f'public, max-age={cache_seconds}')
@@ -95,6 +95,14 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite: chạy test khi không có MySQL (python manage.py test).
+# Service dùng SQL thuần của MySQL -> các test đó tự bỏ qua, chỉ chạy test không cần MySQL
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -159,6 +167,25 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+# Thư mục collectstatic gom file để web server phục vụ (khi deploy)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Deploy (DEBUG = False): collectstatic đặt tên file theo hash nội dung + ghi sẵn bản .gz/.br
+# -> web server cache vĩnh viễn (Cache-Control: immutable). Dev: phục vụ file gốc trong static/
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'PKL_English.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+# Mã bản deploy (vd git commit), là một phần ETag của trang (PKL_English.conditional):
+# deploy template mới thì trình duyệt không nhận 304 cho trang cũ
+RELEASE_VERSION = os.getenv('RELEASE_VERSION', '')
 AUTH_USER_MODEL = 'users.User'
 
 
@@ -169,9 +196,57 @@ LOGIN_URL = 'login'
 
 MEDIA_URL = '/media/'  
 MEDIA_ROOT = BASE_DIR / 'media'
+# Media phục vụ qua PKL_English.media (Range + ETag); thời gian cache của audio/ảnh công khai
+MEDIA_CACHE_SECONDS = 7 * 24 * 3600
+# Có nginx phía trước: đường dẫn location internal cho X-Accel-Redirect, nginx tự gửi file bằng sendfile
+# vd {'media': '/internal/media/', 'recordings': '/internal/recordings/'}; để trống: Django tự gửi file
+MEDIA_ACCEL_REDIRECT = {}
 
-# Folder riêng cho file tạm (ghi âm) - không serve qua web
+# Folder riêng cho file tạm (ghi âm) - không serve trực tiếp (file ghi âm chỉ qua speaking.views.recording)
 TEMP_ROOT = BASE_DIR / 'temp'
 
+# Ghi log học tập (StudyLog) theo lô: đệm trong bộ nhớ + file spool dự phòng
+STUDYLOG_SPOOL_DIR = TEMP_ROOT / 'studylog_spool'
+STUDYLOG_BUFFER_SIZE = 100      # Đủ bao nhiêu log thì ghi
+STUDYLOG_FLUSH_SECONDS = 5      # Hoặc sau bao nhiêu giây
+STUDYLOG_SPOOL_FSYNC = False    # True: fsync mỗi lần ghi spool (an toàn cả khi mất điện)
+
+# Lưu trữ log cũ ra file nén (lệnh archive_studylogs), mỗi user mỗi tháng 1 file
+STUDYLOG_ARCHIVE_DIR = BASE_DIR / 'archive' / 'studylog'
+STUDYLOG_RETENTION_DAYS = 180   # Log cũ hơn số ngày này được chuyển ra file
+
+# Chấm đáp án chấp nhận lỗi gõ nhẹ + chỉ mục từ dễ nhầm (đáp án nhiễu)
+STUDY_TYPO_TOLERANCE = 1                # Số ký tự được gõ sai (0: phải đúng tuyệt đối)
+STUDY_TYPO_MIN_LENGTH = 5               # Chỉ áp dụng cho từ dài ít nhất 5 ký tự
+
+# Phiên học (bộ thẻ xếp sẵn) không hoạt động quá số giờ này thì xếp bộ mới; lệnh expire_study_sessions dọn phiên cũ
+STUDY_SESSION_EXPIRE_HOURS = 24
+
+# FFmpeg: chuyển mã audio từ vựng (Opus / MP3) + chuyển file ghi âm sang PCM cho Azure
+# Không đặt biến môi trường: dùng ffmpeg.exe ở thư mục gốc dự án (Windows) nếu có, không thì ffmpeg trong PATH
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY') or (
+    str(BASE_DIR / 'ffmpeg.exe') if (BASE_DIR / 'ffmpeg.exe').exists() else 'ffmpeg'
+)
+STUDY_AUDIO_LOUDNESS = -16              # Độ to chuẩn (LUFS) của mọi file sau chuyển mã
+
+# Snapshot nội dung (Topic + Vocabulary) dùng chung giữa các worker qua mmap, tạo lại khi admin sửa nội dung
+STUDY_CONTENT_SNAPSHOT_PATH = TEMP_ROOT / 'content' / 'snapshot.bin'
+STUDY_CONTENT_VERSION_CHECK_SECONDS = 5     # Chu kỳ so version snapshot với version trong DB (máy chủ khác / sửa bằng SQL)
+
+# Chấm phát âm chạy nền: mỗi process web có 1 pool thread giới hạn, đầy thì báo bận (503)
+SPEAKING_ASSESSMENT_WORKERS = 4         # Số bài chấm cùng lúc mỗi process
+SPEAKING_ASSESSMENT_QUEUE_SIZE = 32     # Số bài được chờ thêm mỗi process
+SPEAKING_JOB_STALE_SECONDS = 300        # Job không đổi trạng thái quá lâu -> lệnh process_pronunciation_jobs chấm lại
+SPEAKING_AUDIO_CONVERT_PROCESSES = None # Số ffmpeg chuyển file ghi âm chạy cùng lúc mỗi process (None: nửa số CPU)
+# Cache kết quả chấm theo nội dung audio + câu mẫu (nộp lại cùng bài không gọi Azure lần nữa)
+SPEAKING_RESULT_CACHE_SIZE = 10000      # Số kết quả tối đa, đầy thì xóa kết quả lâu không dùng nhất
+SPEAKING_RESULT_CACHE_DAYS = 30         # Kết quả chấm quá số ngày này thì chấm lại
+# Backend chấm phát âm: Azure (mặc định) hoặc backend giả chạy trong process (chạy thử / đo tải, không cần key)
+SPEAKING_SCORING_BACKEND = os.getenv(
+    'SPEAKING_SCORING_BACKEND', 'speaking.services.scoring_backends.AzureScoringBackend'
+)
+# Backend giả (LocalScoringBackend): độ trễ trung bình ± dao động (ms), tỉ lệ lỗi (0-1)
+SPEAKING_LOCAL_SCORING = {'latency_ms': 800, 'jitter_ms': 300, 'error_rate': 0.0}
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Storage cho static khi deploy (collectstatic)
+- Tên file có mã hash nội dung (ManifestStaticFilesStorage): style.css -> style.3f2a9c1b.css,
+  template dùng {% static %} sẽ trỏ tới tên đã hash -> cache vĩnh viễn (immutable) được
+- Ghi sẵn bản nén .gz và .br cạnh mỗi file text, web server gửi thẳng file nén
+  (nginx: gzip_static on; brotli_static on;) không phải nén lại mỗi request
+
+Thư viện brotli là tùy chọn: chưa cài thì chỉ tạo bản .gz.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    # Chỉ nén file dạng text (ảnh, font woff2... đã nén sẵn)
+    COMPRESS_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml')
+    # File nhỏ hơn ngưỡng này nén không lợi (header gzip + 1 lần giải nén)
+    MIN_COMPRESS_SIZE = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        # hashed_files: tên gốc -> tên đã hash (chỉ nén bản hash, template chỉ dùng bản này)
+        for name, hashed_name in self.hashed_files.items():
+            if not hashed_name.endswith(self.COMPRESS_EXTENSIONS):
+                continue
+            for compressed_name in self._write_compressed(hashed_name):
+                yield name, compressed_name, True
+
+    def _write_compressed(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < self.MIN_COMPRESS_SIZE:
+            return
+
+        # mtime=0: cùng nội dung -> cùng file .gz (build lại không đổi file)
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content, quality=11)))
+
+        for suffix, compressed in variants:
+            # Nén không nhỏ hơn bản gốc thì bỏ (server sẽ gửi bản gốc)
+            if len(compressed) >= len(content):
+                continue
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            yield compressed_name
@@ -0,0 +1,189 @@
+"""
+Kiểm tra phục vụ file media (Range / If-Range / 416 / conditional GET) và trang có ETag (conditional_page)
+Không dùng SQL riêng của MySQL: chạy được trên DB test mặc định.
+"""
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from study.models import Topic
+
+from .media import MAX_RANGES, parse_range_header, serve_file
+
+CONTENT = bytes(range(256)) * 4  # 1024 byte
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+
+    def test_no_or_invalid_header(self):
+        for header in (None, '', 'items=0-1', 'bytes=abc', 'bytes=5-1', 'bytes=0'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 100))
+
+    def test_single_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-9', 100), [(0, 9)])
+        self.assertEqual(parse_range_header('bytes=90-', 100), [(90, 99)])
+        # Đoạn vượt quá cuối file bị cắt lại
+        self.assertEqual(parse_range_header('bytes=50-500', 100), [(50, 99)])
+        self.assertEqual(parse_range_header('bytes=-10', 100), [(90, 99)])
+        self.assertEqual(parse_range_header('bytes=-500', 100), [(0, 99)])
+
+    def test_merges_overlapping_ranges(self):
+        self.assertEqual(parse_range_header('bytes=20-29, 0-9,5-15', 100), [(0, 15), (20, 29)])
+        # Đoạn liền nhau cũng gộp
+        self.assertEqual(parse_range_header('bytes=0-9,10-19', 100), [(0, 19)])
+
+    def test_unsatisfiable(self):
+        self.assertEqual(parse_range_header('bytes=100-', 100), [])
+        self.assertEqual(parse_range_header('bytes=-0', 100), [])
+        self.assertEqual(parse_range_header('bytes=0-', 0), [])
+
+    def test_too_many_ranges(self):
+        header = 'bytes=' + ','.join(f'{i * 10}-{i * 10}' for i in range(MAX_RANGES + 1))
+        self.assertIsNone(parse_range_header(header, 1000))
+
+
+class ServeFileTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'word.mp3')
+        with open(self.path, 'wb') as f:
+            f.write(CONTENT)
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        request = self.factory.get('/media/word.mp3', headers=headers)
+        return serve_file(request, self.path, 'media', 'word.mp3', 'public, max-age=60')
+
+    def body(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_full_file(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_single_range(self):
+        response = self.serve(range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(self.body(response), CONTENT[100:200])
+
+    def test_multiple_ranges(self):
+        response = self.serve(range='bytes=0-9,500-509')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = self.body(response)
+        self.assertEqual(len(body), int(response['Content-Length']))
+        self.assertIn(b'Content-Range: bytes 0-9/1024\r\n\r\n' + CONTENT[:10], body)
+        self.assertIn(b'Content-Range: bytes 500-509/1024\r\n\r\n' + CONTENT[500:510], body)
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(range='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_if_range(self):
+        etag = self.serve()['ETag']
+        # Cùng bản -> gửi đoạn; bản cũ (ETag / ngày khác) -> gửi cả file
+        self.assertEqual(self.serve(range='bytes=0-9', if_range=etag).status_code, 206)
+        response = self.serve(range='bytes=0-9', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(self.serve(range='bytes=0-9', if_range=http_date(0)).status_code, 200)
+
+    def test_not_modified(self):
+        response = self.serve()
+        self.assertEqual(self.serve(if_none_match=response['ETag']).status_code, 304)
+        self.assertEqual(self.serve(if_modified_since=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.serve(if_none_match='"stale"').status_code, 200)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT={'media': '/internal/media/'})
+    def test_accel_redirect(self):
+        response = self.serve(range='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/media/word.mp3')
+        self.assertEqual(response.content, b'')
+
+
+class ServeMediaTests(SimpleTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, 'vocab_audio'))
+        with open(os.path.join(media_root, 'vocab_audio', 'word.mp3'), 'wb') as f:
+            f.write(CONTENT)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_serves_file_in_media_root(self):
+        response = self.client.get(reverse('media', args=['vocab_audio/word.mp3']), headers={'range': 'bytes=0-3'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[:4])
+        response.close()
+
+    def test_missing_or_outside_media_root(self):
+        self.assertEqual(self.client.get(reverse('media', args=['vocab_audio/missing.mp3'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['../settings.py'])).status_code, 404)
+
+    def test_rejects_post(self):
+        self.assertEqual(self.client.post(reverse('media', args=['vocab_audio/word.mp3'])).status_code, 405)
+
+
+class ConditionalPageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.topic = Topic.objects.create(title='Animals')
+
+    def test_etag_not_modified(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(reverse('home'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_last_modified_not_modified(self):
+        response = self.client.get(reverse('home'))
+        response = self.client.get(reverse('home'), headers={'if-modified-since': response['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_content_renders_again(self):
+        etag = self.client.get(reverse('home'))['ETag']
+        Topic.objects.create(title='Food')
+        response = self.client.get(reverse('home'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deploy_invalidates_etag(self):
+        with override_settings(RELEASE_VERSION='1'):
+            etag = self.client.get(reverse('home'))['ETag']
+        with override_settings(RELEASE_VERSION='2'):
+            response = self.client.get(reverse('home'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_static_manifest_invalidates_etag(self):
+        with mock.patch('PKL_English.conditional.staticfiles_storage', manifest_hash='a1'):
+            etag = self.client.get(reverse('home'))['ETag']
+        with mock.patch('PKL_English.conditional.staticfiles_storage', manifest_hash='b2'):
+            response = self.client.get(reverse('home'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from PKL_English.media import serve_media
 from study.views import index, topic_list, study_session, submit_answer, study_stats
 admin.site.site_header = "Hệ thống quản lý PKL English"
 admin.site.site_title = "PKL English Admin Portal"
@@ -29,6 +29,6 @@ urlpatterns = [
     # Study URLs
     path('study/', include('study.urls')),
     path('speaking/', include('speaking.urls')),
-]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Media (audio từ vựng, ảnh): Range + ETag, có nginx thì chuyển qua X-Accel-Redirect
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='media'),
+]
\ No newline at end of file
@@ -0,0 +1,183 @@
+import io
+import math
+import os
+import threading
+import time
+import wave
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from speaking.models import PronunciationLog, PronunciationResultCache, SpeakingSentence
+from speaking.services.assessment_jobs import shutdown_assessment_pool
+from speaking.services.audio_convert import SAMPLE_RATE
+from speaking.services.result_cache import cache_key
+
+LOCAL_BACKEND = 'speaking.services.scoring_backends.LocalScoringBackend'
+BENCHMARK_USERNAME = 'benchmark_pronunciation'
+
+
+def make_wav(seconds):
+    """WAV PCM 16 kHz mono nhiễu ngẫu nhiên (đúng chuẩn -> không cần ffmpeg, mỗi file khác nhau)"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(os.urandom(int(seconds * SAMPLE_RATE) * 2))
+    return buffer.getvalue()
+
+
+def percentile(values, p):
+    """Phân vị theo nearest-rank (values đã sắp xếp)"""
+    if not values:
+        return 0.0
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Đo tải đường nộp bài chấm phát âm: gửi đồng thời nhiều bài vào submit_pronunciation "
+        "(backend chấm giả LocalScoringBackend, không gọi Azure), báo thông lượng + độ trễ p50/p95/p99 "
+        "của lúc nộp và của cả job chấm. Ghi vào DB đang cấu hình: chỉ chạy trên môi trường dev / staging."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Tổng số bài nộp (mặc định 200)")
+        parser.add_argument('--concurrency', type=int, default=16, help="Số client gửi cùng lúc (mặc định 16)")
+        parser.add_argument('--latency-ms', type=int, default=800, help="Độ trễ trung bình của backend giả (ms)")
+        parser.add_argument('--jitter-ms', type=int, default=300, help="Dao động ± độ trễ (ms)")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Tỉ lệ lỗi của backend giả (0-1)")
+        parser.add_argument('--audio-seconds', type=float, default=3.0, help="Độ dài mỗi file ghi âm (giây)")
+        parser.add_argument('--same-audio', action='store_true', help="Mọi bài cùng 1 file (đo đường cache)")
+        parser.add_argument('--sentence', type=int, help="Id câu mẫu (mặc định: câu đầu tiên)")
+        parser.add_argument('--timeout', type=int, default=300, help="Số giây tối đa chờ các job chấm xong")
+        parser.add_argument('--keep', action='store_true', help="Giữ lại log / file ghi âm / cache đã tạo")
+
+    def handle(self, *args, **options):
+        sentences = SpeakingSentence.objects.order_by('id')
+        if options['sentence']:
+            sentences = sentences.filter(id=options['sentence'])
+        sentence = sentences.first()
+        if sentence is None:
+            raise CommandError("Chưa có câu mẫu (SpeakingSentence) nào để nộp bài")
+
+        user, created_user = get_user_model().objects.get_or_create(username=BENCHMARK_USERNAME)
+        shared_audio = make_wav(options['audio_seconds']) if options['same_audio'] else None
+        total = options['requests']
+
+        scoring = {
+            'latency_ms': options['latency_ms'],
+            'jitter_ms': options['jitter_ms'],
+            'error_rate': options['error_rate'],
+        }
+        with override_settings(
+            SPEAKING_SCORING_BACKEND=LOCAL_BACKEND,
+            SPEAKING_LOCAL_SCORING=scoring,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ):
+            # --- 1. NỘP BÀI ĐỒNG THỜI ---
+            results = []
+            audio_keys = set()
+            counter = iter(range(total))
+            lock = threading.Lock()
+
+            # Đăng nhập 1 lần, các client dùng chung cookie phiên
+            login = Client()
+            login.force_login(user)
+
+            def client_loop():
+                client = Client()
+                client.cookies = login.cookies
+                try:
+                    while True:
+                        with lock:
+                            if next(counter, None) is None:
+                                return
+                        audio = shared_audio or make_wav(options['audio_seconds'])
+                        started = time.perf_counter()
+                        response = client.post(reverse('submit_pronunciation'), {
+                            'sentence_id': sentence.id,
+                            'audio_data': SimpleUploadedFile('recording.wav', audio, content_type='audio/wav'),
+                        })
+                        elapsed = time.perf_counter() - started
+                        with lock:
+                            results.append((response.status_code, elapsed, response.json().get('job_id')))
+                            audio_keys.add(cache_key(audio, sentence.text))
+                finally:
+                    # Client test không đóng kết nối DB sau mỗi request
+                    connections.close_all()
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=client_loop) for _ in range(options['concurrency'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            submit_seconds = time.perf_counter() - started
+
+            # --- 2. CHỜ JOB CHẤM XONG (pool chấm nền của process này) ---
+            job_ids = [job_id for status, _, job_id in results if status == 202]
+            unfinished = PronunciationLog.objects.filter(
+                id__in=job_ids, status__in=[PronunciationLog.STATUS_PENDING, PronunciationLog.STATUS_PROCESSING],
+            )
+            deadline = time.monotonic() + options['timeout']
+            while unfinished.exists() and time.monotonic() < deadline:
+                time.sleep(0.2)
+            total_seconds = time.perf_counter() - started
+
+            # Dừng pool ngay trong override_settings (kể cả khi hết giờ chờ): hủy job chưa chạy, đợi job
+            # đang chạy xong -> không job nào gọi backend thật sau khi trả lại settings hay mất file khi dọn dữ liệu
+            shutdown_assessment_pool()
+
+        # --- 3. BÁO CÁO ---
+        statuses = Counter(status for status, _, _ in results)
+        submit_latencies = sorted(elapsed * 1000 for _, elapsed, _ in results)
+        self.stdout.write(
+            f"Nộp {len(results)} bài, {options['concurrency']} client, câu {sentence.id}, "
+            f"backend giả {scoring['latency_ms']}±{scoring['jitter_ms']} ms, lỗi {scoring['error_rate']:.0%}"
+        )
+        self.stdout.write(
+            f"Nộp bài: {len(results) / submit_seconds:.1f} bài/s, HTTP "
+            + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items()))
+        )
+        self._write_latencies("  độ trễ nộp bài", submit_latencies)
+
+        logs = PronunciationLog.objects.filter(id__in=job_ids).values_list('status', 'created_at', 'status_changed_at')
+        job_statuses = Counter(status for status, _, _ in logs)
+        finished = sorted(
+            (changed_at - created_at).total_seconds() * 1000
+            for status, created_at, changed_at in logs
+            if status in (PronunciationLog.STATUS_DONE, PronunciationLog.STATUS_FAILED)
+        )
+        self.stdout.write(
+            f"Job chấm: {len(finished) / total_seconds:.1f} job/s, "
+            + ", ".join(f"{status}: {count}" for status, count in sorted(job_statuses.items()))
+        )
+        self._write_latencies("  nộp -> có kết quả", finished)
+        if len(finished) < len(job_ids):
+            self.stdout.write(self.style.WARNING(f"{len(job_ids) - len(finished)} job chưa xong sau {options['timeout']} giây"))
+
+        # --- 4. DỌN DỮ LIỆU ĐO ---
+        if not options['keep']:
+            logs = PronunciationLog.objects.filter(user=user)
+            for log in logs.only('id', 'audio_file').iterator():
+                log.audio_file.delete(save=False)
+            logs.delete()
+            PronunciationResultCache.objects.filter(source_hash__in=audio_keys).delete()
+            if created_user:
+                user.delete()
+        self.stdout.write(self.style.SUCCESS("Đo xong"))
+
+    def _write_latencies(self, label, latencies):
+        self.stdout.write(
+            f"{label}: p50 {percentile(latencies, 50):.0f} ms, p95 {percentile(latencies, 95):.0f} ms, "
+            f"p99 {percentile(latencies, 99):.0f} ms, max {latencies[-1] if latencies else 0:.0f} ms"
+        )
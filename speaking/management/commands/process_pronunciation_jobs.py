@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from speaking.services.assessment_jobs import recover_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Chấm lại các job phát âm bị kẹt (process web chết khi job đang chờ / đang chấm) "
+        "quá SPEAKING_JOB_STALE_SECONDS không đổi trạng thái. Chạy định kỳ (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-seconds', type=int, default=None,
+                            help="Job không đổi trạng thái quá số giây này coi là kẹt (mặc định theo settings)")
+
+    def handle(self, *args, **options):
+        total = recover_stale_jobs(options['stale_seconds'])
+        self.stdout.write(self.style.SUCCESS(f"Đã chấm lại {total} job"))
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 10:38
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speaking', '0002_speakingsentence_speakingtopic_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='speakingsentence',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now(), verbose_name='Ngày sửa'),
+        ),
+        migrations.AddField(
+            model_name='speakingtopic',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now(), verbose_name='Ngày sửa'),
+        ),
+    ]
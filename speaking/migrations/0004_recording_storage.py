@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 10:44
+
+import speaking.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speaking', '0003_content_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pronunciationlog',
+            name='audio_file',
+            field=models.FileField(storage=speaking.models.recording_storage, upload_to=speaking.models.speaking_recording_path, verbose_name='File ghi âm'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 10:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speaking', '0004_recording_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pronunciationlog',
+            name='error_message',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='Lỗi'),
+        ),
+        # Log cũ đã được chấm đồng bộ -> 'done', sau đó job mới mặc định 'pending'
+        migrations.AddField(
+            model_name='pronunciationlog',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Chờ chấm'), ('processing', 'Đang chấm'), ('done', 'Đã chấm'), ('failed', 'Lỗi')], default='done', max_length=20, verbose_name='Trạng thái'),
+        ),
+        migrations.AlterField(
+            model_name='pronunciationlog',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Chờ chấm'), ('processing', 'Đang chấm'), ('done', 'Đã chấm'), ('failed', 'Lỗi')], default='pending', max_length=20, verbose_name='Trạng thái'),
+        ),
+        migrations.AddField(
+            model_name='pronunciationlog',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Đổi trạng thái lúc'),
+        ),
+        migrations.AddIndex(
+            model_name='pronunciationlog',
+            index=models.Index(fields=['status', 'status_changed_at'], name='speaking_pr_status_ac1f02_idx'),
+        ),
+    ]
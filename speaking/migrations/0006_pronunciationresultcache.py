@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('speaking', '0005_pronunciation_job_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronunciationResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audio_hash', models.CharField(max_length=64, unique=True, verbose_name='Hash audio chuẩn hóa')),
+                ('source_hash', models.CharField(db_index=True, max_length=64, verbose_name='Hash file gốc')),
+                ('overall_score', models.FloatField(default=0.0, verbose_name='Điểm tổng quan')),
+                ('accuracy_score', models.FloatField(default=0.0, verbose_name='Độ chính xác')),
+                ('fluency_score', models.FloatField(default=0.0, verbose_name='Độ lưu loát')),
+                ('completeness_score', models.FloatField(default=0.0, verbose_name='Độ hoàn thành')),
+                ('api_response', models.JSONField(blank=True, default=dict, verbose_name='Phản hồi từ API')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Tạo lúc')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Dùng lần cuối')),
+            ],
+            options={
+                'verbose_name': 'Kết quả chấm đã lưu',
+                'verbose_name_plural': 'Kết quả chấm đã lưu',
+            },
+        ),
+    ]
@@ -1,11 +1,18 @@
 from django.db import models
+from django.db.models.functions import Now
 from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 import os
 
 
+def recording_storage():
+    """File ghi âm nằm trong temp/speaking_recordings (ngoài MEDIA_ROOT): chỉ nghe lại qua view kiểm tra chủ sở hữu"""
+    return FileSystemStorage(location=settings.TEMP_ROOT / 'speaking_recordings')
+
+
 def speaking_recording_path(instance, filename):
-    """Lưu file ghi âm vào folder temp/ riêng biệt"""
-    return os.path.join(settings.TEMP_ROOT, 'speaking_recordings', filename)
+    """Đường dẫn tương đối trong recording_storage, mỗi user 1 folder"""
+    return os.path.join(f'user_{instance.user_id}', filename)
 
 
 class SpeakingTopic(models.Model):
@@ -14,6 +21,8 @@ class SpeakingTopic(models.Model):
     description = models.TextField(blank=True, verbose_name="Mô tả")
     image = models.ImageField(upload_to='speaking_topics/', null=True, blank=True, verbose_name="Hình ảnh minh họa")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    # Thời điểm sửa gần nhất (ETag / Last-Modified của các trang luyện nói)
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now(), verbose_name="Ngày sửa")
 
     def __str__(self):
         return self.title
@@ -23,26 +32,69 @@ class SpeakingSentence(models.Model):
     topic = models.ForeignKey(SpeakingTopic, on_delete=models.CASCADE, related_name='sentences', verbose_name="Chủ đề")
     text = models.CharField(max_length=500, verbose_name="Câu mẫu (Tiếng Anh)")
     translation = models.CharField(max_length=500, blank=True, verbose_name="Dịch nghĩa (Tiếng Việt)")
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now(), verbose_name="Ngày sửa")
     
     def __str__(self):
         return f"{self.topic.title} - {self.text[:30]}"
 
 class PronunciationLog(models.Model):
+    # Trạng thái chấm (chấm bất đồng bộ: services/assessment_jobs.py)
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Chờ chấm'),
+        (STATUS_PROCESSING, 'Đang chấm'),
+        (STATUS_DONE, 'Đã chấm'),
+        (STATUS_FAILED, 'Lỗi'),
+    ]
+
     # Các dòng này cũng phải thụt lề
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Người dùng")
     sentence = models.ForeignKey(SpeakingSentence, on_delete=models.CASCADE, related_name='logs', null=True, verbose_name="Câu đã luyện")
-    audio_file = models.FileField(upload_to=speaking_recording_path, verbose_name="File ghi âm")
+    audio_file = models.FileField(upload_to=speaking_recording_path, storage=recording_storage, verbose_name="File ghi âm")
     overall_score = models.FloatField(default=0.0, verbose_name="Điểm tổng quan")
     accuracy_score = models.FloatField(default=0.0, verbose_name="Độ chính xác")
     fluency_score = models.FloatField(default=0.0, verbose_name="Độ lưu loát")
     completeness_score = models.FloatField(default=0.0, verbose_name="Độ hoàn thành")
     api_response = models.JSONField(default=dict, blank=True, verbose_name="Phản hồi từ API")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Thời gian luyện tập")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Trạng thái")
+    error_message = models.CharField(max_length=255, blank=True, default='', verbose_name="Lỗi")
+    # Lần đổi trạng thái gần nhất (tìm job bị kẹt khi process chết giữa chừng)
+    status_changed_at = models.DateTimeField(null=True, blank=True, verbose_name="Đổi trạng thái lúc")
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'status_changed_at'])]
         verbose_name = "Nhật ký phát âm"
         verbose_name_plural = "Danh sách nhật ký phát âm"
 
     def __str__(self):
-        return f"{self.user.username} - {self.overall_score}"
\ No newline at end of file
+        return f"{self.user.username} - {self.overall_score}"
+
+class PronunciationResultCache(models.Model):
+    """
+    Kết quả chấm đã có, theo (nội dung audio, câu mẫu): nộp lại cùng bài / client gửi lại khi mạng lỗi
+    thì dùng lại kết quả, không chuyển ffmpeg + gọi Azure (mất tiền) lần nữa. Xem services/result_cache.py
+    """
+    # sha256(PCM 16 kHz mono + câu mẫu): cùng đoạn ghi âm dù khác định dạng file
+    audio_hash = models.CharField(max_length=64, unique=True, verbose_name="Hash audio chuẩn hóa")
+    # sha256(file upload + câu mẫu): nhận ra bài gửi lại ngay lúc nộp, chưa cần chuyển ffmpeg
+    source_hash = models.CharField(max_length=64, db_index=True, verbose_name="Hash file gốc")
+    overall_score = models.FloatField(default=0.0, verbose_name="Điểm tổng quan")
+    accuracy_score = models.FloatField(default=0.0, verbose_name="Độ chính xác")
+    fluency_score = models.FloatField(default=0.0, verbose_name="Độ lưu loát")
+    completeness_score = models.FloatField(default=0.0, verbose_name="Độ hoàn thành")
+    api_response = models.JSONField(default=dict, blank=True, verbose_name="Phản hồi từ API")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Tạo lúc")
+    # Lần dùng gần nhất: đầy thì xóa các dòng lâu không dùng nhất (LRU)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Dùng lần cuối")
+
+    class Meta:
+        verbose_name = "Kết quả chấm đã lưu"
+        verbose_name_plural = "Kết quả chấm đã lưu"
+
+    def __str__(self):
+        return f"{self.audio_hash[:12]} - {self.overall_score}"
@@ -0,0 +1,150 @@
+"""
+Chấm phát âm bất đồng bộ (job = 1 dòng PronunciationLog)
+- Nộp bài: tạo log (status pending), trả job id ngay -> request không phải chờ ffmpeg + Azure (vài giây)
+- Mỗi process có 1 pool thread giới hạn (SPEAKING_ASSESSMENT_WORKERS) và số job chờ giới hạn
+  (SPEAKING_ASSESSMENT_QUEUE_SIZE): đầy thì từ chối ngay (503) thay vì dồn request -> worker web
+  luôn còn chỗ cho các trang học
+- Job được nhận bằng UPDATE có điều kiện (pending -> processing): mỗi job chỉ chạy ở 1 nơi
+- Job kẹt (process chết khi job đang chờ / đang chấm) được lệnh process_pronunciation_jobs chạy lại
+- Client nhận kết quả qua API trạng thái (polling) hoặc SSE (xem speaking/views.py)
+"""
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from ..models import PronunciationLog
+from .services import SpeechAssessmentService
+
+logger = logging.getLogger(__name__)
+
+
+# --- 1. CHẠY 1 JOB ---
+def claim_job(log_id):
+    """pending -> processing; False nếu nơi khác đã nhận job"""
+    return PronunciationLog.objects.filter(id=log_id, status=PronunciationLog.STATUS_PENDING).update(
+        status=PronunciationLog.STATUS_PROCESSING, status_changed_at=timezone.now(),
+    ) == 1
+
+
+def _finish_job(log_id, status, **fields):
+    PronunciationLog.objects.filter(id=log_id).update(status=status, status_changed_at=timezone.now(), **fields)
+
+
+def run_job(log_id):
+    """Nhận + chấm 1 job, ghi kết quả vào log. Trả về False nếu job đã được nơi khác nhận"""
+    try:
+        if not claim_job(log_id):
+            return False
+        log = PronunciationLog.objects.select_related('sentence').get(id=log_id)
+        result = SpeechAssessmentService.assess_pronunciation(log.audio_file.path, log.sentence.text)
+        if result['success']:
+            _finish_job(
+                log_id, PronunciationLog.STATUS_DONE,
+                overall_score=result['overall_score'],
+                accuracy_score=result['accuracy_score'],
+                fluency_score=result['fluency_score'],
+                completeness_score=result['completeness_score'],
+                api_response=result['full_response'],
+            )
+        else:
+            _finish_job(log_id, PronunciationLog.STATUS_FAILED, error_message=result['error'][:255])
+        return True
+    except Exception:
+        logger.exception("Lỗi khi chấm job phát âm %s", log_id)
+        _finish_job(log_id, PronunciationLog.STATUS_FAILED, error_message="Lỗi hệ thống khi chấm điểm")
+        return True
+    finally:
+        # Thread của pool có kết nối DB riêng, không có request_finished để tự đóng
+        close_old_connections()
+
+
+def job_payload(log):
+    """Dữ liệu trạng thái job trả cho client (cùng dạng kết quả chấm đồng bộ trước đây khi đã xong)"""
+    payload = {'job_id': log.id, 'status': log.status}
+    if log.status == PronunciationLog.STATUS_DONE:
+        payload['data'] = {
+            'overall_score': log.overall_score,
+            'accuracy_score': log.accuracy_score,
+            'fluency_score': log.fluency_score,
+            'completeness_score': log.completeness_score,
+            'full_response': log.api_response,
+        }
+    elif log.status == PronunciationLog.STATUS_FAILED:
+        payload['message'] = log.error_message or "Không thể chấm điểm"
+    return payload
+
+
+# --- 2. POOL CHẤM NỀN CỦA PROCESS ---
+class AssessmentPool:
+
+    def __init__(self, workers, queue_size):
+        self.pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pronunciation')
+        # Số job đang chạy + đang chờ tối đa
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, log_id):
+        """Đưa job vào pool; False nếu pool đã đầy"""
+        if not self._slots.acquire(blocking=False):
+            return False
+        future = self._executor.submit(run_job, log_id)
+        future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def close(self):
+        # Job chưa chạy vẫn pending trong DB, lệnh process_pronunciation_jobs sẽ chạy lại
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_assessment_pool():
+    """Mỗi process (worker) có 1 pool riêng, tạo lại nếu process được fork"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = AssessmentPool(
+                workers=getattr(settings, 'SPEAKING_ASSESSMENT_WORKERS', 4),
+                queue_size=getattr(settings, 'SPEAKING_ASSESSMENT_QUEUE_SIZE', 32),
+            )
+            atexit.register(_pool.close)
+        return _pool
+
+
+def shutdown_assessment_pool():
+    """Hủy job chưa chạy, chờ job đang chạy xong rồi bỏ pool của process (lần sau tạo pool mới)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and pool.pid == os.getpid():
+        pool.close()
+
+
+# --- 3. CHẠY LẠI JOB KẸT ---
+def recover_stale_jobs(stale_seconds=None):
+    """
+    Chạy lại (trong process hiện tại) các job pending / processing quá stale_seconds không đổi trạng thái.
+    Trả về số job đã chạy
+    """
+    stale_seconds = stale_seconds or getattr(settings, 'SPEAKING_JOB_STALE_SECONDS', 300)
+    cutoff = timezone.now() - timedelta(seconds=stale_seconds)
+    # Process chết khi đang chấm -> trả về pending để nhận lại (giữ mốc thời gian cũ: vẫn là job kẹt)
+    PronunciationLog.objects.filter(
+        status=PronunciationLog.STATUS_PROCESSING, status_changed_at__lt=cutoff,
+    ).update(status=PronunciationLog.STATUS_PENDING)
+
+    stale_ids = list(
+        PronunciationLog.objects.filter(status=PronunciationLog.STATUS_PENDING)
+        .exclude(status_changed_at__gte=cutoff)
+        .values_list('id', flat=True)
+    )
+    return sum(1 for log_id in stale_ids if run_job(log_id))
@@ -0,0 +1,108 @@
+"""
+Chuyển file ghi âm sang định dạng Azure cần (PCM 16 bit, 16 kHz, mono) hoàn toàn trong bộ nhớ
+- Không file tạm: dữ liệu ghi âm đưa vào ffmpeg qua stdin, PCM đọc ra từ stdout, rồi đẩy thẳng
+  vào PushAudioInputStream của recognizer (xem services.py)
+- Đường tắt: file đã là WAV PCM 16 bit / 16 kHz / mono -> chỉ đọc header, lấy đoạn data, không gọi ffmpeg
+- Số ffmpeg chạy cùng lúc mỗi process giới hạn bởi SPEAKING_AUDIO_CONVERT_PROCESSES
+  (mỗi ffmpeg 1 thread): nhiều bài nộp cùng lúc không chiếm hết CPU của trang học
+"""
+import os
+import struct
+import subprocess
+import threading
+
+from django.conf import settings
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+BITS_PER_SAMPLE = 16
+CONVERT_TIMEOUT = 60
+
+# Mã định dạng trong chunk "fmt " của WAV
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioConvertError(Exception):
+    pass
+
+
+# --- 1. ĐƯỜNG TẮT: WAV ĐÃ ĐÚNG CHUẨN ---
+def pcm_from_wav(data):
+    """
+    data là WAV PCM 16 bit / 16 kHz / mono -> trả về phần PCM (memoryview, không copy).
+    Định dạng khác / header không đọc được -> None (cần chuyển bằng ffmpeg)
+    """
+    if len(data) < 12 or data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        return None
+
+    view = memoryview(data)
+    offset = 12
+    fmt_ok = False
+    while offset + 8 <= len(data):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            if chunk_size < 16 or body + chunk_size > len(data):
+                return None
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', data, body)
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # 2 byte đầu của SubFormat GUID là mã định dạng thật
+                audio_format = struct.unpack_from('<H', data, body + 24)[0]
+            fmt_ok = (audio_format, channels, sample_rate, bits) == (
+                WAVE_FORMAT_PCM, CHANNELS, SAMPLE_RATE, BITS_PER_SAMPLE)
+            if not fmt_ok:
+                return None
+        elif chunk_id == b'data':
+            if not fmt_ok:
+                return None
+            # Trình ghi âm dạng stream có thể để kích thước data = 0 / 0xFFFFFFFF -> lấy tới hết file
+            end = len(data) if chunk_size in (0, 0xFFFFFFFF) else min(body + chunk_size, len(data))
+            return view[body:end]
+        # Chunk có kích thước lẻ được đệm 1 byte
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+# --- 2. CHUYỂN BẰNG FFMPEG QUA PIPE ---
+_slots = None
+_slots_pid = None
+_slots_lock = threading.Lock()
+
+
+def _convert_slots():
+    """Semaphore giới hạn số ffmpeg chạy cùng lúc, riêng cho mỗi process (tạo lại nếu process được fork)"""
+    global _slots, _slots_pid
+    with _slots_lock:
+        if _slots is None or _slots_pid != os.getpid():
+            processes = getattr(settings, 'SPEAKING_AUDIO_CONVERT_PROCESSES', None) or max((os.cpu_count() or 2) // 2, 1)
+            _slots = threading.BoundedSemaphore(processes)
+            _slots_pid = os.getpid()
+        return _slots
+
+
+def convert_with_ffmpeg(data):
+    """Bytes ghi âm (webm / ogg / mp3 / wav khác chuẩn...) -> PCM s16le 16 kHz mono (bytes)"""
+    command = [
+        getattr(settings, 'FFMPEG_BINARY', 'ffmpeg'),
+        '-nostdin', '-hide_banner', '-loglevel', 'error', '-threads', '1',
+        '-i', 'pipe:0', '-vn', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE),
+        '-f', 's16le', '-acodec', 'pcm_s16le', 'pipe:1',
+    ]
+    with _convert_slots():
+        try:
+            process = subprocess.run(command, input=data, capture_output=True, timeout=CONVERT_TIMEOUT)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise AudioConvertError(f"Không chạy được ffmpeg: {e}") from e
+    if process.returncode != 0 or not process.stdout:
+        raise AudioConvertError(f"FFmpeg lỗi: {process.stderr.decode(errors='replace').strip()}")
+    return process.stdout
+
+
+def to_azure_pcm(data):
+    """Bytes ghi âm -> PCM 16 bit / 16 kHz / mono cho Azure (lỗi -> AudioConvertError)"""
+    pcm = pcm_from_wav(data)
+    if pcm is not None:
+        return pcm
+    return convert_with_ffmpeg(data)
@@ -0,0 +1,92 @@
+"""
+Cache kết quả chấm phát âm theo nội dung audio + câu mẫu (bảng PronunciationResultCache, dùng chung mọi process)
+- Khóa: sha256(dữ liệu + câu mẫu). 2 khóa cho 1 kết quả:
+    + source_hash (file upload nguyên vẹn): client gửi lại / nộp lại đúng file -> view nhận ra ngay, không tạo job
+    + audio_hash (PCM đã chuẩn hóa): cùng đoạn ghi âm nhưng khác định dạng file -> không gọi Azure
+- Hạn dùng SPEAKING_RESULT_CACHE_DAYS (tính từ lúc chấm), tối đa SPEAKING_RESULT_CACHE_SIZE dòng:
+  đầy thì xóa các dòng lâu không dùng nhất (LRU theo last_used_at)
+- Chỉ lưu kết quả chấm thành công
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from ..models import PronunciationResultCache
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(data, reference_text):
+    """sha256 (hex) của dữ liệu audio + câu mẫu"""
+    digest = hashlib.sha256(data)
+    digest.update(b'\0')
+    digest.update(reference_text.encode())
+    return digest.hexdigest()
+
+
+def _fresh_entries():
+    days = getattr(settings, 'SPEAKING_RESULT_CACHE_DAYS', 30)
+    return PronunciationResultCache.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+
+
+# --- 1. ĐỌC ---
+def lookup(source_key=None, audio_key=None):
+    """Kết quả đã lưu (cùng dạng kết quả của SpeechAssessmentService.assess_pronunciation) hoặc None"""
+    if source_key:
+        entry = _fresh_entries().filter(source_hash=source_key).first()
+    else:
+        entry = _fresh_entries().filter(audio_hash=audio_key).first()
+    if entry is None:
+        return None
+
+    PronunciationResultCache.objects.filter(id=entry.id).update(last_used_at=timezone.now())
+    return {
+        "success": True,
+        "overall_score": entry.overall_score,
+        "accuracy_score": entry.accuracy_score,
+        "fluency_score": entry.fluency_score,
+        "completeness_score": entry.completeness_score,
+        "full_response": entry.api_response,
+        "cached": True,
+    }
+
+
+# --- 2. GHI + DỌN ---
+def store(source_key, audio_key, result):
+    """Lưu kết quả chấm thành công rồi dọn cache (hết hạn / quá số dòng)"""
+    now = timezone.now()
+    fields = {
+        'source_hash': source_key,
+        'overall_score': result['overall_score'],
+        'accuracy_score': result['accuracy_score'],
+        'fluency_score': result['fluency_score'],
+        'completeness_score': result['completeness_score'],
+        'api_response': result['full_response'],
+        'created_at': now,
+        'last_used_at': now,
+    }
+    try:
+        PronunciationResultCache.objects.update_or_create(audio_hash=audio_key, defaults=fields)
+    except IntegrityError:
+        # Process khác vừa lưu cùng audio -> giữ bản đó
+        return
+    evict()
+
+
+def evict():
+    """Xóa dòng hết hạn, rồi giữ lại SPEAKING_RESULT_CACHE_SIZE dòng mới dùng nhất. Trả về số dòng đã xóa"""
+    days = getattr(settings, 'SPEAKING_RESULT_CACHE_DAYS', 30)
+    size = getattr(settings, 'SPEAKING_RESULT_CACHE_SIZE', 10000)
+    entries = PronunciationResultCache.objects.all()
+    deleted, _ = entries.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+
+    # last_used_at của dòng đầu tiên vượt giới hạn: xóa nó và mọi dòng cũ hơn
+    boundary = list(entries.order_by('-last_used_at').values_list('last_used_at', flat=True)[size:size + 1])
+    if boundary:
+        evicted, _ = entries.filter(last_used_at__lte=boundary[0]).delete()
+        deleted += evicted
+    return deleted
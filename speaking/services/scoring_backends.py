@@ -0,0 +1,199 @@
+"""
+Backend chấm phát âm (chọn bằng settings.SPEAKING_SCORING_BACKEND, đường dẫn tới class)
+- AzureScoringBackend: Azure Speech (cần key, mạng, thư viện azure-cognitiveservices-speech)
+- LocalScoringBackend: chấm giả trong process, trả JSON cùng dạng Azure (NBest / PronunciationAssessment /
+  Words / Phonemes) với độ trễ + tỉ lệ lỗi cấu hình được (SPEAKING_LOCAL_SCORING) -> chạy thử, đo tải
+  (lệnh benchmark_pronunciation_submit) không cần mạng / key
+
+Backend nhận audio đã chuyển sang PCM 16 kHz mono (audio_convert.py) và trả về dict:
+{'success': True, 'overall_score', 'accuracy_score', 'fluency_score', 'completeness_score', 'full_response'}
+hoặc {'success': False, 'error'}
+"""
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .audio_convert import BITS_PER_SAMPLE, CHANNELS, SAMPLE_RATE
+
+try:
+    import azure.cognitiveservices.speech as speechsdk
+except ImportError:
+    speechsdk = None
+
+# Số byte PCM mỗi lần đẩy vào stream của recognizer
+PUSH_CHUNK_SIZE = 64 * 1024
+
+
+def result_from_nbest(nbest):
+    """Kết quả chấm từ NBest[0] (JSON của Azure / backend giả)"""
+    assessment = nbest['PronunciationAssessment']
+    return {
+        "success": True,
+        "overall_score": assessment['PronScore'],
+        "accuracy_score": assessment['AccuracyScore'],
+        "fluency_score": assessment['FluencyScore'],
+        "completeness_score": assessment['CompletenessScore'],
+        "full_response": nbest,
+    }
+
+
+class ScoringBackend(ABC):
+    """Giao diện backend chấm phát âm"""
+
+    @abstractmethod
+    def assess(self, pcm, audio_file_path, reference_text):
+        """
+        pcm: PCM 16 kHz mono (None nếu không chuyển được, khi đó đọc audio_file_path)
+        Trả về dict kết quả như mô tả đầu file
+        """
+
+
+# --- 1. AZURE ---
+class AzureScoringBackend(ScoringBackend):
+
+    def _audio_config(self, pcm, audio_file_path):
+        """Đẩy PCM vào PushAudioInputStream (không file tạm); không có PCM -> SDK tự đọc file gốc"""
+        if pcm is None:
+            return speechsdk.audio.AudioConfig(filename=audio_file_path)
+
+        stream = speechsdk.audio.PushAudioInputStream(
+            stream_format=speechsdk.audio.AudioStreamFormat(
+                samples_per_second=SAMPLE_RATE, bits_per_sample=BITS_PER_SAMPLE, channels=CHANNELS,
+            )
+        )
+        pcm = memoryview(pcm)
+        for start in range(0, len(pcm), PUSH_CHUNK_SIZE):
+            stream.write(bytes(pcm[start:start + PUSH_CHUNK_SIZE]))
+        # Đóng stream = báo hết audio, recognizer không chờ thêm dữ liệu
+        stream.close()
+        return speechsdk.audio.AudioConfig(stream=stream)
+
+    def assess(self, pcm, audio_file_path, reference_text):
+        if speechsdk is None:
+            return {"success": False, "error": "Chưa cài thư viện azure-cognitiveservices-speech"}
+
+        subscription_key = os.getenv('AZURE_SPEECH_KEY')
+        region = os.getenv('AZURE_SPEECH_REGION')
+        if not subscription_key or not region:
+            return {"success": False, "error": "Chưa cấu hình Azure Key/Region trong file .env"}
+
+        speech_config = speechsdk.SpeechConfig(subscription=subscription_key, region=region)
+        audio_config = self._audio_config(pcm, audio_file_path)
+
+        pronunciation_config = speechsdk.PronunciationAssessmentConfig(
+            reference_text=reference_text,
+            grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
+            granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
+            enable_miscue=True
+        )
+        speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+        pronunciation_config.apply_to(speech_recognizer)
+        result = speech_recognizer.recognize_once_async().get()
+
+        if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+            response_json = json.loads(result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult))
+            return result_from_nbest(response_json['NBest'][0])
+        elif result.reason == speechsdk.ResultReason.Canceled:
+            return {"success": False, "error": f"Azure Error: {result.cancellation_details.error_details}"}
+        return {"success": False, "error": "Không thể nhận diện giọng nói."}
+
+
+# --- 2. BACKEND GIẢ (CHẠY THỬ / ĐO TẢI) ---
+# 100 ns / đơn vị, như Offset / Duration của Azure
+TICKS_PER_SECOND = 10_000_000
+
+
+class LocalScoringBackend(ScoringBackend):
+    """
+    Chấm giả: điểm ngẫu nhiên nhưng cố định theo (audio, câu mẫu) -> cache / chấm lại cho cùng kết quả.
+    settings.SPEAKING_LOCAL_SCORING: {'latency_ms': độ trễ trung bình, 'jitter_ms': dao động ±,
+    'error_rate': tỉ lệ lỗi (0-1)}
+    """
+
+    def assess(self, pcm, audio_file_path, reference_text):
+        config = getattr(settings, 'SPEAKING_LOCAL_SCORING', {})
+        latency_ms, jitter_ms = config.get('latency_ms', 800), config.get('jitter_ms', 300)
+        # Độ trễ + lỗi: ngẫu nhiên thật (mỗi lần gọi khác nhau), như dịch vụ qua mạng
+        time.sleep(max(latency_ms + random.uniform(-jitter_ms, jitter_ms), 0) / 1000)
+        if random.random() < config.get('error_rate', 0.0):
+            return {"success": False, "error": "Local Error: lỗi giả lập của backend chấm thử"}
+
+        if pcm is None:
+            with open(audio_file_path, 'rb') as f:
+                pcm = f.read()
+        seed = hashlib.sha256(bytes(pcm)).digest() + reference_text.encode()
+        duration = len(pcm) / (SAMPLE_RATE * CHANNELS * BITS_PER_SAMPLE // 8)
+        return result_from_nbest(self.build_nbest(reference_text, duration, random.Random(seed)))
+
+    @staticmethod
+    def build_nbest(reference_text, duration, rng):
+        """NBest[0] cùng cấu trúc Azure trả về khi bật Phoneme + miscue"""
+        words = re.findall(r"[A-Za-z']+", reference_text) or [reference_text.strip() or '-']
+        step = int(duration * TICKS_PER_SECOND / len(words)) if duration else TICKS_PER_SECOND // 2
+        word_results = []
+        for index, word in enumerate(words):
+            accuracy = round(rng.triangular(30, 100, 88), 1)
+            error_type = 'Mispronunciation' if accuracy < 60 else 'None'
+            if rng.random() < 0.03:
+                accuracy, error_type = 0.0, 'Omission'
+            letters = [c for c in word.lower() if c.isalpha()] or ['-']
+            word_results.append({
+                'Word': word.lower(),
+                'Offset': index * step,
+                'Duration': step,
+                'PronunciationAssessment': {'AccuracyScore': accuracy, 'ErrorType': error_type},
+                'Phonemes': [
+                    {'Phoneme': letter, 'PronunciationAssessment': {
+                        'AccuracyScore': round(min(max(rng.gauss(accuracy, 8), 0), 100), 1)}}
+                    for letter in letters
+                ],
+            })
+
+        pronounced = [w for w in word_results if w['PronunciationAssessment']['ErrorType'] != 'Omission']
+        accuracy = round(sum(w['PronunciationAssessment']['AccuracyScore'] for w in pronounced) / len(pronounced), 1) \
+            if pronounced else 0.0
+        fluency = round(rng.triangular(40, 100, 85), 1)
+        completeness = round(100 * len(pronounced) / len(word_results), 1)
+        # PronScore của Azure: trung bình có trọng số, điểm thấp nhất kéo xuống nhiều hơn
+        scores = sorted([accuracy, fluency, completeness])
+        pron_score = round(scores[0] * 0.4 + scores[1] * 0.3 + scores[2] * 0.3, 1)
+        lexical = ' '.join(w['Word'] for w in word_results)
+        return {
+            'Confidence': round(rng.uniform(0.8, 0.99), 4),
+            'Lexical': lexical,
+            'ITN': lexical,
+            'MaskedITN': lexical,
+            'Display': reference_text,
+            'PronunciationAssessment': {
+                'AccuracyScore': accuracy,
+                'FluencyScore': fluency,
+                'CompletenessScore': completeness,
+                'PronScore': pron_score,
+            },
+            'Words': word_results,
+        }
+
+
+# --- 3. CHỌN BACKEND ---
+_backend = None
+_backend_path = None
+_backend_lock = threading.Lock()
+
+
+def get_scoring_backend():
+    """Backend theo SPEAKING_SCORING_BACKEND, dùng chung trong process (tạo lại khi settings đổi)"""
+    global _backend, _backend_path
+    path = getattr(settings, 'SPEAKING_SCORING_BACKEND', 'speaking.services.scoring_backends.AzureScoringBackend')
+    with _backend_lock:
+        if _backend is None or _backend_path != path:
+            _backend = import_string(path)()
+            _backend_path = path
+        return _backend
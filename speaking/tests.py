@@ -1,3 +1,222 @@
-from django.test import TestCase
+"""
+Kiểm tra app speaking: đọc WAV không cần ffmpeg, cache kết quả chấm, các API nộp bài / job, trang có ETag (conditional_page), file ghi âm chỉ chủ sở hữu xem được
+Không gọi Azure (pool chấm được thay bằng mock), chạy được trên DB test mặc định.
+"""
+import io
+import struct
+import wave
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import PronunciationLog, PronunciationResultCache, SpeakingSentence, SpeakingTopic
+from .services import result_cache
+from .services.audio_convert import SAMPLE_RATE, pcm_from_wav
+
+SCORES = {'overall_score': 80.0, 'accuracy_score': 85.0, 'fluency_score': 75.0, 'completeness_score': 100.0}
+
+
+def make_wav(pcm, channels=1, rate=SAMPLE_RATE, sample_width=2):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(rate)
+        f.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class PcmFromWavTests(SimpleTestCase):
+
+    def test_pcm_16k_mono(self):
+        pcm = bytes(range(200))
+        result = pcm_from_wav(make_wav(pcm))
+        self.assertIsInstance(result, memoryview)
+        self.assertEqual(bytes(result), pcm)
+
+    def test_other_formats_need_ffmpeg(self):
+        pcm = bytes(200)
+        self.assertIsNone(pcm_from_wav(make_wav(pcm, channels=2)))
+        self.assertIsNone(pcm_from_wav(make_wav(pcm, rate=44100)))
+        self.assertIsNone(pcm_from_wav(make_wav(pcm, sample_width=1)))
+        self.assertIsNone(pcm_from_wav(b'OggS' + bytes(100)))
+        self.assertIsNone(pcm_from_wav(b'RIFF'))
+
+    def test_skips_extra_chunks(self):
+        data = make_wav(bytes(range(10)))
+        # Chèn chunk "LIST" kích thước lẻ (có byte đệm) trước chunk data
+        data_offset = data.index(b'data')
+        extra = b'LIST' + struct.pack('<I', 3) + b'abc\0'
+        self.assertEqual(bytes(pcm_from_wav(data[:data_offset] + extra + data[data_offset:])), bytes(range(10)))
+
+    def test_streaming_data_size(self):
+        data = bytearray(make_wav(bytes(range(10))))
+        # Trình ghi âm dạng stream: kích thước data = 0xFFFFFFFF -> lấy tới hết file
+        data_offset = data.index(b'data')
+        data[data_offset + 4:data_offset + 8] = struct.pack('<I', 0xFFFFFFFF)
+        self.assertEqual(bytes(pcm_from_wav(bytes(data) + b'xy')), bytes(range(10)) + b'xy')
+
+    def test_data_before_fmt(self):
+        data = b'RIFF' + struct.pack('<I', 16) + b'WAVE' + b'data' + struct.pack('<I', 2) + b'ab'
+        self.assertIsNone(pcm_from_wav(data))
+
+
+class ResultCacheTests(TestCase):
+
+    def store(self, name, source_key=None):
+        result_cache.store(source_key or f'source-{name}', f'audio-{name}', {**SCORES, 'full_response': {'name': name}})
+
+    def test_cache_key(self):
+        self.assertEqual(result_cache.cache_key(b'audio', 'Hello'), result_cache.cache_key(b'audio', 'Hello'))
+        self.assertNotEqual(result_cache.cache_key(b'audio', 'Hello'), result_cache.cache_key(b'audio', 'Hello!'))
+
+    def test_lookup_by_source_or_audio(self):
+        self.store('a')
+        by_source = result_cache.lookup(source_key='source-a')
+        self.assertEqual(by_source['full_response'], {'name': 'a'})
+        self.assertTrue(by_source['cached'])
+        self.assertEqual(result_cache.lookup(audio_key='audio-a'), by_source)
+        self.assertIsNone(result_cache.lookup(source_key='source-b'))
+        self.assertIsNone(result_cache.lookup(audio_key='audio-b'))
+
+    def test_lookup_marks_entry_used(self):
+        self.store('a')
+        PronunciationResultCache.objects.update(last_used_at=timezone.now() - timedelta(days=1))
+        result_cache.lookup(audio_key='audio-a')
+        entry = PronunciationResultCache.objects.get()
+        self.assertGreater(entry.last_used_at, timezone.now() - timedelta(minutes=1))
+
+    @override_settings(SPEAKING_RESULT_CACHE_DAYS=30)
+    def test_expired_entries(self):
+        self.store('a')
+        PronunciationResultCache.objects.update(created_at=timezone.now() - timedelta(days=31))
+        self.assertIsNone(result_cache.lookup(source_key='source-a'))
+        self.assertEqual(result_cache.evict(), 1)
+        self.assertFalse(PronunciationResultCache.objects.exists())
+
+    @override_settings(SPEAKING_RESULT_CACHE_SIZE=2)
+    def test_evicts_least_recently_used(self):
+        # Tạo thẳng các dòng (store() tự dọn cache sau mỗi lần lưu)
+        now = timezone.now()
+        for age, name in enumerate(['new', 'old', 'older']):
+            entry = PronunciationResultCache.objects.create(audio_hash=f'audio-{name}', source_hash=f'source-{name}')
+            PronunciationResultCache.objects.filter(id=entry.id).update(last_used_at=now - timedelta(hours=age))
+        self.assertEqual(result_cache.evict(), 1)
+        self.assertEqual(
+            set(PronunciationResultCache.objects.values_list('audio_hash', flat=True)), {'audio-new', 'audio-old'},
+        )
+
+    def test_store_same_audio_updates_entry(self):
+        self.store('a', source_key='source-1')
+        self.store('a', source_key='source-2')
+        self.assertEqual(PronunciationResultCache.objects.get().source_hash, 'source-2')
+
+
+class SpeakingViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='speaker', password='secret')
+        cls.other = User.objects.create_user(username='other', password='secret')
+        cls.topic = SpeakingTopic.objects.create(title='Greetings')
+        cls.sentence = SpeakingSentence.objects.create(topic=cls.topic, text='Hello there')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.audio = make_wav(bytes(range(256)) * 8)
+
+    def create_log(self, user=None, **fields):
+        log = PronunciationLog.objects.create(
+            user=user or self.user, sentence=self.sentence, status_changed_at=timezone.now(), **fields,
+        )
+        log.audio_file.save('recording.wav', ContentFile(self.audio))
+        self.addCleanup(log.audio_file.delete, save=False)
+        return log
+
+    def submit(self):
+        response = self.client.post(reverse('submit_pronunciation'), {
+            'sentence_id': self.sentence.id,
+            'audio_data': SimpleUploadedFile('recording.wav', self.audio, content_type='audio/wav'),
+        })
+        for log in PronunciationLog.objects.filter(user=self.user):
+            self.addCleanup(log.audio_file.delete, save=False)
+        return response
+
+    def test_submit_creates_job(self):
+        with mock.patch('speaking.views.get_assessment_pool') as get_pool:
+            get_pool.return_value.submit.return_value = True
+            response = self.submit()
+        self.assertEqual(response.status_code, 202)
+        log = PronunciationLog.objects.get(user=self.user)
+        self.assertEqual(response.json()['job_id'], log.id)
+        self.assertEqual(log.status, PronunciationLog.STATUS_PENDING)
+        get_pool.return_value.submit.assert_called_once_with(log.id)
+
+    def test_submit_when_pool_full(self):
+        with mock.patch('speaking.views.get_assessment_pool') as get_pool:
+            get_pool.return_value.submit.return_value = False
+            response = self.submit()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(PronunciationLog.objects.get(user=self.user).status, PronunciationLog.STATUS_FAILED)
+
+    def test_submit_cached_result(self):
+        source_key = result_cache.cache_key(self.audio, self.sentence.text)
+        result_cache.store(source_key, 'audio-key', {**SCORES, 'full_response': {'Display': 'Hello there'}})
+        with mock.patch('speaking.views.get_assessment_pool') as get_pool:
+            response = self.submit()
+        get_pool.assert_not_called()
+        payload = response.json()
+        self.assertEqual(payload['status'], PronunciationLog.STATUS_DONE)
+        self.assertEqual(payload['data']['overall_score'], SCORES['overall_score'])
+        self.assertEqual(payload['data']['full_response'], {'Display': 'Hello there'})
+
+    def test_submit_without_audio(self):
+        response = self.client.post(reverse('submit_pronunciation'), {'sentence_id': self.sentence.id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_job_status_only_for_owner(self):
+        log = self.create_log(status=PronunciationLog.STATUS_FAILED, error_message='Lỗi')
+        response = self.client.get(reverse('pronunciation_job', args=[log.id]))
+        self.assertEqual(response.json(), {'job_id': log.id, 'status': 'failed', 'message': 'Lỗi'})
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse('pronunciation_job', args=[log.id])).status_code, 404)
+
+    def test_job_events_under_wsgi_sends_one_event(self):
+        log = self.create_log()
+        response = self.client.get(reverse('pronunciation_job_events', args=[log.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn('event: status\ndata: {"job_id": %d, "status": "pending"}\n\n' % log.id, body)
+
+    def test_recording_only_for_owner(self):
+        log = self.create_log()
+        url = reverse('pronunciation_recording', args=[log.id])
+        response = self.client.get(url, headers={'range': 'bytes=0-3'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=3600')
+        self.assertEqual(b''.join(response.streaming_content), self.audio[:4])
+        response.close()
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_topic_list_not_modified(self):
+        # Lần đầu chưa có cookie CSRF (một phần của ETag) -> lấy ETag từ lần xem thứ 2
+        self.client.get(reverse('speaking_topics'))
+        response = self.client.get(reverse('speaking_topics'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('speaking_topics'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_sentence_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('sentence_list', args=[self.topic.id + 100])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('practice_sentence', args=[self.sentence.id + 100])).status_code, 404)
@@ -7,4 +7,9 @@ urlpatterns = [
     path('topics/<int:topic_id>/', views.sentence_list, name='sentence_list'),
     path('practice/<int:sentence_id>/', views.practice_sentence, name='practice_sentence'),
     path('submit-audio/', views.submit_pronunciation, name='submit_pronunciation'),
+    # Kết quả chấm của 1 job: hỏi lại định kỳ (JSON) hoặc nhận qua Server-Sent Events
+    path('jobs/<int:job_id>/', views.job_status, name='pronunciation_job'),
+    path('jobs/<int:job_id>/events/', views.job_events, name='pronunciation_job_events'),
+    # File ghi âm của 1 lần luyện (chỉ chủ sở hữu), hỗ trợ Range
+    path('recordings/<int:log_id>/', views.recording, name='pronunciation_recording'),
 ]
\ No newline at end of file
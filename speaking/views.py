@@ -1,20 +1,61 @@
+import asyncio
+import json
+import time
+
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+from django.db.models import Count, Max
+from PKL_English.conditional import conditional_page
+from PKL_English.media import serve_file
 from .models import SpeakingTopic, SpeakingSentence, PronunciationLog
-from .services.services import AzureSpeechService
+from .services import result_cache
+from .services.assessment_jobs import get_assessment_pool, job_payload
+
+
+# Version nội dung cho ETag / Last-Modified (mỗi hàm 1 câu SQL)
+def topics_version(request):
+    version = SpeakingTopic.objects.aggregate(count=Count('id'), last_modified=Max('updated_at'))
+    return (version['count'], version['last_modified']), version['last_modified']
+
+def sentences_version(request, topic_id):
+    """Topic + các câu của topic (số câu bắt được xóa)"""
+    version = SpeakingTopic.objects.filter(id=topic_id).aggregate(
+        count=Count('sentences'), topic_modified=Max('updated_at'), last_modified=Max('sentences__updated_at'),
+    )
+    if version['topic_modified'] is None:
+        return None  # Không có topic -> view trả 404
+    last_modified = max(filter(None, [version['topic_modified'], version['last_modified']]))
+    return (version['count'], version['topic_modified'], version['last_modified']), last_modified
+
+def practice_version(request, sentence_id):
+    """Câu đang luyện + các câu cùng topic (nút "câu tiếp theo")"""
+    version = SpeakingSentence.objects.filter(id=sentence_id).aggregate(
+        count=Count('topic__sentences'), last_modified=Max('topic__sentences__updated_at'),
+    )
+    if version['last_modified'] is None:
+        return None
+    return (version['count'], version['last_modified']), version['last_modified']
 
 # Trang 1: Danh sách Topic
+@conditional_page(topics_version)
 def topic_list(request):
     topics = SpeakingTopic.objects.all()
     return render(request, 'speaking/topic_list.html', {'topics': topics})
 
 # Trang 2: Danh sách Câu trong Topic
+@conditional_page(sentences_version)
 def sentence_list(request, topic_id):
     topic = get_object_or_404(SpeakingTopic, id=topic_id)
     sentences = topic.sentences.all()
     return render(request, 'speaking/sentence_list.html', {'topic': topic, 'sentences': sentences})
 
 # Trang 3: Phòng luyện tập (Chứa cả logic trang 4)
+@conditional_page(practice_version)
 def practice_sentence(request, sentence_id):
     sentence = get_object_or_404(SpeakingSentence, id=sentence_id)
     # Tìm câu tiếp theo
@@ -24,30 +65,123 @@ def practice_sentence(request, sentence_id):
         'next_sentence': next_sentence
     })
 
-# API xử lý ghi âm (Gọi từ AJAX)
+def _user_jobs(user):
+    """Log (job) user được xem: của chính user, admin xem được tất cả"""
+    logs = PronunciationLog.objects.all()
+    return logs if user.is_staff else logs.filter(user=user)
+
+# API nộp ghi âm (Gọi từ AJAX): tạo job chấm rồi trả về ngay, kết quả lấy qua job_status / job_events
+# (bài đã chấm trước đó: trả luôn kết quả, status done)
+@login_required
 def submit_pronunciation(request):
     if request.method == 'POST':
         sentence_id = request.POST.get('sentence_id')
         audio_data = request.FILES.get('audio_data')
+        if audio_data is None:
+            return JsonResponse({"status": "error", "message": "Thiếu file ghi âm"}, status=400)
         sentence = get_object_or_404(SpeakingSentence, id=sentence_id)
 
-        # Tạo log tạm để lấy file vật lý
+        # Nộp lại đúng file đã chấm (client gửi lại / học viên nộp lại): trả kết quả đã lưu ngay, không tạo job
+        cached = result_cache.lookup(source_key=result_cache.cache_key(audio_data.read(), sentence.text))
+        audio_data.seek(0)
+        if cached is not None:
+            log = PronunciationLog.objects.create(
+                user=request.user,
+                sentence=sentence,
+                audio_file=audio_data,
+                overall_score=cached['overall_score'],
+                accuracy_score=cached['accuracy_score'],
+                fluency_score=cached['fluency_score'],
+                completeness_score=cached['completeness_score'],
+                api_response=cached['full_response'],
+                status=PronunciationLog.STATUS_DONE,
+                status_changed_at=timezone.now(),
+            )
+            return JsonResponse(job_payload(log))
+
         log = PronunciationLog.objects.create(
             user=request.user,
             sentence=sentence,
-            audio_file=audio_data
+            audio_file=audio_data,
+            status_changed_at=timezone.now(),
         )
 
-        # Gọi Azure
-        result = AzureSpeechService.assess_pronunciation(log.audio_file.path, sentence.text)
-
-        if result['success']:
-            log.overall_score = result['overall_score']
-            log.accuracy_score = result['accuracy_score']
-            log.fluency_score = result['fluency_score']
-            log.completeness_score = result['completeness_score']
-            log.api_response = result['full_response']
-            log.save()
-            return JsonResponse({"status": "success", "data": result})
-        
-        return JsonResponse({"status": "error", "message": "API Error"}, status=500)
\ No newline at end of file
+        # Pool chấm của process đã đầy -> báo bận ngay, không giữ request chờ
+        if not get_assessment_pool().submit(log.id):
+            log.status = PronunciationLog.STATUS_FAILED
+            log.error_message = "Hệ thống chấm điểm đang bận"
+            log.save(update_fields=['status', 'error_message'])
+            return JsonResponse({"status": "error", "message": "Hệ thống chấm điểm đang bận, vui lòng thử lại sau giây lát"}, status=503)
+
+        return JsonResponse({
+            "status": PronunciationLog.STATUS_PENDING,
+            "job_id": log.id,
+            "status_url": reverse('pronunciation_job', args=[log.id]),
+            "events_url": reverse('pronunciation_job_events', args=[log.id]),
+        }, status=202)
+
+# Trạng thái / kết quả của 1 job chấm (client hỏi lại định kỳ)
+@login_required
+@require_safe
+def job_status(request, job_id):
+    log = get_object_or_404(_user_jobs(request.user), id=job_id)
+    return JsonResponse(job_payload(log))
+
+# Số giây giữa 2 lần đọc trạng thái job / thời gian tối đa của 1 kết nối SSE
+# (hết giờ client tự kết nối lại hoặc chuyển sang job_status)
+SSE_POLL_SECONDS = 1
+SSE_MAX_SECONDS = 60
+# Client chuyển sang hỏi lại job_status: gợi ý thời gian chờ (ms) trước lần hỏi đầu
+SSE_RETRY_MS = 1500
+
+def _sse_event(log):
+    return f"event: status\ndata: {json.dumps(job_payload(log))}\n\n"
+
+def _sse_response(content):
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx: gửi từng event ngay, không gom vào buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Kết quả job qua Server-Sent Events
+# - Chạy dưới ASGI (PKL_English.asgi): stream tới khi job xong, lúc chờ không giữ thread nào
+# - Chạy dưới WSGI (gunicorn sync): không stream được (Django phải đọc hết iterator async mới gửi, giữ thread
+#   tới SSE_MAX_SECONDS) -> gửi trạng thái hiện tại 1 lần rồi đóng, client chuyển sang hỏi lại job_status
+@login_required
+async def job_events(request, job_id):
+    logs = _user_jobs(await request.auser())
+    log = await logs.filter(id=job_id).afirst()
+    if log is None:
+        raise Http404("Không tìm thấy job")
+
+    if not isinstance(request, ASGIRequest):
+        return _sse_response([f"retry: {SSE_RETRY_MS}\n", _sse_event(log)])
+
+    async def stream():
+        last_status = None
+        current = log
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        while True:
+            if current.status != last_status:
+                last_status = current.status
+                yield _sse_event(current)
+            if current.status in (PronunciationLog.STATUS_DONE, PronunciationLog.STATUS_FAILED):
+                return
+            if time.monotonic() > deadline:
+                return
+            await asyncio.sleep(SSE_POLL_SECONDS)
+            current = await logs.aget(id=job_id)
+
+    return _sse_response(stream())
+
+# Nghe lại file ghi âm: chỉ chủ sở hữu (hoặc admin) xem được, hỗ trợ Range để tua
+@login_required
+@require_safe
+def recording(request, log_id):
+    # Không phải của user -> 404 như file không tồn tại (không lộ id log của người khác)
+    log = get_object_or_404(_user_jobs(request.user).only('audio_file'), id=log_id)
+    if not log.audio_file:
+        raise Http404("Không có file ghi âm")
+
+    return serve_file(request, log.audio_file.path, 'recordings', log.audio_file.name, 'private, max-age=3600')
@@ -0,0 +1,221 @@
+// ==========================================
+// Speaking Practice JavaScript
+// ==========================================
+
+// Đọc dữ liệu từ data container
+const pageData = document.getElementById("page-data");
+const submitUrl = pageData.dataset.submitUrl;
+const csrfToken = pageData.dataset.csrf;
+const sentenceId = pageData.dataset.sentenceId;
+const sentenceText = pageData.dataset.sentenceText;
+
+let mediaRecorder;
+let audioChunks = [];
+let recordingUrl = null;
+const recordBtn = document.getElementById("recordBtn");
+const statusText = document.getElementById("status-text");
+const micIcon = document.getElementById("mic-icon");
+
+// 1. Hàm nghe máy đọc mẫu
+function playNativeSample(text) {
+  const utterance = new SpeechSynthesisUtterance(text);
+  utterance.lang = "en-US";
+  utterance.rate = 0.85;
+  window.speechSynthesis.speak(utterance);
+}
+
+// 2. Logic Ghi âm
+recordBtn.onclick = async () => {
+  if (mediaRecorder && mediaRecorder.state === "recording") {
+    mediaRecorder.stop();
+    statusText.innerText = "Đang phân tích giọng nói của bạn...";
+    recordBtn.classList.remove("btn-pulse");
+    micIcon.className = "fas fa-spinner fa-spin fa-3x";
+    return;
+  }
+
+  try {
+    const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+    mediaRecorder = new MediaRecorder(stream);
+    audioChunks = [];
+
+    mediaRecorder.ondataavailable = (e) => audioChunks.push(e.data);
+
+    mediaRecorder.onstop = async () => {
+      const audioBlob = new Blob(audioChunks, { type: "audio/wav" });
+
+      // Tạo URL để nghe lại
+      if (recordingUrl) URL.revokeObjectURL(recordingUrl);
+      recordingUrl = URL.createObjectURL(audioBlob);
+      document.getElementById("audioPlayback").src = recordingUrl;
+
+      const formData = new FormData();
+      formData.append("audio_data", audioBlob, "recording.wav");
+      formData.append("sentence_id", sentenceId);
+      formData.append("csrfmiddlewaretoken", csrfToken);
+
+      try {
+        const response = await fetch(submitUrl, {
+          method: "POST",
+          body: formData,
+        });
+        const job = await response.json();
+
+        // Server nhận bài -> job chấm chạy nền, kết quả đến qua SSE / hỏi lại định kỳ
+        // (bài đã chấm trước đó: server trả luôn kết quả)
+        if (response.ok && !isJobFinished(job)) {
+          waitForResult(job);
+        } else {
+          finishJob(job);
+        }
+      } catch (err) {
+        console.error("Lỗi kết nối:", err);
+        alert(
+          "Không thể kết nối với Server. Kiểm tra lại Internet hoặc API Key."
+        );
+        resetUI();
+      }
+    };
+
+    mediaRecorder.start();
+    statusText.innerText = "Đang nghe... Bấm nút một lần nữa để dừng";
+    recordBtn.classList.add("btn-pulse");
+    micIcon.className = "fas fa-stop fa-3x";
+  } catch (err) {
+    alert("Vui lòng cho phép quyền truy cập Microphone.");
+  }
+};
+
+// 3. Chờ kết quả chấm (job chạy nền trên server)
+const POLL_INTERVAL = 1500;
+const POLL_MAX_ATTEMPTS = 80;
+
+function isJobFinished(payload) {
+  return payload.status === "done" || payload.status === "failed";
+}
+
+function finishJob(payload) {
+  if (payload.status === "done") {
+    showResult(payload.data);
+  } else {
+    alert("Lỗi: " + (payload.message || "Không thể chấm điểm"));
+    resetUI();
+  }
+}
+
+function waitForResult(job) {
+  if (!window.EventSource) {
+    pollResult(job.status_url, 0);
+    return;
+  }
+  const events = new EventSource(job.events_url);
+  events.addEventListener("status", (e) => {
+    const payload = JSON.parse(e.data);
+    if (isJobFinished(payload)) {
+      events.close();
+      finishJob(payload);
+    }
+  });
+  // Mất kết nối / server đóng stream khi chưa có kết quả (server WSGI chỉ gửi trạng thái hiện tại rồi đóng)
+  // -> chuyển sang hỏi lại định kỳ
+  events.onerror = () => {
+    events.close();
+    pollResult(job.status_url, 0);
+  };
+}
+
+async function pollResult(url, attempt) {
+  if (attempt >= POLL_MAX_ATTEMPTS) {
+    finishJob({ status: "failed", message: "Chấm điểm quá lâu, vui lòng thử lại" });
+    return;
+  }
+  try {
+    const response = await fetch(url, { headers: { Accept: "application/json" } });
+    const payload = await response.json();
+    if (isJobFinished(payload)) {
+      finishJob(payload);
+      return;
+    }
+  } catch (err) {
+    console.error(err);
+  }
+  setTimeout(() => pollResult(url, attempt + 1), POLL_INTERVAL);
+}
+
+// 4. Hiển thị kết quả
+function showResult(data) {
+  const exerciseArea = document.getElementById("practice-area");
+  const resultArea = document.getElementById("result-area");
+
+  exerciseArea.style.opacity = "0";
+
+  setTimeout(() => {
+    exerciseArea.style.display = "none";
+    resultArea.style.display = "block";
+    setTimeout(() => {
+      resultArea.style.opacity = "1";
+    }, 50);
+
+    // Cập nhật điểm tổng
+    document.getElementById("total-score").innerText = Math.round(
+      data.overall_score
+    );
+
+    // Cập nhật các thanh progress
+    updateMetric("accuracy", data.accuracy_score);
+    updateMetric("fluency", data.fluency_score);
+    updateMetric("completeness", data.completeness_score);
+
+    // Bôi màu từng từ
+    const feedbackContainer = document.getElementById("word-feedback");
+    feedbackContainer.innerHTML = "";
+    data.full_response.Words.forEach((word) => {
+      const span = document.createElement("span");
+      span.innerText = word.Word + " ";
+      const score = word.PronunciationAssessment.AccuracyScore;
+
+      if (score >= 80) span.className = "text-success fw-bold";
+      else if (score >= 50) span.className = "text-warning fw-bold";
+      else span.className = "text-danger fw-bold";
+
+      feedbackContainer.appendChild(span);
+    });
+  }, 300);
+}
+
+function updateMetric(id, value) {
+  const roundVal = Math.round(value);
+  const bar = document.getElementById(id + "-bar");
+  const text = document.getElementById(id + "-val");
+  setTimeout(() => {
+    bar.style.width = roundVal + "%";
+    text.innerText = roundVal + "%";
+  }, 200);
+}
+
+// 5. Nghe lại giọng người dùng
+document.getElementById("playRecordingBtn").onclick = () => {
+  const audio = document.getElementById("audioPlayback");
+  const btn = document.getElementById("playRecordingBtn");
+  if (audio.src) {
+    audio.play();
+    const originalText = btn.innerHTML;
+    btn.innerHTML = '<i class="fas fa-volume-up me-2"></i>Đang phát...';
+    btn.classList.add("disabled");
+    audio.onended = () => {
+      btn.innerHTML = originalText;
+      btn.classList.remove("disabled");
+    };
+  }
+};
+
+function resetUI() {
+  statusText.innerText = "Bấm nút để bắt đầu nói";
+  micIcon.className = "fas fa-microphone fa-3x";
+  recordBtn.classList.remove("btn-pulse");
+}
+
+// Nút nghe máy đọc mẫu (tiêu đề + màn kết quả)
+document.querySelectorAll(".btn-native-sample").forEach((btn) => {
+  btn.addEventListener("click", () => playNativeSample(sentenceText));
+});
@@ -10,9 +10,7 @@ const csrfToken = notebookData.dataset.csrf;
 
 // --- PHÁT AUDIO ---
 function playAudio(btn) {
-    const player = document.getElementById('audio-player');
-    player.src = btn.dataset.src;
-    player.play();
+    btn.nextElementSibling.play();
 }
 
 // --- XÓA ENTRY ---
@@ -47,7 +47,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // --- PHÁT AUDIO ---
 function playAudio() {
     const audio = document.getElementById('question-audio');
-    if (audio && audio.src) {
+    if (audio && audio.querySelector('source')) {
         audio.play();
         // Animation cho nút
         const btn = document.getElementById('btn-audio');
@@ -14,13 +14,40 @@ const myCard = document.getElementById('my-card');
 const pageData = document.getElementById('page-data');
 const submitUrl = pageData.dataset.submitUrl;
 const notebookUrl = pageData.dataset.notebookUrl;
+const nextUrl = pageData.dataset.nextUrl;
 const csrfToken = pageData.dataset.csrf;
-const cardId = pageData.dataset.cardId;
 const topicId = pageData.dataset.topicId;
-const vocabId = pageData.dataset.vocabId;
-const questionType = pageData.dataset.questionType;
+const deckMode = pageData.dataset.mode;
+const batchUrl = pageData.dataset.batchUrl;
+
+// Câu hỏi đang hiển thị: câu đầu do server render, các câu sau lấy từ hàng đợi tải trước
+let current = {
+    cardId: pageData.dataset.cardId,
+    vocabId: pageData.dataset.vocabId,
+    type: pageData.dataset.questionType,
+    word: pageData.dataset.word,
+    typoTolerance: parseInt(pageData.dataset.typoTolerance, 10) || 0,
+    answerForms: parseAnswerForms(pageData.dataset.answerForms),
+};
+
+// Đáp án được gom lại (localStorage) rồi gửi theo lô
+const PENDING_KEY = 'pending_answers';
+const FLUSH_EVERY = 5;
+// Đáp án gõ gần đúng (chờ server chấm) gửi lỗi: thử gửi lại tối đa NEAR_MISS_RETRIES lần
+const NEAR_MISS_RETRIES = 2;
+const NEAR_MISS_RETRY_MS = 1500;
+
+// Tải trước câu hỏi: còn ít hơn PREFETCH_LOW câu trong hàng đợi thì tải thêm PREFETCH_COUNT câu
+const PREFETCH_COUNT = 5;
+const PREFETCH_LOW = 2;
+const questionQueue = [];
+const audioCache = new Map();
+let prefetching = null;
+// Số thẻ còn lại trên server sau các câu đã tải (null: chưa biết)
+let deckRemaining = pageData.dataset.isLast === 'true' ? 0 : null;
 
 let isFlipped = false;
+let isGoingNext = false;
 
 // --- 1. HÀM LẬT THẺ (Toggle Class) ---
 function toggleCard() {
@@ -41,36 +68,134 @@ function startQuiz() {
     userInput.focus();
     
     // Tự động phát audio nếu là bài nghe
-    if (questionType === 'listening') {
+    if (current.type === 'listening') {
         setTimeout(() => { playAudio('quiz-audio'); }, 300);
     }
 }
 
-// --- 3. NỘP BÀI (GỌI API) ---
+// --- 3. NỘP BÀI (GOM ĐÁP ÁN, GỬI THEO LÔ) ---
 function submitAnswer() {
     const answer = userInput.value.trim();
+    const btnCheck = document.getElementById('btn-check');
 
-    if (!answer) return; 
+    if (!answer || btnCheck.disabled) return; 
 
     // Khóa nút để tránh spam click
-    document.getElementById('btn-check').disabled = true;
+    btnCheck.disabled = true;
+
+    const cardId = current.cardId;
+    const pending = loadPendingAnswers();
+    pending.push({ card_id: cardId, user_answer: answer, answered_at: new Date().toISOString() });
+    savePendingAnswers(pending);
+
+    const verdict = checkAnswerLocally(answer, current.word);
+    const flushing = (verdict === null || pending.length >= FLUSH_EVERY) ? flushAnswers() : null;
+    if (verdict !== null) {
+        // Chắc chắn cùng kết quả với server -> hiện ngay, server chấm lại khi nhận lô đáp án
+        handleResult({ is_correct: verdict });
+        return;
+    }
+
+    // Gõ gần đúng: chỉ server biết đáp án có phải 1 từ vựng khác không -> gửi ngay, hiện kết quả của server
+    btnCheck.textContent = 'ĐANG CHẤM...';
+    waitForServerVerdict(cardId, flushing, NEAR_MISS_RETRIES).then(isCorrect => {
+        btnCheck.textContent = 'KIỂM TRA';
+        handleResult({ is_correct: isCorrect });
+    });
+}
+
+// Kết quả server chấm cho 1 đáp án. Gửi lỗi -> thử gửi lại, vẫn lỗi -> tính là sai
+// (không tự cho là đúng: đáp án vẫn nằm trong hàng đợi, server chấm khi gửi được)
+function waitForServerVerdict(cardId, flushing, retries) {
+    return flushing.then(results => {
+        if (results) {
+            const result = results.filter(r => String(r.card_id) === String(cardId)).pop();
+            return Boolean(result && !result.error && result.is_correct);
+        }
+        if (retries <= 0) return false;
+        return new Promise(resolve => setTimeout(resolve, NEAR_MISS_RETRY_MS))
+            .then(() => waitForServerVerdict(cardId, flushAnswers(), retries - 1));
+    });
+}
+
+function parseAnswerForms(raw) {
+    try {
+        return JSON.parse(raw) || [];
+    } catch (e) {
+        return [];
+    }
+}
 
-    fetch(submitUrl, {
+function normalizeAnswer(text) {
+    return text.trim().split(/\s+/).join(' ').toLowerCase();
+}
+
+// Chấm giống server (similarity.is_answer_correct): true / false, hoặc null khi đáp án chỉ sai
+// tối đa typoTolerance ký tự so với từ gốc -> server còn loại đáp án là 1 từ vựng khác ("bat" / "cat")
+function checkAnswerLocally(answer, word) {
+    const forms = current.answerForms;
+    const tolerance = current.typoTolerance;
+    const a = normalizeAnswer(answer);
+    const w = forms.length ? forms[0] : normalizeAnswer(word);
+    if (a === w || forms.includes(a)) return true;
+    if (!tolerance || Math.abs(a.length - w.length) > tolerance) return false;
+    return editDistance(a, w) <= tolerance ? null : false;
+}
+
+function editDistance(a, b) {
+    let previous = Array.from({ length: b.length + 1 }, (_, j) => j);
+    for (let i = 1; i <= a.length; i++) {
+        const current = [i];
+        for (let j = 1; j <= b.length; j++) {
+            current.push(Math.min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] === b[j - 1] ? 0 : 1)
+            ));
+        }
+        previous = current;
+    }
+    return previous[b.length];
+}
+
+function loadPendingAnswers() {
+    try {
+        return JSON.parse(localStorage.getItem(PENDING_KEY)) || [];
+    } catch (e) {
+        return [];
+    }
+}
+
+function savePendingAnswers(pending) {
+    localStorage.setItem(PENDING_KEY, JSON.stringify(pending));
+}
+
+// Trả về kết quả chấm của server (theo thứ tự đáp án đã gửi), gửi lỗi -> null
+function flushAnswers() {
+    const pending = loadPendingAnswers();
+    if (!pending.length) return Promise.resolve(null);
+    savePendingAnswers([]);
+
+    // keepalive: request vẫn được gửi xong khi trang đã chuyển/đóng
+    return fetch(batchUrl, {
         method: "POST",
         headers: {
             "Content-Type": "application/json",
             "X-CSRFToken": csrfToken
         },
-        body: JSON.stringify({ card_id: cardId, user_answer: answer, topic_id: topicId })
+        body: JSON.stringify({ answers: pending }),
+        keepalive: true
     })
-    .then(res => res.json())
-    .then(data => {
-        handleResult(data);
+    .then(res => {
+        if (!res.ok) throw new Error(res.status);
+        return res.json();
     })
+    .then(data => data.results)
     .catch(err => {
+        // Gửi lỗi -> trả đáp án lại hàng đợi để gửi lần sau
         console.error(err);
-        alert("Lỗi kết nối server!");
-        document.getElementById('btn-check').disabled = false;
+        savePendingAnswers(pending.concat(loadPendingAnswers()));
+        return null;
     });
 }
 
@@ -84,14 +209,134 @@ function handleResult(data) {
     }
 }
 
+// --- 4. TẢI TRƯỚC + HIỂN THỊ CÂU TIẾP THEO (không tải lại trang) ---
+function prefetchQuestions() {
+    if (prefetching || deckRemaining === 0 || questionQueue.length >= PREFETCH_LOW) {
+        return prefetching || Promise.resolve();
+    }
+
+    const params = new URLSearchParams({ mode: deckMode, count: PREFETCH_COUNT });
+    if (topicId) params.set('topic_id', topicId);
+
+    prefetching = fetch(`${nextUrl}?${params}`, { headers: { "Accept": "application/json" } })
+        .then(res => {
+            if (!res.ok) throw new Error(res.status);
+            return res.json();
+        })
+        .then(data => {
+            questionQueue.push(...data.questions);
+            deckRemaining = data.remaining;
+            data.audio_manifest.forEach(sources => preloadAudio(pickAudioSource(sources)));
+        })
+        .catch(err => console.error(err))
+        .finally(() => { prefetching = null; })
+        // Cả lô toàn thẻ đã bị xóa -> tải tiếp
+        .then(() => {
+            if (!questionQueue.length && deckRemaining) return prefetchQuestions();
+        });
+    return prefetching;
+}
+
+// Giống trình duyệt chọn <source>: bản đầu tiên (nhỏ nhất) phát được
+function pickAudioSource(sources) {
+    const probe = document.createElement('audio');
+    const source = sources.find(s => !s.type || probe.canPlayType(s.type));
+    return source ? source.src : '';
+}
+
+function preloadAudio(url) {
+    if (!url || audioCache.has(url)) return;
+    const audio = new Audio();
+    audio.preload = 'auto';
+    audio.src = url;
+    audioCache.set(url, audio);
+}
+
+function setMediaSource(element, url) {
+    if (url) {
+        element.setAttribute('src', url);
+    } else {
+        element.removeAttribute('src');
+    }
+}
+
+function setAudioSources(audio, sources) {
+    audio.replaceChildren(...sources.map(s => {
+        const source = document.createElement('source');
+        source.src = s.src;
+        if (s.type) source.type = s.type;
+        return source;
+    }));
+    audio.load();
+}
+
+function renderQuestion(question) {
+    current = {
+        cardId: question.card_id,
+        vocabId: question.vocabulary_id,
+        type: question.type,
+        word: question.word,
+        typoTolerance: question.typo_tolerance || 0,
+        answerForms: parseAnswerForms(question.answer_forms),
+    };
+
+    document.getElementById('fc-word-front').textContent = question.word;
+    document.getElementById('fc-word-back').textContent = question.word;
+    document.getElementById('fc-phonetic').textContent = `/${question.phonetic}/`;
+    document.getElementById('fc-definition').textContent = question.definition;
+    setAudioSources(document.getElementById('fc-audio'), question.audio_sources);
+    document.getElementById('fc-audio-box').classList.toggle('hidden', !question.audio);
+
+    const image = document.getElementById('quiz-image');
+    setMediaSource(image, question.image);
+    image.classList.toggle('hidden', !question.image);
+    document.getElementById('quiz-instruction').textContent = question.instruction;
+    setAudioSources(document.getElementById('quiz-audio'), question.audio_sources);
+    document.getElementById('quiz-audio-box').classList.toggle('hidden', question.type !== 'listening' || !question.audio);
+    const content = document.getElementById('quiz-content');
+    content.textContent = question.content;
+    content.classList.toggle('hidden', !question.content);
+
+    document.getElementById('wrong-word').textContent = question.word;
+    document.getElementById('wrong-meaning').textContent = question.meaning;
+    document.getElementById('progress-bar').style.width = `${question.progress}%`;
+
+    // Trạng thái ban đầu của 1 thẻ mới
+    userInput.value = '';
+    document.getElementById('btn-check').disabled = false;
+    document.querySelectorAll('#btn-save-correct, #btn-save-wrong').forEach(btn => {
+        btn.innerHTML = '<i class="fas fa-bookmark me-1"></i> Lưu vào sổ tay';
+        btn.classList.remove('btn-success');
+        btn.classList.add('btn-outline-primary');
+        btn.disabled = false;
+    });
+    myCard.classList.remove('is-flipped');
+    isFlipped = false;
+    [screenQuiz, screenCorrect, screenWrong].forEach(screen => screen.classList.add('hidden'));
+    screenFlashcard.classList.remove('hidden');
+}
+
 // --- CÁC HÀM TIỆN ÍCH ---
 function playAudio(id) {
     const audio = document.getElementById(id);
-    if(audio && audio.src) audio.play();
+    if (audio && audio.querySelector('source')) audio.play();
 }
 
 function nextQuestion() {
-    location.reload();
+    if (questionQueue.length) {
+        renderQuestion(questionQueue.shift());
+        prefetchQuestions();
+        return;
+    }
+    if (prefetching) {
+        // Đang tải -> đợi xong rồi thử lại
+        prefetching.then(nextQuestion);
+        return;
+    }
+
+    // Hết bộ thẻ (hoặc không tải được) -> gửi hết đáp án rồi để server hiển thị trang kết quả / thẻ tiếp
+    isGoingNext = true;
+    flushAnswers().then(() => location.reload());
 }
 
 function saveToNotebook() {
@@ -101,7 +346,7 @@ function saveToNotebook() {
             "Content-Type": "application/json",
             "X-CSRFToken": csrfToken
         },
-        body: JSON.stringify({ vocabulary_id: vocabId })
+        body: JSON.stringify({ vocabulary_id: current.vocabId })
     })
     .then(res => res.json())
     .then(data => {
@@ -117,7 +362,15 @@ function saveToNotebook() {
 }
 
 // --- KHỞI TẠO ---
+// Rời trang học (không phải sang thẻ tiếp theo) -> gửi các đáp án còn lại
+window.addEventListener('pagehide', function() {
+    if (!isGoingNext) flushAnswers();
+});
+
 document.addEventListener('DOMContentLoaded', function() {
+    // Tải trước các câu tiếp theo trong lúc user học câu đầu
+    prefetchQuestions();
+
     // Bắt sự kiện phím Enter ở ô input
     if (userInput) {
         userInput.addEventListener("keypress", function(event) {
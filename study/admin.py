@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Topic, Vocabulary, Flashcard, StudySession, StudyLog, NotebookEntry
+from .models import Topic, Vocabulary, Flashcard, UserTopicProgress, UserStats, StudySession, StudyLog, NotebookEntry
 
 # --- Inline để thêm Vocabulary ngay trong trang Topic ---
 class VocabularyInline(admin.TabularInline):
@@ -31,16 +31,32 @@ class VocabularyAdmin(admin.ModelAdmin):
 # --- Admin cho Flashcard ---
 @admin.register(Flashcard)
 class FlashcardAdmin(admin.ModelAdmin):
-    list_display = ['user', 'vocabulary', 'mastery_level', 'last_reviewed']
+    list_display = ['user', 'vocabulary', 'mastery_level', 'last_reviewed', 'due_at']
     list_filter = ['user', 'mastery_level']
     search_fields = ['user__username', 'vocabulary__word']
 
 
+# --- Admin cho UserTopicProgress ---
+@admin.register(UserTopicProgress)
+class UserTopicProgressAdmin(admin.ModelAdmin):
+    list_display = ['user', 'topic', 'mastered_count', 'learning_count', 'total_count']
+    list_filter = ['topic']
+    search_fields = ['user__username']
+
+
+# --- Admin cho UserStats ---
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'level_0', 'level_1', 'level_2', 'level_3', 'level_4', 'level_5',
+                    'current_streak', 'longest_streak', 'last_study_date']
+    search_fields = ['user__username']
+
+
 # --- Admin cho StudySession ---
 @admin.register(StudySession)
 class StudySessionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'topic', 'start_time', 'end_time', 'score']
-    list_filter = ['user', 'topic']
+    list_display = ['user', 'mode', 'topic', 'start_time', 'end_time', 'score']
+    list_filter = ['user', 'mode', 'topic']
 
 
 # --- Admin cho StudyLog ---
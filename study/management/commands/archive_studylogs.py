@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from study.services.log_archive import archive_user_logs, get_archive_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Chuyển log học tập cũ hơn STUDYLOG_RETENTION_DAYS ra file gzip JSONL "
+        "(mỗi lô 1 file, theo user và tháng) rồi xóa khỏi study_studylog. Chạy định kỳ (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'STUDYLOG_RETENTION_DAYS', 180),
+                            help="Giữ lại log của bao nhiêu ngày gần nhất")
+        parser.add_argument('--user', type=int, help="Chỉ xử lý 1 user")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Số log mỗi lô (mặc định 5000)")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        archive_dir = get_archive_dir()
+
+        users = get_user_model().objects.order_by('id').values_list('id', flat=True)
+        if options['user']:
+            users = users.filter(id=options['user'])
+
+        total = 0
+        for user_id in users.iterator(chunk_size=500):
+            count = archive_user_logs(user_id, before, archive_dir, options['batch_size'])
+            if count:
+                self.stdout.write(f"User {user_id}: {count} log")
+            total += count
+
+        self.stdout.write(self.style.SUCCESS(f"Đã chuyển {total} log vào {archive_dir}"))
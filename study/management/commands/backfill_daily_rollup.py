@@ -0,0 +1,57 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from study.services import StatsService
+
+
+class Command(BaseCommand):
+    help = (
+        "Tính lại bảng tổng hợp theo ngày (DailyStudyRollup) từ study_studylog. "
+        "Xử lý từng user, mỗi lần 1 khoảng ngày để không quét cả bảng log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Chỉ tính lại 1 user")
+        parser.add_argument('--since', type=str, help="Chỉ tính lại từ ngày (YYYY-MM-DD)")
+        parser.add_argument('--window-days', type=int, default=31, help="Số ngày mỗi lượt (mặc định 31)")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id').values_list('id', flat=True)
+        if options['user']:
+            users = users.filter(id=options['user'])
+
+        since = None
+        if options['since']:
+            since = datetime.combine(
+                datetime.strptime(options['since'], '%Y-%m-%d').date(), time.min,
+                tzinfo=timezone.get_current_timezone(),
+            )
+        window = timedelta(days=options['window_days'])
+
+        total_rows = 0
+        for user_id in users.iterator(chunk_size=500):
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT MIN(answered_at), MAX(answered_at) FROM study_studylog WHERE user_id = %s
+                """, [user_id])
+                first, last = cursor.fetchone()
+            if first is None:
+                continue
+            # Cursor SQL thuần trả về datetime UTC không có tzinfo
+            first = timezone.make_aware(first, dt_timezone.utc) if timezone.is_naive(first) else first
+            last = timezone.make_aware(last, dt_timezone.utc) if timezone.is_naive(last) else last
+
+            # Bắt đầu từ 00:00 để mỗi lượt luôn chứa trọn ngày
+            start = datetime.combine(timezone.localdate(first), time.min, tzinfo=timezone.get_current_timezone())
+            if since and since > start:
+                start = since
+            while start <= last:
+                end = start + window
+                total_rows += StatsService.rebuild_daily_rollup(user_id, start, end)
+                start = end
+
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật {total_rows} dòng tổng hợp"))
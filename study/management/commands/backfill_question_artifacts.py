@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from study.models import Topic, Vocabulary
+from study.services.content_snapshot import publish_content_snapshot
+from study.services.question_artifacts import fill_topic_artifacts, fill_vocabulary_artifacts
+
+
+class Command(BaseCommand):
+    help = (
+        "Tính lại dữ liệu câu hỏi lưu sẵn (câu ví dụ đã che từ, dạng đáp án, URL audio/ảnh) "
+        "cho toàn bộ Vocabulary và Topic. Chạy sau khi migrate hoặc khi đổi quy tắc tính."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Số dòng mỗi lần UPDATE (mặc định 500)")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        topics = list(Topic.objects.all())
+        for topic in topics:
+            fill_topic_artifacts(topic)
+        Topic.objects.bulk_update(topics, ['image_url'], batch_size=batch_size)
+
+        # bulk_update không gửi signal -> không tạo lại thẻ / tiến độ
+        total = 0
+        batch = []
+        for vocabulary in Vocabulary.objects.order_by('id').iterator(chunk_size=batch_size):
+            fill_vocabulary_artifacts(vocabulary)
+            batch.append(vocabulary)
+            if len(batch) >= batch_size:
+                total += Vocabulary.objects.bulk_update(batch, ['masked_example', 'answer_forms', 'audio_url'])
+                batch = []
+        if batch:
+            total += Vocabulary.objects.bulk_update(batch, ['masked_example', 'answer_forms', 'audio_url'])
+
+        # bulk_update không gửi signal -> tự publish lại snapshot nội dung
+        publish_content_snapshot(bump=True)
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật {len(topics)} topic, {total} từ vựng"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from study.services import DeckService
+
+
+class Command(BaseCommand):
+    help = (
+        "Đóng phiên học không hoạt động quá STUDY_SESSION_EXPIRE_HOURS và xóa bộ thẻ (card_queue) "
+        "của các phiên đã đóng. Chạy định kỳ (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Số id phiên mỗi lần UPDATE (mặc định 1000)")
+
+    def handle(self, *args, **options):
+        total = DeckService.expire_sessions(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Đã dọn {total} phiên học"))
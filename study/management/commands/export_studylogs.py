@@ -0,0 +1,57 @@
+import csv
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from study.services.log_archive import iter_archived_logs
+
+
+class Command(BaseCommand):
+    help = "Xuất toàn bộ lịch sử trả lời của 1 user (file lưu trữ + study_studylog) ra CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, required=True)
+        parser.add_argument('--since', type=str, help="Từ ngày (YYYY-MM-DD)")
+        parser.add_argument('--until', type=str, help="Đến trước ngày (YYYY-MM-DD)")
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        return datetime.combine(
+            datetime.strptime(value, '%Y-%m-%d').date(), time.min, tzinfo=timezone.get_current_timezone()
+        )
+
+    def handle(self, *args, **options):
+        user_id = options['user']
+        start = self._parse_date(options['since'])
+        end = self._parse_date(options['until'])
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(['user_id', 'vocabulary_id', 'is_correct', 'answered_at'])
+
+        # 1. Log cũ trong file lưu trữ
+        for user_id, vocabulary_id, is_correct, answered_at in iter_archived_logs(user_id, start, end):
+            writer.writerow([user_id, vocabulary_id, int(is_correct), answered_at.isoformat()])
+
+        # 2. Log còn trong DB
+        conditions = ["user_id = %s"]
+        params = [user_id]
+        if start:
+            conditions.append("answered_at >= %s")
+            params.append(start)
+        if end:
+            conditions.append("answered_at < %s")
+            params.append(end)
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT vocabulary_id, is_correct, answered_at FROM study_studylog
+                WHERE {' AND '.join(conditions)}
+                ORDER BY answered_at ASC
+            """, params)
+            for vocabulary_id, is_correct, answered_at in cursor:
+                # Cursor SQL thuần trả về datetime UTC không có tzinfo
+                if timezone.is_naive(answered_at):
+                    answered_at = timezone.make_aware(answered_at, dt_timezone.utc)
+                writer.writerow([user_id, vocabulary_id, int(is_correct), answered_at.isoformat()])
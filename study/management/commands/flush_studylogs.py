@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from study.services.log_buffer import replay_spool
+
+
+class Command(BaseCommand):
+    help = "Ghi bù các log học tập còn nằm trong file spool (worker chết, DB lỗi)"
+
+    def handle(self, *args, **options):
+        total = replay_spool(settings.STUDYLOG_SPOOL_DIR)
+        self.stdout.write(self.style.SUCCESS(f"Đã ghi {total} log vào study_studylog"))
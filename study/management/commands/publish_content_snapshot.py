@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from study.services.content_snapshot import get_content_snapshot, get_snapshot_path, publish_content_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Tạo lại snapshot nội dung (Topic + Vocabulary) mà các worker dùng chung qua mmap và tăng version "
+        "nội dung trong DB (máy chủ khác tự tạo lại sau tối đa STUDY_CONTENT_VERSION_CHECK_SECONDS giây). "
+        "Chạy khi deploy hoặc sau khi sửa nội dung bằng SQL / lệnh không gửi signal (chỉ cần ở 1 máy)."
+    )
+
+    def handle(self, *args, **options):
+        version = publish_content_snapshot(bump=True)
+        snapshot = get_content_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã publish snapshot version {version}: {len(snapshot)} từ vựng -> {get_snapshot_path()}"
+        ))
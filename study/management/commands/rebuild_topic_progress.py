@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from study.services import ProgressService
+
+
+class Command(BaseCommand):
+    help = "Tính lại bảng tiến độ theo topic (UserTopicProgress) từ bảng study_flashcard"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topic', type=int, help="Chỉ tính lại 1 topic")
+
+    def handle(self, *args, **options):
+        count = ProgressService.rebuild_topic_progress(options['topic'])
+        self.stdout.write(self.style.SUCCESS(f"Đã tính lại {count} dòng tiến độ"))
@@ -0,0 +1,80 @@
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from study.models import Vocabulary
+from study.services.audio_variants import (
+    audio_content_key, build_audio_sources, transcode_args, transcode_audio,
+)
+from study.services.content_snapshot import publish_content_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Chuyển mã audio của toàn bộ Vocabulary thành các bản nhỏ gọn (Opus / MP3, cùng độ to) "
+        "bằng nhiều process. File gốc không đổi (cùng hash) thì bỏ qua."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Số process chạy ffmpeg (mặc định: số CPU)")
+        parser.add_argument('--batch-size', type=int, default=200, help="Số dòng mỗi lần UPDATE (mặc định 200)")
+        parser.add_argument('--force', action='store_true', help="Chuyển lại cả file đã chuyển")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        output_dir, common_args, ffmpeg = transcode_args()
+
+        # Hash file gốc ở process cha (đọc file, nhanh), chỉ file đổi mới gửi sang pool chạy ffmpeg
+        jobs = []
+        skipped = missing = 0
+        vocabularies = (
+            Vocabulary.objects.exclude(audio='').exclude(audio__isnull=True)
+            .only('id', 'audio', 'audio_url', 'audio_hash', 'audio_sources').order_by('id')
+        )
+        for vocabulary in vocabularies.iterator(chunk_size=batch_size):
+            try:
+                content_key = audio_content_key(vocabulary.audio.path)
+            except FileNotFoundError:
+                missing += 1
+                self.stderr.write(f"Không tìm thấy file audio của từ {vocabulary.id}: {vocabulary.audio.name}")
+                continue
+            if content_key == vocabulary.audio_hash and not options['force']:
+                skipped += 1
+                continue
+            jobs.append((vocabulary, content_key))
+
+        # bulk_update không gửi signal -> không chuyển mã lại / tạo lại thẻ
+        done = failed = 0
+        batch = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(transcode_audio, vocabulary.audio.path, content_key, output_dir, common_args, ffmpeg):
+                (vocabulary, content_key)
+                for vocabulary, content_key in jobs
+            }
+            for future in as_completed(futures):
+                vocabulary, content_key = futures[future]
+                try:
+                    results = future.result()
+                except (OSError, subprocess.SubprocessError) as e:
+                    failed += 1
+                    stderr = getattr(e, 'stderr', b'') or b''
+                    self.stderr.write(f"Lỗi chuyển mã từ {vocabulary.id}: {e} {stderr.decode(errors='replace').strip()}")
+                    continue
+                vocabulary.audio_hash = content_key
+                vocabulary.audio_sources = build_audio_sources(vocabulary, results)
+                batch.append(vocabulary)
+                if len(batch) >= batch_size:
+                    done += Vocabulary.objects.bulk_update(batch, ['audio_hash', 'audio_sources'])
+                    batch = []
+        if batch:
+            done += Vocabulary.objects.bulk_update(batch, ['audio_hash', 'audio_sources'])
+
+        # bulk_update không gửi signal -> tự publish lại snapshot nội dung
+        if done:
+            publish_content_snapshot(bump=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã chuyển mã {done} file, bỏ qua {skipped} file không đổi, lỗi {failed}, thiếu file {missing}"
+        ))
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from study.services import StatsService
+from study.services.log_buffer import pending_study_dates, replay_spool
+
+
+class Command(BaseCommand):
+    help = (
+        "Kiểm tra bộ đếm của user (UserStats) với bảng gốc: study_flashcard (số thẻ mỗi level) "
+        "và study_dailystudyrollup (streak). Log còn trong file spool (bộ đệm của worker, chưa ghi xuống DB) "
+        "được ghi bù / tính thêm trước khi so -> chạy trên máy chủ web (STUDYLOG_SPOOL_DIR của máy đó)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Chỉ kiểm tra 1 user")
+        parser.add_argument('--repair', action='store_true', help="Ghi lại giá trị đúng cho dòng bị lệch")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id').values_list('id', flat=True)
+        if options['user']:
+            users = users.filter(id=options['user'])
+
+        # Ghi bù file spool của worker đã chết; log worker đang chạy còn đệm thì tính thêm ngày học
+        replay_spool(settings.STUDYLOG_SPOOL_DIR)
+        pending = pending_study_dates(settings.STUDYLOG_SPOOL_DIR)
+
+        drifted = 0
+        for user_id in users.iterator(chunk_size=500):
+            drift = StatsService.verify_user_stats(
+                user_id, repair=options['repair'], pending_dates=pending.get(user_id, ()),
+            )
+            if not drift:
+                continue
+            drifted += 1
+            details = ', '.join(f"{column}: {stored} -> {expected}" for column, (stored, expected) in drift.items())
+            self.stdout.write(f"User {user_id}: {details}")
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Bộ đếm khớp với dữ liệu gốc"))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f"Đã sửa {drifted} user bị lệch"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{drifted} user bị lệch, chạy lại với --repair để sửa"))
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 10:13
+
+import django.db.models.functions.datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0006_studysession_deck'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='studysession',
+            name='study_study_user_id_813dfa_idx',
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='due_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='ease_factor',
+            field=models.FloatField(db_default=2.5),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='interval_days',
+            field=models.FloatField(db_default=0),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='repetitions',
+            field=models.IntegerField(db_default=0),
+        ),
+        migrations.AddField(
+            model_name='studysession',
+            name='mode',
+            field=models.CharField(db_default='topic', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['user', 'due_at'], name='study_flash_user_id_73c7c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'mode', 'topic', 'end_time'], name='study_study_user_id_072919_idx'),
+        ),
+    ]
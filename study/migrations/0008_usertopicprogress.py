@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 10:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Giống progress_service.MASTERED_LEVEL (migration không import code của app)
+MASTERED_LEVEL = 3
+
+
+def backfill_topic_progress(apps, schema_editor):
+    """Tạo dòng tiến độ (đã đếm sẵn) cho mọi topic user đã có thẻ trước khi có bảng này"""
+    Flashcard = apps.get_model('study', 'Flashcard')
+    Vocabulary = apps.get_model('study', 'Vocabulary')
+    UserTopicProgress = apps.get_model('study', 'UserTopicProgress')
+
+    totals = dict(Vocabulary.objects.values('topic_id').annotate(total=models.Count('id')).values_list('topic_id', 'total'))
+    rows = (
+        Flashcard.objects.values('user_id', 'vocabulary__topic_id')
+        .annotate(
+            mastered=models.Count('id', filter=models.Q(mastery_level__gte=MASTERED_LEVEL)),
+            learning=models.Count('id', filter=models.Q(mastery_level__gte=1, mastery_level__lt=MASTERED_LEVEL)),
+        )
+        .order_by()
+    )
+    UserTopicProgress.objects.bulk_create(
+        [
+            UserTopicProgress(
+                user_id=row['user_id'], topic_id=row['vocabulary__topic_id'],
+                mastered_count=row['mastered'], learning_count=row['learning'],
+                total_count=totals.get(row['vocabulary__topic_id'], 0),
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0007_flashcard_schedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTopicProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mastered_count', models.IntegerField(db_default=0)),
+                ('learning_count', models.IntegerField(db_default=0)),
+                ('total_count', models.IntegerField(db_default=0)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_progress', to='study.topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'topic')},
+            },
+        ),
+        migrations.RunPython(backfill_topic_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 10:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0008_usertopicprogress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStudyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('study_date', models.DateField()),
+                ('answer_count', models.IntegerField(db_default=0)),
+                ('correct_count', models.IntegerField(db_default=0)),
+                ('distinct_words', models.IntegerField(db_default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studylog',
+            index=models.Index(fields=['user', 'answered_at'], name='study_study_user_id_416ede_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailystudyrollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailystudyrollup',
+            unique_together={('user', 'study_date')},
+        ),
+    ]
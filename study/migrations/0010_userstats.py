@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-18 10:19
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_user_stats(apps, schema_editor):
+    """Tạo dòng UserStats cho user đã có thẻ / log trước khi có bảng này"""
+    Flashcard = apps.get_model('study', 'Flashcard')
+    StudyLog = apps.get_model('study', 'StudyLog')
+    UserStats = apps.get_model('study', 'UserStats')
+
+    stats = {}
+    rows = Flashcard.objects.values('user_id', 'mastery_level').annotate(count=models.Count('id'))
+    for row in rows:
+        values = stats.setdefault(row['user_id'], {})
+        values[f"level_{row['mastery_level']}"] = row['count']
+
+    # Ngày học lấy từ study_studylog: bảng rollup (0009) lúc migrate còn trống
+    dates = {}
+    study_dates = (
+        StudyLog.objects.annotate(study_date=TruncDate('answered_at'))
+        .values_list('user_id', 'study_date').distinct().order_by('user_id', 'study_date')
+    )
+    for user_id, study_date in study_dates:
+        dates.setdefault(user_id, []).append(study_date)
+
+    for user_id, user_dates in dates.items():
+        current = longest = 0
+        previous = None
+        for d in user_dates:
+            current = current + 1 if previous and d - previous == timedelta(days=1) else 1
+            longest = max(longest, current)
+            previous = d
+        stats.setdefault(user_id, {}).update(
+            current_streak=current, longest_streak=longest, last_study_date=previous
+        )
+
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, **values) for user_id, values in stats.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0009_dailystudyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level_0', models.IntegerField(db_default=0)),
+                ('level_1', models.IntegerField(db_default=0)),
+                ('level_2', models.IntegerField(db_default=0)),
+                ('level_3', models.IntegerField(db_default=0)),
+                ('level_4', models.IntegerField(db_default=0)),
+                ('level_5', models.IntegerField(db_default=0)),
+                ('current_streak', models.IntegerField(db_default=0)),
+                ('longest_streak', models.IntegerField(db_default=0)),
+                ('last_study_date', models.DateField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='study_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 10:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0010_userstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordAttemptStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.IntegerField(db_default=0)),
+                ('wrong_count', models.IntegerField(db_default=0)),
+                ('last_wrong_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('vocabulary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='study.vocabulary')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'wrong_count'], name='study_worda_user_id_e8670f_idx'), models.Index(fields=['user', 'last_wrong_at'], name='study_worda_user_id_e31988_idx')],
+                'unique_together': {('user', 'vocabulary')},
+            },
+        ),
+        # Tính từ log đã có
+        migrations.RunSQL(
+            """
+            INSERT INTO study_wordattemptstats (user_id, vocabulary_id, attempts, wrong_count, last_wrong_at)
+            SELECT
+                user_id,
+                vocabulary_id,
+                COUNT(*),
+                SUM(CASE WHEN is_correct = 0 THEN 1 ELSE 0 END),
+                MAX(CASE WHEN is_correct = 0 THEN answered_at END)
+            FROM study_studylog
+            GROUP BY user_id, vocabulary_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0011_wordattemptstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='image_url',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='vocabulary',
+            name='answer_forms',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vocabulary',
+            name='audio_url',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='vocabulary',
+            name='masked_example',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0013_content_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vocabulary',
+            name='audio_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='vocabulary',
+            name='audio_sources',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0014_vocabulary_audio_sources'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='served_position',
+            field=models.IntegerField(db_default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 11:14
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+def backfill_last_activity(apps, schema_editor):
+    """Phiên có sẵn: coi lần hoạt động cuối là lúc bắt đầu (giữ nguyên hạn như trước)"""
+    StudySession = apps.get_model('study', 'StudySession')
+    StudySession.objects.update(last_activity_at=models.F('start_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0015_studysession_served_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='last_activity_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    ContentVersion = apps.get_model('study', 'ContentVersion')
+    ContentVersion.objects.get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0016_studysession_last_activity_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(db_default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -5,12 +5,17 @@ from django.db import models
 from django.db import models
 from django.conf import settings  # Để gọi User đúng chuẩn
 from django.utils import timezone
+from django.db.models.functions import Now
 
 # --- 1. DỮ LIỆU TĨNH (Nội dung bài học) ---
 class Topic(models.Model):
     title = models.CharField(max_length=200, verbose_name="Tên chủ đề")
     description = models.TextField(blank=True, verbose_name="Mô tả")
     image = models.ImageField(upload_to='topic_images/', null=True, blank=True)
+    # Tính sẵn khi lưu (signals.py)
+    image_url = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # Thời điểm sửa gần nhất (ETag / Last-Modified của các trang nội dung)
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
     
     def __str__(self):
         return self.title
@@ -23,10 +28,26 @@ class Vocabulary(models.Model):
     example_sentence = models.TextField(blank=True, verbose_name="Câu ví dụ")
     meaning_sentence = models.TextField(blank=True, verbose_name="Nghĩa câu ví dụ")
     audio = models.FileField(upload_to="vocab_audio/", blank=True, null=True, verbose_name="Audio mẫu")
+
+    # Dữ liệu câu hỏi tính sẵn khi lưu (signals.py), lệnh backfill_question_artifacts cho dữ liệu cũ
+    masked_example = models.TextField(blank=True, default='', editable=False)    # Câu ví dụ đã che từ
+    answer_forms = models.JSONField(default=list, blank=True, editable=False)    # Các dạng đáp án đúng (đã chuẩn hóa)
+    audio_url = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # Các bản audio đã chuyển mã (nhỏ nhất trước, kể cả file gốc) + hash file gốc đã chuyển (services/audio_variants.py)
+    audio_sources = models.JSONField(default=list, blank=True, editable=False)
+    audio_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
     
     def __str__(self):
         return self.word
 
+class ContentVersion(models.Model):
+    """
+    Version nội dung hiện hành (1 dòng, id = 1): tăng mỗi lần publish snapshot nội dung.
+    Máy chủ nào có snapshot khác version này thì tự tạo lại snapshot của mình (services/content_snapshot.py)
+    """
+    version = models.BigIntegerField(db_default=0)
+
 # --- 2. DỮ LIỆU ĐỘNG (Tiến độ học tập của từng User) ---
 class Flashcard(models.Model):
   
@@ -36,14 +57,57 @@ class Flashcard(models.Model):
 
     mastery_level = models.IntegerField(default=0)    
     last_reviewed = models.DateTimeField(null=True, blank=True)
+
+    # Lịch ôn tập SM-2 (db_default để các lệnh INSERT SQL thuần cũng có giá trị)
+    due_at = models.DateTimeField(db_default=Now())  # Thẻ mới -> đến hạn ngay
+    interval_days = models.FloatField(db_default=0)
+    ease_factor = models.FloatField(db_default=2.5)
+    repetitions = models.IntegerField(db_default=0)
     
     class Meta:
         # Đảm bảo mỗi user chỉ có 1 thẻ flashcard cho 1 từ vựng
         unique_together = ('user', 'vocabulary') 
+        # "Cần học gì bây giờ" -> quét theo khoảng (user_id, due_at <= NOW())
+        indexes = [models.Index(fields=['user', 'due_at'])]
 
     def __str__(self):
         return f"{self.user.username} - {self.vocabulary.word} - (Lv{self.mastery_level})"
 
+class UserTopicProgress(models.Model):
+    """Tiến độ của user theo từng topic (cập nhật dần khi trả lời, không đếm lại mỗi lần xem)"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    topic = models.ForeignKey(Topic, related_name='user_progress', on_delete=models.CASCADE)
+    mastered_count = models.IntegerField(db_default=0)  # Số thẻ level >= 3
+    learning_count = models.IntegerField(db_default=0)  # Số thẻ level 1 - 2
+    total_count = models.IntegerField(db_default=0)     # Số từ vựng của topic
+
+    class Meta:
+        unique_together = ('user', 'topic')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.topic.title} ({self.mastered_count}/{self.total_count})"
+
+class UserStats(models.Model):
+    """
+    Bộ đếm thống kê của user (cập nhật ngay khi trả lời, không GROUP BY lại mỗi lần xem)
+    Kiểm tra/sửa lệch bằng lệnh verify_user_stats
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='study_stats')
+    # Số thẻ ở mỗi level
+    level_0 = models.IntegerField(db_default=0)
+    level_1 = models.IntegerField(db_default=0)
+    level_2 = models.IntegerField(db_default=0)
+    level_3 = models.IntegerField(db_default=0)
+    level_4 = models.IntegerField(db_default=0)
+    level_5 = models.IntegerField(db_default=0)
+    # Streak (số ngày học liên tục)
+    current_streak = models.IntegerField(db_default=0)
+    longest_streak = models.IntegerField(db_default=0)
+    last_study_date = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} - streak {self.current_streak}"
+
 # --- 3. LOG & SỔ TAY ---
 class StudySession(models.Model):
     """Lịch sử mỗi lần ngồi vào học"""
@@ -52,6 +116,20 @@ class StudySession(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     score = models.IntegerField(default=0) # Điểm số bài test cuối phiên
+    # Loại phiên: học theo topic / ôn thẻ đến hạn / ôn từ sai gần đây / ôn sổ tay (không gắn topic)
+    mode = models.CharField(max_length=20, db_default='topic')
+    # Bộ thẻ (deck) xếp sẵn khi bắt đầu phiên: danh sách card_id theo thứ tự học
+    card_queue = models.JSONField(default=list, blank=True)
+    position = models.IntegerField(default=0) # Vị trí thẻ chưa chấm đầu tiên trong card_queue
+    # Vị trí thẻ tiếp theo gửi cho client (tải trước): thẻ từ position tới served_position - 1 đã gửi nhưng
+    # chưa chấm, tải lại trang / học tiếp phiên thì gửi lại từ position
+    served_position = models.IntegerField(db_default=0)
+    # Lần cuối lấy thẻ / chấm đáp án trong phiên: phiên bỏ dở hết hạn tính từ lúc này (không phải start_time)
+    last_activity_at = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        # Tìm phiên đang dở (end_time IS NULL) của user theo loại phiên/topic
+        indexes = [models.Index(fields=['user', 'mode', 'topic', 'end_time'])]
 
 class StudyLog(models.Model):
     """Log chi tiết mỗi lần trả lời câu hỏi"""
@@ -62,6 +140,35 @@ class StudyLog(models.Model):
     
     class Meta:
         ordering = ['-answered_at']
+        # Đọc log của 1 user theo khoảng thời gian (rollup, thống kê)
+        indexes = [models.Index(fields=['user', 'answered_at'])]
+
+class WordAttemptStats(models.Model):
+    """Số lần trả lời / trả lời sai của user với từng từ (cập nhật khi chấm điểm)"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    vocabulary = models.ForeignKey(Vocabulary, on_delete=models.CASCADE)
+    attempts = models.IntegerField(db_default=0)
+    wrong_count = models.IntegerField(db_default=0)
+    last_wrong_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'vocabulary')
+        indexes = [
+            # Top từ sai nhiều nhất / sai gần đây nhất của 1 user
+            models.Index(fields=['user', 'wrong_count']),
+            models.Index(fields=['user', 'last_wrong_at']),
+        ]
+
+class DailyStudyRollup(models.Model):
+    """Tổng hợp log học tập theo ngày của từng user (cập nhật khi ghi log)"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    study_date = models.DateField()
+    answer_count = models.IntegerField(db_default=0)    # Số câu trả lời
+    correct_count = models.IntegerField(db_default=0)   # Số câu đúng
+    distinct_words = models.IntegerField(db_default=0)  # Số từ khác nhau đã học trong ngày
+
+    class Meta:
+        unique_together = ('user', 'study_date')
 
 class NotebookEntry(models.Model):
     """Sổ tay từ khó"""
@@ -8,14 +8,16 @@ from .utils import dictfetchall
 from .flashcard_service import FlashcardService
 from .notebook_service import NotebookService
 from .stats_service import StatsService
+from .deck_service import DeckService
+from .progress_service import ProgressService
 
 
 # Class tổng hợp - giữ tương thích ngược với code cũ
 # Các views.py cũ dùng StudyService.xxx() vẫn hoạt động
-class StudyService(FlashcardService, NotebookService, StatsService):
+class StudyService(FlashcardService, NotebookService, StatsService, DeckService, ProgressService):
     """
     Class tổng hợp tất cả service.
-    Kế thừa từ: FlashcardService, NotebookService, StatsService
+    Kế thừa từ: FlashcardService, NotebookService, StatsService, DeckService, ProgressService
     
     Sử dụng:
         from .services import StudyService
@@ -30,5 +32,7 @@ __all__ = [
     'FlashcardService',
     'NotebookService', 
     'StatsService',
+    'DeckService',
+    'ProgressService',
     'dictfetchall',
 ]
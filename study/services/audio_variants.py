@@ -0,0 +1,131 @@
+"""
+Chuyển mã audio từ vựng (file admin upload: mọi định dạng, bitrate, độ to) thành các bản nhỏ gọn
+- Mỗi file gốc -> Opus (Ogg) + MP3 mono, bitrate thấp, cùng độ to (loudnorm, EBU R128)
+- Tên bản chuyển mã theo hash nội dung file gốc + cấu hình chuyển mã: file đã chuyển (hash không đổi)
+  thì bỏ qua, nhiều từ dùng chung 1 file gốc chỉ chuyển 1 lần
+- Kết quả lưu ở Vocabulary.audio_sources: [{'src', 'type'}] nhỏ nhất trước (kể cả file gốc),
+  trang học dùng <source> theo thứ tự đó -> trình duyệt phát bản nhỏ nhất nó hỗ trợ
+
+Chạy: signal khi admin lưu từ vựng (1 file, ngay trong request) hoặc lệnh transcode_vocabulary_audio
+(toàn bộ, nhiều process). transcode_audio() không dùng DB/ORM để chạy được trong process con.
+"""
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import subprocess
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .question_artifacts import file_url
+
+logger = logging.getLogger(__name__)
+
+# Thư mục (trong MEDIA_ROOT) chứa các bản chuyển mã
+VARIANTS_DIR = 'vocab_audio/variants'
+TRANSCODE_TIMEOUT = 120
+
+# (tên, đuôi file, định dạng ffmpeg, MIME cho <source type>, tham số mã hóa)
+AUDIO_PROFILES = (
+    ('opus', '.ogg', 'ogg', 'audio/ogg; codecs=opus', ['-c:a', 'libopus', '-b:a', '24k', '-ar', '48000']),
+    ('mp3', '.mp3', 'mp3', 'audio/mpeg', ['-c:a', 'libmp3lame', '-b:a', '48k', '-ar', '44100']),
+)
+
+
+def _common_args():
+    # Mono, bỏ ảnh bìa / metadata, chuẩn hóa độ to về STUDY_AUDIO_LOUDNESS (LUFS)
+    loudness = getattr(settings, 'STUDY_AUDIO_LOUDNESS', -16)
+    return ['-vn', '-ac', '1', '-map_metadata', '-1', '-af', f'loudnorm=I={loudness}:TP=-1.5:LRA=11']
+
+
+def _profile_signature():
+    """Đổi cấu hình chuyển mã -> đổi hash -> các file được chuyển lại"""
+    return json.dumps([_common_args(), AUDIO_PROFILES]).encode()
+
+
+def audio_content_key(path):
+    """sha256 (hex) của nội dung file gốc + cấu hình chuyển mã"""
+    with open(path, 'rb') as f:
+        digest = hashlib.file_digest(f, 'sha256')
+    digest.update(_profile_signature())
+    return digest.hexdigest()
+
+
+# --- 1. CHUYỂN MÃ (chạy được trong process con) ---
+def transcode_audio(source_path, content_key, output_dir, common_args, ffmpeg='ffmpeg'):
+    """
+    Chuyển 1 file gốc thành các bản theo AUDIO_PROFILES.
+    Trả về [(tên profile, tên file, kích thước)]; lỗi ffmpeg -> CalledProcessError / TimeoutExpired
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    for name, extension, file_format, _, codec_args in AUDIO_PROFILES:
+        filename = f'{content_key[:32]}-{name}{extension}'
+        target = os.path.join(output_dir, filename)
+        # Cùng nội dung đã chuyển trước đó (từ khác dùng chung file) -> dùng lại
+        if not os.path.exists(target):
+            # Ghi file tạm rồi đổi tên: không bao giờ phục vụ file chuyển dở
+            tmp_path = f'{target}.{os.getpid()}.tmp'
+            try:
+                subprocess.run(
+                    [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+                     '-i', source_path, *common_args, *codec_args, '-f', file_format, tmp_path],
+                    check=True, capture_output=True, timeout=TRANSCODE_TIMEOUT,
+                )
+                os.replace(tmp_path, target)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        results.append((name, filename, os.path.getsize(target)))
+    return results
+
+
+def transcode_args():
+    """Tham số cho transcode_audio() ngoài file nguồn (đọc settings ở process cha)"""
+    return default_storage.path(VARIANTS_DIR), _common_args(), getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+
+
+# --- 2. GHI KẾT QUẢ VÀO VOCABULARY ---
+def _original_source(vocabulary):
+    return {'src': file_url(vocabulary.audio), 'type': mimetypes.guess_type(vocabulary.audio.name)[0] or ''}
+
+
+def build_audio_sources(vocabulary, results):
+    """[{'src', 'type'}] của các bản chuyển mã + file gốc, nhỏ nhất trước"""
+    mime_types = {profile[0]: profile[3] for profile in AUDIO_PROFILES}
+    sources = [
+        (size, {'src': default_storage.url(f'{VARIANTS_DIR}/{filename}'), 'type': mime_types[name]})
+        for name, filename, size in results
+    ]
+    sources.append((vocabulary.audio.size, _original_source(vocabulary)))
+    return [source for _, source in sorted(sources, key=lambda item: item[0])]
+
+
+def refresh_audio_variants(vocabulary):
+    """
+    Dùng khi lưu 1 từ (signal post_save, file đã được ghi vào storage): chuyển mã nếu file gốc đổi.
+    Lưu bằng UPDATE (không gửi lại signal). Lỗi (chưa cài ffmpeg, file hỏng...) -> chỉ dùng file gốc,
+    audio_hash để trống để lệnh transcode_vocabulary_audio thử lại.
+    """
+    if not vocabulary.audio:
+        fields = {'audio_url': '', 'audio_hash': '', 'audio_sources': []}
+    else:
+        audio_url = file_url(vocabulary.audio)
+        try:
+            content_key = audio_content_key(vocabulary.audio.path)
+            if content_key == vocabulary.audio_hash and vocabulary.audio_url == audio_url:
+                return
+            results = transcode_audio(vocabulary.audio.path, content_key, *transcode_args())
+            sources = build_audio_sources(vocabulary, results)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("Không chuyển mã được audio của từ %s: %s", vocabulary.pk, e)
+            content_key, sources = '', [_original_source(vocabulary)]
+        fields = {'audio_url': audio_url, 'audio_hash': content_key, 'audio_sources': sources}
+
+    if all(getattr(vocabulary, field) == value for field, value in fields.items()):
+        return
+    for field, value in fields.items():
+        setattr(vocabulary, field, value)
+    type(vocabulary).objects.filter(pk=vocabulary.pk).update(**fields)
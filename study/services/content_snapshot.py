@@ -0,0 +1,299 @@
+"""
+Bản chụp (snapshot) nội dung học chỉ đọc: Topic + Vocabulary trong 1 file nhị phân
+- Tạo lại (publish) sau mỗi lần admin lưu/xóa Topic hoặc Vocabulary (signals.py)
+- Version hiện hành nằm trong DB (study_contentversion): mỗi process so version của snapshot với DB
+  (tối đa 1 lần / STUDY_CONTENT_VERSION_CHECK_SECONDS), khác thì tạo lại file của máy mình
+  -> nhiều máy chủ, hay sửa bằng SQL rồi chạy publish_content_snapshot ở 1 máy, đều được cập nhật
+- Mỗi worker mmap cùng 1 file -> các process dùng chung 1 bản trong page cache của hệ điều hành
+- Service tra nội dung theo vocabulary_id / topic_id qua snapshot thay vì JOIN study_vocabulary, study_topic
+
+Thay bản mới nguyên tử: ghi file tạm rồi os.replace(). Worker đang đọc bản cũ vẫn giữ được
+mmap của file cũ, lần gọi get_content_snapshot() sau (os.stat thấy file đã đổi) sẽ mở bản mới.
+
+Cấu trúc file (little-endian, các mảng căn theo 8 byte):
+    header | vocab_ids (q, tăng dần) | vocab_topics (q) | topic_ids (q, tăng dần)
+           | topic_starts (q, n_topic + 1) | topic_vocab (q, id từ vựng theo topic)
+           | string_offsets (Q) | string_blob (UTF-8)
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+MAGIC = b'PKLC'
+FORMAT = 2
+HEADER = struct.Struct('<4sIQQQ')   # magic, format, version, n_vocab, n_topic
+
+# Các cột chuỗi lưu trong snapshot (answer_forms, audio_sources giữ nguyên chuỗi JSON)
+VOCAB_FIELDS = (
+    'word', 'phonetic', 'definition', 'meaning_sentence', 'audio_url', 'masked_example', 'answer_forms',
+    'audio_sources',
+)
+TOPIC_FIELDS = ('title', 'image_url')
+
+
+def get_snapshot_path():
+    return str(getattr(settings, 'STUDY_CONTENT_SNAPSHOT_PATH', settings.TEMP_ROOT / 'content' / 'snapshot.bin'))
+
+
+def _pad(length):
+    return -length % 8
+
+
+# --- 1. TẠO SNAPSHOT ---
+def read_content_version():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT version FROM study_contentversion WHERE id = 1")
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def bump_content_version():
+    """Đánh dấu nội dung đã đổi: mọi máy chủ sẽ tạo lại snapshot. Trả về version mới"""
+    # Version tăng theo thời gian (các process bump cùng lúc vẫn khác version)
+    version = time.time_ns()
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE study_contentversion SET version = %s WHERE id = 1", [version])
+        if cursor.rowcount == 0:
+            cursor.execute("INSERT INTO study_contentversion (id, version) VALUES (1, %s)", [version])
+    return version
+
+
+def _read_content():
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id, topic_id, {', '.join(VOCAB_FIELDS)} FROM study_vocabulary ORDER BY id
+        """)
+        vocabularies = cursor.fetchall()
+        cursor.execute(f"""
+            SELECT id, {', '.join(TOPIC_FIELDS)} FROM study_topic ORDER BY id
+        """)
+        topics = cursor.fetchall()
+    return vocabularies, topics
+
+
+def build_snapshot_bytes(vocabularies, topics, version):
+    """
+    vocabularies: [(id, topic_id, *VOCAB_FIELDS), ...] theo id tăng dần
+    topics: [(id, *TOPIC_FIELDS), ...] theo id tăng dần
+    """
+    topic_ids = [row[0] for row in topics]
+    by_topic = {topic_id: [] for topic_id in topic_ids}
+    for row in vocabularies:
+        by_topic.setdefault(row[1], []).append(row[0])
+    topic_starts, topic_vocab = [0], []
+    for topic_id in topic_ids:
+        topic_vocab.extend(by_topic[topic_id])
+        topic_starts.append(len(topic_vocab))
+
+    blob = bytearray()
+    offsets = []
+    for row in vocabularies:
+        for value in row[2:]:
+            offsets.append(len(blob))
+            blob += (value or '').encode('utf-8')
+    for row in topics:
+        for value in row[1:]:
+            offsets.append(len(blob))
+            blob += (value or '').encode('utf-8')
+    offsets.append(len(blob))
+
+    n_vocab, n_topic = len(vocabularies), len(topics)
+    parts = [
+        HEADER.pack(MAGIC, FORMAT, version, n_vocab, n_topic),
+        struct.pack(f'<{n_vocab}q', *(row[0] for row in vocabularies)),
+        struct.pack(f'<{n_vocab}q', *(row[1] for row in vocabularies)),
+        struct.pack(f'<{n_topic}q', *topic_ids),
+        struct.pack(f'<{n_topic + 1}q', *topic_starts),
+        struct.pack(f'<{len(topic_vocab)}q', *topic_vocab),
+        struct.pack(f'<{len(offsets)}Q', *offsets),
+        bytes(blob),
+    ]
+    return b''.join(parts)
+
+
+def publish_content_snapshot(path=None, bump=False):
+    """
+    Đọc toàn bộ nội dung từ DB, ghi snapshot (mang version trong DB) và thay bản cũ của máy này.
+    bump=True -> tăng version trong DB trước (nội dung vừa đổi, các máy khác cũng tạo lại). Trả về version
+    """
+    path = path or get_snapshot_path()
+    # Đọc version trước nội dung: nội dung đổi ngay sau đó sẽ kèm version mới -> lần kiểm tra sau tạo lại
+    version = bump_content_version() if bump else read_content_version()
+    vocabularies, topics = _read_content()
+    data = build_snapshot_bytes(vocabularies, topics, version)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return version
+
+
+# --- 2. ĐỌC SNAPSHOT ---
+class ContentSnapshot:
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Khóa nhận biết file đã bị thay (inode mới sau os.replace)
+        self.path = path
+        self.file_key = (stat.st_ino, stat.st_mtime_ns)
+
+        magic, file_format, self.version, n_vocab, n_topic = HEADER.unpack_from(self._mmap, 0)
+        # File của bản code cũ (FORMAT khác) -> get_content_snapshot() tạo lại
+        if magic != MAGIC or file_format != FORMAT:
+            raise ValueError(f"File snapshot không hợp lệ: {path}")
+
+        view = memoryview(self._mmap)
+        position = HEADER.size
+
+        def take(count, code, itemsize=8):
+            nonlocal position
+            start = position
+            position += count * itemsize
+            position += _pad(position)
+            return view[start:start + count * itemsize].cast(code)
+
+        self.vocab_ids = take(n_vocab, 'q')
+        self.vocab_topics = take(n_vocab, 'q')
+        self.topic_ids = take(n_topic, 'q')
+        self.topic_starts = take(n_topic + 1, 'q')
+        self.topic_vocab = take(self.topic_starts[-1] if n_topic else 0, 'q')
+        self.string_offsets = take(n_vocab * len(VOCAB_FIELDS) + n_topic * len(TOPIC_FIELDS) + 1, 'Q')
+        self.string_blob = view[position:]
+        self._topic_string_base = n_vocab * len(VOCAB_FIELDS)
+
+    def __len__(self):
+        return len(self.vocab_ids)
+
+    @staticmethod
+    def _find(ids, value):
+        index = bisect_left(ids, value)
+        return index if index < len(ids) and ids[index] == value else None
+
+    def _string(self, slot):
+        start, end = self.string_offsets[slot], self.string_offsets[slot + 1]
+        return str(self.string_blob[start:end], 'utf-8')
+
+    def _fields(self, base, fields):
+        return {field: self._string(base + i) for i, field in enumerate(fields)}
+
+    # --- TRA CỨU ---
+    def vocabulary(self, vocabulary_id):
+        """{'vocabulary_id', 'topic_id', word, phonetic, ...} hoặc None nếu từ không tồn tại"""
+        index = self._find(self.vocab_ids, int(vocabulary_id))
+        if index is None:
+            return None
+        data = self._fields(index * len(VOCAB_FIELDS), VOCAB_FIELDS)
+        data['vocabulary_id'] = self.vocab_ids[index]
+        data['topic_id'] = self.vocab_topics[index]
+        return data
+
+    def topic(self, topic_id):
+        """{'topic_id', 'title', 'image_url'} hoặc None"""
+        index = self._find(self.topic_ids, int(topic_id))
+        if index is None:
+            return None
+        data = self._fields(self._topic_string_base + index * len(TOPIC_FIELDS), TOPIC_FIELDS)
+        data['topic_id'] = self.topic_ids[index]
+        return data
+
+    def topic_vocabulary_ids(self, topic_id):
+        """Các id từ vựng của topic (tăng dần), [] nếu topic không có từ"""
+        index = self._find(self.topic_ids, int(topic_id))
+        if index is None:
+            return []
+        return self.topic_vocab[self.topic_starts[index]:self.topic_starts[index + 1]].tolist()
+
+    def card_content(self, vocabulary_id):
+        """Nội dung để tạo câu hỏi (cùng tên khóa với câu SELECT cũ của thẻ học)"""
+        vocabulary = self.vocabulary(vocabulary_id)
+        if vocabulary is None:
+            return None
+        topic = self.topic(vocabulary['topic_id'])
+        return {
+            'vocabulary_id': vocabulary['vocabulary_id'],
+            'word': vocabulary['word'],
+            'phonetic': vocabulary['phonetic'],
+            'definition': vocabulary['definition'],
+            'meaning': vocabulary['meaning_sentence'],
+            'audio_url': vocabulary['audio_url'],
+            'masked_example': vocabulary['masked_example'],
+            'answer_forms': vocabulary['answer_forms'],
+            'audio_sources': audio_sources(vocabulary),
+            'topic_image_url': topic['image_url'] if topic else '',
+        }
+
+    def iter_vocabulary(self):
+        """(vocabulary_id, word, phonetic) của mọi từ (tạo chỉ mục từ dễ nhầm)"""
+        word_slot = VOCAB_FIELDS.index('word')
+        phonetic_slot = VOCAB_FIELDS.index('phonetic')
+        for index, vocabulary_id in enumerate(self.vocab_ids):
+            base = index * len(VOCAB_FIELDS)
+            yield vocabulary_id, self._string(base + word_slot), self._string(base + phonetic_slot)
+
+
+def audio_sources(vocabulary):
+    """[{'src', 'type'}] nhỏ nhất trước; từ chưa chuyển mã (chưa chạy transcode_vocabulary_audio) -> file gốc"""
+    sources = json.loads(vocabulary['audio_sources'] or '[]')
+    if not sources and vocabulary['audio_url']:
+        sources = [{'src': vocabulary['audio_url'], 'type': ''}]
+    return sources
+
+
+# --- 3. SNAPSHOT DÙNG CHUNG CỦA PROCESS ---
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_version_checked_at = None
+
+
+def _open_snapshot(path):
+    """Mở file snapshot nếu đã được thay (so inode + mtime với bản đang dùng)"""
+    global _snapshot
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        publish_content_snapshot(path)
+        stat = os.stat(path)
+    if _snapshot is None or (_snapshot.path, _snapshot.file_key) != (path, (stat.st_ino, stat.st_mtime_ns)):
+        try:
+            _snapshot = ContentSnapshot(path)
+        except ValueError:
+            publish_content_snapshot(path)
+            _snapshot = ContentSnapshot(path)
+
+
+def get_content_snapshot():
+    """
+    Snapshot hiện tại (mở lại khi file đã được thay, chi phí mỗi lần gọi: 1 os.stat;
+    thêm 1 SELECT theo khóa chính mỗi STUDY_CONTENT_VERSION_CHECK_SECONDS để so version với DB).
+    Chưa có file (lần chạy đầu), file của bản code cũ hoặc version khác DB -> tạo từ DB.
+    """
+    global _version_checked_at
+    path = get_snapshot_path()
+    with _snapshot_lock:
+        _open_snapshot(path)
+
+        interval = getattr(settings, 'STUDY_CONTENT_VERSION_CHECK_SECONDS', 5)
+        now = time.monotonic()
+        if _version_checked_at is None or now - _version_checked_at >= interval:
+            _version_checked_at = now
+            version = read_content_version()
+            if _snapshot.version != version:
+                # Worker khác của máy này có thể vừa tạo xong -> mở lại file trước khi tự tạo
+                _open_snapshot(path)
+                if _snapshot.version != version:
+                    publish_content_snapshot(path)
+                    _open_snapshot(path)
+        return _snapshot
@@ -0,0 +1,284 @@
+"""
+Service xử lý bộ thẻ của phiên học (Deck)
+- Xếp thứ tự thẻ 1 lần khi bắt đầu phiên, lưu vào StudySession
+- Mỗi lượt lấy thẻ tiếp theo theo vị trí (không sort lại cả topic)
+- 2 con trỏ: served_position (thẻ đã gửi cho client, kể cả tải trước) và position (thẻ đã chấm).
+  position chỉ tăng khi đáp án được chấm -> thẻ tải trước mà chưa trả lời không bị mất khi tải lại trang
+- Phiên bỏ dở sẽ được học tiếp đúng bộ thẻ cũ, từ thẻ chưa chấm đầu tiên
+- Bộ câu hỏi ôn sổ tay (NotebookService) dùng cùng 2 con trỏ: các từ đã ôn trong phiên chính là card_queue[:position]
+- Các loại phiên: học theo topic, ôn thẻ đến hạn, ôn từ sai gần đây (không gắn topic)
+- Phiên không hoạt động (lấy thẻ / chấm đáp án, cột last_activity_at) quá STUDY_SESSION_EXPIRE_HOURS
+  không được học tiếp (xếp bộ thẻ mới), phiên đã đóng được xóa card_queue (lệnh expire_study_sessions)
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+import json
+from .utils import dictfetchall
+from .flashcard_service import FlashcardService
+from .content_snapshot import get_content_snapshot
+
+
+class DeckService:
+
+    MODE_TOPIC = 'topic'
+    MODE_DUE = 'due'
+    MODE_MISTAKES = 'mistakes'
+    # Phiên ôn sổ tay: card_queue là danh sách câu hỏi (xem NotebookService)
+    MODE_NOTEBOOK = 'notebook'
+
+    # Số thẻ tối đa của 1 phiên ôn thẻ đến hạn / ôn từ sai
+    DUE_DECK_SIZE = 50
+    MISTAKES_DECK_SIZE = 30
+
+    # --- 1. TẠO / LẤY PHIÊN ---
+    @staticmethod
+    def session_cutoff():
+        """Phiên không hoạt động từ trước thời điểm này coi như đã bỏ (thứ tự thẻ / lịch ôn đã cũ)"""
+        return timezone.now() - timedelta(hours=getattr(settings, 'STUDY_SESSION_EXPIRE_HOURS', 24))
+
+    @staticmethod
+    def get_active_session(user, mode, topic_id=None):
+        """
+        Lấy phiên đang dở của user (end_time IS NULL, chưa hết hạn) theo loại phiên/topic.
+        Chỉ đọc phần tử card_queue[position] (thẻ chưa chấm đầu tiên) chứ không tải cả danh sách.
+        """
+        with connection.cursor() as cursor:
+            # <=> so sánh được cả NULL (phiên không gắn topic)
+            cursor.execute("""
+                SELECT 
+                    s.id as session_id,
+                    s.position,
+                    s.served_position,
+                    JSON_LENGTH(s.card_queue) as total,
+                    CAST(JSON_EXTRACT(s.card_queue, CONCAT('$[', s.position, ']')) AS UNSIGNED) as card_id
+                FROM study_studysession s
+                WHERE s.user_id = %s AND s.mode = %s AND s.topic_id <=> %s AND s.end_time IS NULL
+                AND s.last_activity_at >= %s
+                ORDER BY s.id DESC
+                LIMIT 1
+            """, [user.id, mode, topic_id, DeckService.session_cutoff()])
+            rows = dictfetchall(cursor)
+            return rows[0] if rows else None
+
+    @staticmethod
+    def build_card_queue(user, mode, topic_id=None):
+        """Xếp thứ tự các thẻ của phiên mới, trả về danh sách card_id"""
+        if mode == DeckService.MODE_DUE:
+            due_cards = FlashcardService.get_due_cards(user, DeckService.DUE_DECK_SIZE)
+            return [card['card_id'] for card in due_cards]
+
+        if mode == DeckService.MODE_MISTAKES:
+            with connection.cursor() as cursor:
+                # Từ sai gần đây nhất trước (đọc theo index (user_id, last_wrong_at))
+                cursor.execute("""
+                    SELECT fc.id
+                    FROM study_wordattemptstats w
+                    JOIN study_flashcard fc ON fc.user_id = w.user_id AND fc.vocabulary_id = w.vocabulary_id
+                    WHERE w.user_id = %s AND w.last_wrong_at IS NOT NULL
+                    ORDER BY w.last_wrong_at DESC
+                    LIMIT %s
+                """, [user.id, DeckService.MISTAKES_DECK_SIZE])
+                return [row[0] for row in cursor.fetchall()]
+
+        FlashcardService.sync_topic_cards(user, topic_id)
+        vocabulary_ids = get_content_snapshot().topic_vocabulary_ids(topic_id)
+        if not vocabulary_ids:
+            return []
+        placeholders = ','.join(['%s'] * len(vocabulary_ids))
+        with connection.cursor() as cursor:
+            # Thứ tự: từ chưa ôn -> từ ôn lâu nhất -> random trong nhóm cùng thời gian
+            cursor.execute(f"""
+                SELECT fc.id
+                FROM study_flashcard fc
+                WHERE fc.user_id = %s 
+                AND fc.vocabulary_id IN ({placeholders})
+                AND fc.mastery_level < 5
+                ORDER BY 
+                    fc.last_reviewed IS NULL DESC,
+                    fc.last_reviewed ASC,
+                    RAND()
+            """, [user.id] + vocabulary_ids)
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def start_session(user, mode, topic_id=None):
+        """Bắt đầu phiên mới: xếp thứ tự toàn bộ thẻ 1 lần rồi lưu vào StudySession"""
+        card_queue = DeckService.build_card_queue(user, mode, topic_id)
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO study_studysession
+                    (user_id, topic_id, mode, start_time, last_activity_at, score, card_queue, position, served_position)
+                VALUES (%s, %s, %s, NOW(), NOW(), 0, %s, 0, 0)
+            """, [user.id, topic_id, mode, json.dumps(card_queue)])
+
+        return DeckService.get_active_session(user, mode, topic_id)
+
+    @staticmethod
+    def end_session(user, mode, topic_id=None):
+        """Đóng phiên đang dở (hết thẻ hoặc reset topic), bộ thẻ không còn cần -> xóa luôn"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE study_studysession 
+                SET end_time = NOW(), card_queue = JSON_ARRAY()
+                WHERE user_id = %s AND mode = %s AND topic_id <=> %s AND end_time IS NULL
+            """, [user.id, mode, topic_id])
+
+    # --- 2. LẤY THẺ TIẾP THEO ---
+    @staticmethod
+    def get_card(user, card_id):
+        """Lấy dữ liệu 1 thẻ theo id (tra theo khóa chính), nội dung từ vựng đọc từ snapshot"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT 
+                    fc.id as card_id,
+                    fc.mastery_level,
+                    fc.vocabulary_id
+                FROM study_flashcard fc
+                WHERE fc.id = %s AND fc.user_id = %s
+            """, [card_id, user.id])
+            rows = dictfetchall(cursor)
+        if not rows:
+            return None
+        content = get_content_snapshot().card_content(rows[0]['vocabulary_id'])
+        return rows[0] | content if content else None
+
+    @staticmethod
+    def next_card(user, mode, topic_id=None):
+        """
+        Lấy thẻ chưa chấm đầu tiên của phiên (mở trang / tải lại trang), chi phí không phụ thuộc số từ của topic.
+        Các thẻ đã tải trước nhưng chưa chấm sẽ được gửi lại sau thẻ này.
+        Trả về (card, progress, số thẻ còn lại sau thẻ này) hoặc (None, 100, 0) khi hết bộ thẻ.
+        """
+        deck = DeckService.get_active_session(user, mode, topic_id)
+        if deck is None:
+            deck = DeckService.start_session(user, mode, topic_id)
+
+        card = None
+        while deck['position'] < deck['total']:
+            card = DeckService.get_card(user, deck['card_id'])
+            if card is not None:
+                break
+            # Bỏ qua hẳn thẻ không còn tồn tại (từ vựng bị xóa sau khi xếp bộ thẻ)
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE study_studysession SET position = position + 1
+                    WHERE id = %s
+                """, [deck['session_id']])
+            deck = DeckService.get_active_session(user, mode, topic_id)
+
+        if card is None:
+            DeckService.end_session(user, mode, topic_id)
+            return None, 100, 0
+
+        # Gửi lại từ thẻ này: các thẻ tải trước sau nó chưa chấm
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE study_studysession SET served_position = position + 1, last_activity_at = NOW()
+                WHERE id = %s
+            """, [deck['session_id']])
+        progress = int((deck['position'] / deck['total']) * 100)
+        return card, progress, deck['total'] - deck['position'] - 1
+
+    @staticmethod
+    def next_cards(user, mode, topic_id=None, count=5):
+        """
+        Lấy tối đa count thẻ tiếp theo chưa gửi cho client (client tải trước, không cần tải lại trang).
+        Chỉ dời served_position; position dời khi đáp án được chấm (record_answered_cards).
+        Trả về ([(card, progress), ...], số thẻ còn lại sau các thẻ này); hết bộ thẻ -> ([], 0)
+        """
+        deck = DeckService.get_active_session(user, mode, topic_id)
+        if deck is None:
+            deck = DeckService.start_session(user, mode, topic_id)
+        if deck['served_position'] >= deck['total']:
+            # Đã gửi hết; chỉ đóng phiên khi mọi thẻ đã chấm
+            if deck['position'] >= deck['total']:
+                DeckService.end_session(user, mode, topic_id)
+            return [], 0
+
+        with connection.cursor() as cursor:
+            # Đọc đoạn card_queue[served_position .. served_position + count - 1] (đường dẫn JSON dạng $[m to n])
+            cursor.execute("""
+                SELECT JSON_EXTRACT(card_queue, CONCAT(
+                    '$[', served_position, ' to ', LEAST(served_position + %s, JSON_LENGTH(card_queue)) - 1, ']'
+                ))
+                FROM study_studysession WHERE id = %s
+            """, [count, deck['session_id']])
+            card_ids = json.loads(cursor.fetchone()[0])
+
+            cursor.execute(f"""
+                SELECT fc.id as card_id, fc.mastery_level, fc.vocabulary_id
+                FROM study_flashcard fc
+                WHERE fc.user_id = %s AND fc.id IN ({','.join(['%s'] * len(card_ids))})
+            """, [user.id] + card_ids)
+            rows = {row['card_id']: row for row in dictfetchall(cursor)}
+
+            cursor.execute("""
+                UPDATE study_studysession SET served_position = served_position + %s, last_activity_at = NOW()
+                WHERE id = %s
+            """, [len(card_ids), deck['session_id']])
+
+        # Giữ thứ tự của bộ thẻ, bỏ qua thẻ không còn tồn tại (từ vựng bị xóa sau khi xếp bộ thẻ)
+        snapshot = get_content_snapshot()
+        cards = []
+        for offset, card_id in enumerate(card_ids):
+            content = snapshot.card_content(rows[card_id]['vocabulary_id']) if card_id in rows else None
+            if content is not None:
+                progress = int(((deck['served_position'] + offset) / deck['total']) * 100)
+                cards.append((rows[card_id] | content, progress))
+        return cards, deck['total'] - deck['served_position'] - len(card_ids)
+
+    @staticmethod
+    def record_answered_cards(cursor, user_id, card_ids):
+        """
+        Gọi khi chấm đáp án (trong transaction chấm điểm): dời position của các phiên đang dở
+        qua thẻ đã chấm xa nhất trong đoạn đã gửi card_queue[position .. served_position - 1]
+        (thẻ bị xóa nằm trước thẻ đó cũng được bỏ qua). Thẻ tải trước chưa chấm giữ nguyên.
+        """
+        answered = set(card_ids)
+        cursor.execute("""
+            SELECT id, position, JSON_EXTRACT(card_queue, CONCAT('$[', position, ' to ', served_position - 1, ']'))
+            FROM study_studysession
+            WHERE user_id = %s AND end_time IS NULL AND mode IN (%s, %s, %s) AND served_position > position
+        """, [user_id, DeckService.MODE_TOPIC, DeckService.MODE_DUE, DeckService.MODE_MISTAKES])
+        for session_id, position, served in cursor.fetchall():
+            served = json.loads(served) if served else []
+            if not isinstance(served, list):
+                served = [served]
+            answered_offsets = [offset for offset, card_id in enumerate(served) if card_id in answered]
+            if answered_offsets:
+                # position = ... AND position = cũ: lô đáp án khác vừa dời thì không lùi lại
+                cursor.execute("""
+                    UPDATE study_studysession SET position = %s, last_activity_at = NOW()
+                    WHERE id = %s AND position = %s
+                """, [position + answered_offsets[-1] + 1, session_id, position])
+
+    # --- 3. DỌN PHIÊN CŨ ---
+    @staticmethod
+    def expire_sessions(batch_size=1000):
+        """
+        Đóng các phiên bỏ dở đã hết hạn và xóa card_queue của mọi phiên đã đóng
+        (giữ lại dòng phiên: thời gian, điểm). Quét theo khóa chính từng khoảng batch_size
+        để không khóa cả bảng. Trả về số phiên đã dọn.
+        """
+        cutoff = DeckService.session_cutoff()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM study_studysession")
+            max_id = cursor.fetchone()[0]
+
+            total = 0
+            for start in range(0, max_id, batch_size):
+                cursor.execute("""
+                    UPDATE study_studysession
+                    SET end_time = COALESCE(end_time, NOW()), card_queue = JSON_ARRAY()
+                    WHERE id > %s AND id <= %s
+                    AND (
+                        (end_time IS NULL AND last_activity_at < %s)
+                        OR (end_time IS NOT NULL AND JSON_LENGTH(card_queue) > 0)
+                    )
+                """, [start, start + batch_size, cutoff])
+                total += cursor.rowcount
+            return total
@@ -1,113 +1,81 @@
 """
 Service xử lý logic thẻ học (Flashcard)
-- Lấy thẻ học
+- Đồng bộ thẻ (tạo thẻ còn thiếu)
 - Tạo câu hỏi
-- Chấm điểm
+- Chấm điểm + lịch ôn tập (SM-2)
+
+Nội dung từ vựng (word, audio...) đọc từ snapshot nội dung, SQL chỉ đọc bảng thẻ.
 """
-from django.db import connection
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import random
-import re
 from .utils import dictfetchall
+from .scheduler import schedule_review
+from .log_buffer import get_study_log_buffer
+from .progress_service import ProgressService
+from .stats_service import StatsService
+from .similarity import is_answer_correct, normalize
+from .content_snapshot import get_content_snapshot
+from datetime import timedelta
+
+# Giờ trả lời client gửi lên chỉ được sớm hơn lúc server nhận tối đa chừng này
+# (bù mạng chậm / gửi lô muộn; không cho lùi ngày để giả streak)
+MAX_ANSWER_DELAY = timedelta(hours=3)
 
 
 class FlashcardService:
 
-    # --- 1. LẤY THẺ HỌC ---
+    # --- 0. ĐỒNG BỘ THẺ (Tạo thẻ còn thiếu) ---
     @staticmethod
-    def get_learning_card(user, topic_id, excluded_card_ids=None):
+    def sync_topic_cards(user, topic_id):
         """
-        Lấy 1 thẻ để học.
-        excluded_card_ids: danh sách card_id đã học trong phiên (để không lặp lại)
+        Tạo thẻ cho tất cả từ vựng của topic khi user mở topic lần đầu.
+        Chỉ 1 lệnh INSERT ... SELECT, không chạy lại ở các lần mở sau hay mỗi thẻ.
+        Trả về số thẻ mới được tạo.
         """
-        if excluded_card_ids is None:
-            excluded_card_ids = []
-        
-        with connection.cursor() as cursor:
-            # BƯỚC A: ĐỒNG BỘ DỮ LIỆU (Sync)
-            # 1. Lấy tất cả ID từ vựng của Topic này
-            cursor.execute("SELECT id FROM study_vocabulary WHERE topic_id = %s", [topic_id])
-            vocab_rows = cursor.fetchall()
-            all_vocab_ids = set([row[0] for row in vocab_rows])
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Đã có dòng tiến độ -> user từng mở topic, thẻ thêm sau do signal tạo
+            if not ProgressService.create_topic_progress(user, topic_id):
+                return 0
 
-            # 2. Lấy tất cả ID từ vựng mà User ĐÃ CÓ thẻ
+            # unique (user_id, vocabulary_id) -> IGNORE bỏ qua thẻ đã có
             cursor.execute("""
-                SELECT vocabulary_id FROM study_flashcard 
-                WHERE user_id = %s 
-                AND vocabulary_id IN (SELECT id FROM study_vocabulary WHERE topic_id = %s)
+                INSERT IGNORE INTO study_flashcard (user_id, vocabulary_id, mastery_level)
+                SELECT %s, v.id, 0
+                FROM study_vocabulary v
+                WHERE v.topic_id = %s
             """, [user.id, topic_id])
-            existing_rows = cursor.fetchall()
-            existing_vocab_ids = set([row[0] for row in existing_rows])
-
-            # 3. Tìm cái còn thiếu
-            missing_ids = all_vocab_ids - existing_vocab_ids
-
-            # 4. Tạo thẻ mới bằng lệnh INSERT (Nếu có thiếu)
-            for vid in missing_ids:
-                cursor.execute("""
-                    INSERT INTO study_flashcard (user_id, vocabulary_id, mastery_level)
-                    VALUES (%s, %s, 0) 
-                """, [user.id, vid]) 
-
-            # BƯỚC B: LẤY 1 THẺ ĐỂ HỌC (Ưu tiên từ chưa ôn gần đây)
-            # Thứ tự ưu tiên:
-            # 1. Từ chưa bao giờ ôn (last_reviewed IS NULL)
-            # 2. Từ ôn lâu nhất (last_reviewed cũ nhất)
-            # 3. Random trong nhóm cùng thời gian
-            
-            # Tạo điều kiện loại bỏ card đã học trong phiên
-            exclude_condition = ""
-            params = [user.id, topic_id]
-            
-            if excluded_card_ids:
-                placeholders = ','.join(['%s'] * len(excluded_card_ids))
-                exclude_condition = f"AND fc.id NOT IN ({placeholders})"
-                params.extend(excluded_card_ids)
-            
-            sql = f"""
-                SELECT 
-                    fc.id as card_id,
-                    fc.mastery_level,
-                    v.id as vocabulary_id,
-                    v.word,
-                    v.phonetic,
-                    v.definition,
-                    v.meaning_sentence as meaning,
-                    v.audio,
-                    v.example_sentence,
-                    t.image as topic_image
-                FROM study_flashcard fc
-                JOIN study_vocabulary v ON fc.vocabulary_id = v.id
-                JOIN study_topic t ON v.topic_id = t.id
-                WHERE fc.user_id = %s 
-                AND v.topic_id = %s
-                AND fc.mastery_level < 5
-                {exclude_condition}
-                ORDER BY 
-                    fc.last_reviewed IS NULL DESC,
-                    fc.last_reviewed ASC,
-                    RAND()
-                LIMIT 1
-            """
-
-            cursor.execute(sql, params)
-            result = dictfetchall(cursor)
-
-            if not result:
-                return None # Hết bài học
-            
-            return result[0] # Trả về dictionary của thẻ đầu tiên tìm được
-
-    # --- 2. TẠO DỮ LIỆU CÂU HỎI ---
+            created = cursor.rowcount
+            StatsService.add_new_cards(cursor, user.id, created)
+            return created
+
+    @staticmethod
+    def sync_vocabulary_cards(vocabulary_id, topic_id):
+        """
+        Admin thêm từ mới vào topic -> tạo thẻ cho mọi user đã học topic đó.
+        User chưa mở topic sẽ được tạo thẻ sau bởi sync_topic_cards().
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Cộng bộ đếm trước khi INSERT (lúc này còn biết user nào chưa có thẻ)
+            StatsService.on_vocabulary_cards_added(cursor, vocabulary_id, topic_id)
+            cursor.execute("""
+                INSERT IGNORE INTO study_flashcard (user_id, vocabulary_id, mastery_level)
+                SELECT p.user_id, %s, 0
+                FROM study_usertopicprogress p
+                WHERE p.topic_id = %s
+            """, [vocabulary_id, topic_id])
+            return cursor.rowcount
+
+    # --- 1. TẠO DỮ LIỆU CÂU HỎI ---
     @staticmethod
     def generate_question_data(card_data):
-        # card_data bây giờ là dictionary do hàm SQL trên trả về
-        
-        # Xử lý đường dẫn ảnh/audio (Vì SQL chỉ trả về chuỗi text)
-        audio_url = f"/media/{card_data['audio']}" if card_data['audio'] else ""
-        image_url = f"/media/{card_data['topic_image']}" if card_data['topic_image'] else ""
+        # card_data: thẻ (SQL) + nội dung từ vựng (snapshot)
+        # URL media, câu ví dụ đã che từ, dạng đáp án đều đã tính sẵn khi lưu từ vựng
 
         # Logic tạo câu hỏi 
-        q_type = 'fill_blank' if not card_data['audio'] or random.choice([True, False]) else 'listening'
+        q_type = 'fill_blank' if not card_data['audio_url'] or random.choice([True, False]) else 'listening'
 
         data = {
             'card_id': card_data['card_id'],
@@ -117,123 +85,280 @@ class FlashcardService:
             'phonetic': card_data['phonetic'],
             'definition': card_data['definition'],
             'meaning': card_data['meaning'],
-            'image': image_url,
-            'audio': audio_url,
+            'image': card_data['topic_image_url'],
+            'audio': card_data['audio_url'],
+            # Các bản audio nhỏ nhất trước, client chọn bản đầu tiên trình duyệt phát được
+            'audio_sources': card_data['audio_sources'],
             'instruction': "",
-            'content': ""
+            'content': "",
+            # Chuỗi JSON lấy nguyên từ snapshot, client dùng để chấm tạm ngay
+            'answer_forms': card_data['answer_forms'],
+            # Số ký tự được gõ sai (client chấm tạm ngay, server chấm lại)
+            'typo_tolerance': FlashcardService.typo_tolerance(card_data['word']),
         }
 
         if q_type == 'fill_blank':
             data['instruction'] = f"Điền từ nghĩa là: '{card_data['meaning']}'"
-            example = card_data['example_sentence']
-            word = card_data['word']
-            if example:
-                masked = re.sub(re.escape(word), '_' * len(word), example, flags=re.IGNORECASE)
-                data['content'] = masked
-            else:
-                data['content'] = "_" * len(word)
+            data['content'] = card_data['masked_example']
         else:
             data['instruction'] = "Nghe và viết lại từ vựng"
             data['content'] = "Listen carefully"
 
         return data
 
-    # --- 3. CHẤM ĐIỂM ---
+    @staticmethod
+    def typo_tolerance(word):
+        if len(normalize(word)) < getattr(settings, 'STUDY_TYPO_MIN_LENGTH', 5):
+            return 0
+        return getattr(settings, 'STUDY_TYPO_TOLERANCE', 1)
+
+    # --- 2. CHẤM ĐIỂM ---
     @staticmethod
     def check_answer(user, card_id, user_answer):
-        with connection.cursor() as cursor:
-            # 1. Lấy thông tin đúng từ DB để so sánh
-            cursor.execute("""
-                SELECT fc.mastery_level, fc.vocabulary_id, v.word, v.meaning_sentence, v.phonetic, v.audio 
+        """Chấm 1 đáp án (dùng chung đường chấm theo lô)"""
+        results = FlashcardService.check_answers_batch(user, [
+            {'card_id': card_id, 'user_answer': user_answer}
+        ])
+        result = results[0]
+        if 'error' in result:
+            return None
+        del result['card_id']
+        return result
+
+    @staticmethod
+    def check_answers_batch(user, answers):
+        """
+        Chấm nhiều đáp án trong 1 transaction.
+        answers: [{'card_id', 'user_answer', 'answered_at' (ISO, tùy chọn)}, ...]
+        Chỉ 1 SELECT và 1 UPDATE (CASE theo id); log được ghi theo lô qua bộ đệm.
+        Trả về kết quả theo đúng thứ tự answers.
+        """
+        now = timezone.now()
+
+        # 0. Chuẩn hóa dữ liệu gửi lên
+        items = []
+        for answer in answers:
+            try:
+                card_id = int(answer.get('card_id'))
+            except (TypeError, ValueError):
+                card_id = None
+            try:
+                answered_at = parse_datetime(str(answer.get('answered_at') or ''))
+            except ValueError:
+                answered_at = None
+            if answered_at is None:
+                answered_at = now
+            elif timezone.is_naive(answered_at):
+                answered_at = timezone.make_aware(answered_at)
+            # Không tin giờ client ở tương lai hoặc quá xa trong quá khứ
+            answered_at = min(max(answered_at, now - MAX_ANSWER_DELAY), now)
+            items.append({
+                'card_id': card_id,
+                'user_answer': str(answer.get('user_answer') or ''),
+                'answered_at': answered_at,
+            })
+
+        card_ids = sorted({item['card_id'] for item in items if item['card_id'] is not None})
+        if not card_ids:
+            return [{'card_id': item['card_id'], 'error': 'not_found'} for item in items]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # 1. Lấy thông tin đúng từ DB để so sánh (khóa các thẻ trong lô)
+            placeholders = ','.join(['%s'] * len(card_ids))
+            cursor.execute(f"""
+                SELECT fc.id as card_id, fc.mastery_level, fc.vocabulary_id,
+                       fc.repetitions, fc.interval_days, fc.ease_factor
                 FROM study_flashcard fc
-                JOIN study_vocabulary v ON fc.vocabulary_id = v.id
-                WHERE fc.id = %s AND fc.user_id = %s
-            """, [card_id, user.id])
-            
-            row = dictfetchall(cursor)
-            if not row: return None
-            
-            card_info = row[0]
-            current_level = card_info['mastery_level']
-            correct_word = card_info['word']
-            vocabulary_id = card_info['vocabulary_id']
-
-            # 2. So sánh đáp án
-            is_correct = user_answer.strip().lower() == correct_word.strip().lower()
-            new_level = current_level
-
-            # 3. Tính điểm mới
-            if is_correct:
-                if current_level < 5: new_level += 1
-            else:
-                if current_level > 0: new_level -= 1
-
-            # 4. UPDATE lại vào Database 
-            if new_level != current_level:
-                cursor.execute("""
-                    UPDATE study_flashcard 
-                    SET mastery_level = %s, last_reviewed = NOW()
-                    WHERE id = %s
-                """, [new_level, card_id])
-
-            # 5. Lưu log thống kê
-            cursor.execute("""
-                INSERT INTO study_studylog (user_id, vocabulary_id, is_correct, answered_at)
-                VALUES (%s, %s, %s, NOW())
-            """, [user.id, vocabulary_id, is_correct])
-
-            return {
-                'is_correct': is_correct,
-                'new_level': new_level,
-                'word': correct_word,
-                'phonetic': card_info['phonetic'],
-                'meaning': card_info['meaning_sentence'],
-                'audio': f"/media/{card_info['audio']}" if card_info['audio'] else ""
-            }
+                WHERE fc.user_id = %s AND fc.id IN ({placeholders})
+                FOR UPDATE
+            """, [user.id] + card_ids)
+            # Từ, phiên âm, dạng đáp án, topic... lấy từ snapshot (không JOIN study_vocabulary)
+            snapshot = get_content_snapshot()
+            cards = {}
+            for row in dictfetchall(cursor):
+                vocabulary = snapshot.vocabulary(row['vocabulary_id'])
+                if vocabulary is not None:
+                    cards[row['card_id']] = row | vocabulary
+            original_levels = {card_id: card['mastery_level'] for card_id, card in cards.items()}
+
+            # 2. Chấm lần lượt theo thời điểm trả lời (1 thẻ có thể xuất hiện nhiều lần)
+            results = [None] * len(items)
+            updated = {}
+            logs = []
+            order = sorted(range(len(items)), key=lambda i: items[i]['answered_at'])
+            for i in order:
+                item = items[i]
+                card_info = cards.get(item['card_id'])
+                if card_info is None:
+                    results[i] = {'card_id': item['card_id'], 'error': 'not_found'}
+                    continue
+
+                is_correct, new_state = FlashcardService.grade_card(
+                    card_info, item['user_answer'], item['answered_at']
+                )
+                card_info.update(new_state)
+                updated[item['card_id']] = card_info
+                logs.append((user.id, card_info['vocabulary_id'], is_correct, item['answered_at']))
+
+                results[i] = {
+                    'card_id': item['card_id'],
+                    'is_correct': is_correct,
+                    'new_level': card_info['mastery_level'],
+                    'word': card_info['word'],
+                    'phonetic': card_info['phonetic'],
+                    'meaning': card_info['meaning_sentence'],
+                    'audio': card_info['audio_url']
+                }
+
+            if updated:
+                # 3. UPDATE tất cả thẻ trong 1 lệnh
+                FlashcardService._bulk_update_cards(cursor, list(updated.values()))
+
+                # Cập nhật bảng tiến độ theo topic
+                ProgressService.apply_level_changes(cursor, user.id, [
+                    (card['topic_id'], original_levels[card_id], card['mastery_level'])
+                    for card_id, card in updated.items()
+                ])
+
+                # Cập nhật bộ đếm level + streak của user
+                StatsService.apply_answer_stats(
+                    cursor, user.id,
+                    [(original_levels[card_id], card['mastery_level']) for card_id, card in updated.items()],
+                    {timezone.localdate(log[3]) for log in logs}
+                )
+
+                # Số lần trả lời / sai của từng từ (cho "từ hay sai nhất", ôn từ sai)
+                StatsService.record_attempts(cursor, user.id, logs)
+
+                # Dời vị trí thẻ đã chấm của phiên đang học (import ở đây: deck_service import module này)
+                from .deck_service import DeckService
+                DeckService.record_answered_cards(cursor, user.id, list(updated))
+
+                # 4. Lưu log thống kê qua bộ đệm (ghi theo lô), chỉ khi chấm điểm đã commit
+                transaction.on_commit(lambda: get_study_log_buffer().add(logs))
+
+        return results
 
-    # --- 4. TIẾN ĐỘ TOPIC ---
     @staticmethod
-    def get_topic_progress(user, topic_id):
-        with connection.cursor() as cursor:
-            # Lấy tổng số từ vựng trong topic
-            cursor.execute("SELECT COUNT(id) FROM study_vocabulary WHERE topic_id = %s", [topic_id])
-            total_vocab = cursor.fetchone()[0]
+    def grade_card(card_info, user_answer, answered_at):
+        """
+        Chấm 1 đáp án cho thẻ (không truy cập DB).
+        Trả về (is_correct, trạng thái mới của thẻ)
+        """
+        current_level = card_info['mastery_level']
 
-            if total_vocab == 0:
-                return 0
+        # So sánh đáp án (các dạng chia đã tính sẵn, chấp nhận lỗi gõ nhẹ)
+        is_correct = is_answer_correct(user_answer, card_info['word'], card_info['answer_forms'])
+        new_level = current_level
+
+        # Tính điểm mới
+        if is_correct:
+            if current_level < 5: new_level += 1
+        else:
+            if current_level > 0: new_level -= 1
 
-            # Lấy số từ vựng đã thuộc (mastery_level >= 3)
+        # Tính lịch ôn tiếp theo (SM-2)
+        schedule = schedule_review(
+            is_correct, card_info['repetitions'], card_info['interval_days'],
+            card_info['ease_factor'], answered_at
+        )
+
+        new_state = {
+            'mastery_level': new_level,
+            'last_reviewed': answered_at,
+            'due_at': schedule['due_at'],
+            'interval_days': schedule['interval_days'],
+            'ease_factor': schedule['ease_factor'],
+            'repetitions': schedule['repetitions'],
+        }
+        return is_correct, new_state
+
+    @staticmethod
+    def _bulk_update_cards(cursor, cards):
+        """UPDATE nhiều thẻ trong 1 lệnh bằng CASE id WHEN ... THEN ..."""
+        columns = ['mastery_level', 'last_reviewed', 'due_at', 'interval_days', 'ease_factor', 'repetitions']
+        set_clauses = []
+        params = []
+        for column in columns:
+            whens = ' '.join(['WHEN %s THEN %s'] * len(cards))
+            set_clauses.append(f"{column} = CASE id {whens} END")
+            for card in cards:
+                params.extend([card['card_id'], card[column]])
+
+        card_ids = [card['card_id'] for card in cards]
+        placeholders = ','.join(['%s'] * len(card_ids))
+        cursor.execute(f"""
+            UPDATE study_flashcard 
+            SET {', '.join(set_clauses)}
+            WHERE id IN ({placeholders})
+        """, params + card_ids)
+
+    # --- 3. THẺ ĐẾN HẠN ÔN TẬP ---
+    @staticmethod
+    def get_due_cards(user, limit=50):
+        """
+        Lấy các thẻ đến hạn ôn (mọi topic), hạn sớm nhất trước.
+        Quét theo khoảng trên index (user_id, due_at), không sort cả bảng.
+        """
+        with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT COUNT(fc.id)
+                SELECT 
+                    fc.id as card_id,
+                    fc.mastery_level,
+                    fc.due_at,
+                    fc.vocabulary_id
                 FROM study_flashcard fc
-                JOIN study_vocabulary v ON fc.vocabulary_id = v.id
-                WHERE fc.user_id = %s AND v.topic_id = %s AND fc.mastery_level >= 3
-            """, [user.id, topic_id])
-            mastered_count = cursor.fetchone()[0]
+                WHERE fc.user_id = %s AND fc.due_at <= NOW()
+                ORDER BY fc.due_at ASC
+                LIMIT %s
+            """, [user.id, limit])
+            rows = dictfetchall(cursor)
 
-            progress = int((mastered_count / total_vocab) * 100)
-            return progress
+        snapshot = get_content_snapshot()
+        cards = []
+        for row in rows:
+            vocabulary = snapshot.vocabulary(row['vocabulary_id'])
+            if vocabulary is not None:
+                cards.append(row | {'word': vocabulary['word'], 'topic_id': vocabulary['topic_id']})
+        return cards
 
+    @staticmethod
+    def count_due_cards(user):
+        """Đếm số thẻ đến hạn ôn (dùng index (user_id, due_at))"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*) FROM study_flashcard
+                WHERE user_id = %s AND due_at <= NOW()
+            """, [user.id])
+            return cursor.fetchone()[0]
+
+    # --- 4. TIẾN ĐỘ TOPIC ---
     @staticmethod
     def count_cards_to_learn(user, topic_id):
         """Đếm số thẻ cần học (level < 5)"""
+        vocabulary_ids = get_content_snapshot().topic_vocabulary_ids(topic_id)
+        if not vocabulary_ids:
+            return 0
+        placeholders = ','.join(['%s'] * len(vocabulary_ids))
         with connection.cursor() as cursor:
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT COUNT(fc.id)
                 FROM study_flashcard fc
-                JOIN study_vocabulary v ON fc.vocabulary_id = v.id
-                WHERE fc.user_id = %s AND v.topic_id = %s AND fc.mastery_level < 5
-            """, [user.id, topic_id])
+                WHERE fc.user_id = %s AND fc.vocabulary_id IN ({placeholders}) AND fc.mastery_level < 5
+            """, [user.id] + vocabulary_ids)
             return cursor.fetchone()[0]
 
     @staticmethod
     def reset_topic_progress(user, topic_id):
         """Reset tiến độ học của 1 topic về level 0"""
-        with connection.cursor() as cursor:
+        with transaction.atomic(), connection.cursor() as cursor:
+            StatsService.reset_topic_levels(cursor, user.id, topic_id)
             cursor.execute("""
                 UPDATE study_flashcard fc
                 JOIN study_vocabulary v ON fc.vocabulary_id = v.id
-                SET fc.mastery_level = 0, fc.last_reviewed = NULL
+                SET fc.mastery_level = 0, fc.last_reviewed = NULL,
+                    fc.due_at = NOW(), fc.interval_days = 0, fc.ease_factor = 2.5, fc.repetitions = 0
                 WHERE fc.user_id = %s AND v.topic_id = %s
             """, [user.id, topic_id])
-            return {'status': 'reset', 'message': 'Đã reset tiến độ'}
+            ProgressService.reset_topic_counts(user, topic_id)
+        return {'status': 'reset', 'message': 'Đã reset tiến độ'}
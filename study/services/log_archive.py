@@ -0,0 +1,170 @@
+"""
+Lưu trữ log học tập cũ (study_studylog) ra file nén
+- Mỗi lô 1 file gzip JSONL: <archive_dir>/<user_id>/<YYYY-MM>/<id log đầu lô>.jsonl.gz
+- Trước khi chuyển, tạo rollup cho các ngày chưa có (thống kê không đổi sau khi xóa log)
+- Chuyển theo lô: ghi lô ra file tạm, fsync, đổi tên thành file lô (atomic) rồi mới DELETE lô đó khỏi DB
+- Đọc lại log đã lưu trữ bằng iter_archived_logs() (xuất file, tính lại thống kê)
+
+Dừng giữa chừng: file tạm dở dang không bao giờ được đọc; đã đổi tên mà chưa DELETE thì
+lần chạy sau ghi lại lô đó (cùng tên file nếu cùng lô, ghi đè), iter_archived_logs() bỏ qua dòng trùng id.
+"""
+import glob
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .stats_service import StatsService
+
+
+def get_archive_dir():
+    return str(getattr(settings, 'STUDYLOG_ARCHIVE_DIR', settings.BASE_DIR / 'archive' / 'studylog'))
+
+
+def archive_month_dir(archive_dir, user_id, year, month):
+    return os.path.join(archive_dir, str(user_id), f'{year:04d}-{month:02d}')
+
+
+def _write_batch(path, rows):
+    """Ghi 1 lô ra file tạm rồi đổi tên -> file lô luôn đầy đủ (hoặc không có)"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.tmp-{os.getpid()}'
+    with open(temp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            for log_id, vocabulary_id, is_correct, answered_at in rows:
+                f.write((json.dumps({
+                    'id': log_id,
+                    'vocabulary_id': vocabulary_id,
+                    'is_correct': bool(is_correct),
+                    'answered_at': _aware(answered_at).isoformat(),
+                }) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(temp_path, path)
+
+    # fsync thư mục để lần đổi tên cũng nằm trên đĩa trước khi DELETE
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _aware(value):
+    # Cursor SQL thuần trả về datetime UTC không có tzinfo
+    return timezone.make_aware(value, dt_timezone.utc) if timezone.is_naive(value) else value
+
+
+def _month_start(value):
+    return datetime.combine(value.replace(day=1), time.min, tzinfo=timezone.get_current_timezone())
+
+
+def _next_month(start):
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+# --- 1. CHUYỂN LOG CŨ RA FILE ---
+def archive_user_logs(user_id, before, archive_dir=None, batch_size=5000):
+    """
+    Chuyển log của 1 user có answered_at < before ra file nén.
+    Trả về số log đã chuyển.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    # Chỉ chuyển trọn ngày để rollup của ngày đó không bị thiếu log
+    before = datetime.combine(timezone.localdate(before), time.min, tzinfo=timezone.get_current_timezone())
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT MIN(answered_at) FROM study_studylog WHERE user_id = %s
+        """, [user_id])
+        first = cursor.fetchone()[0]
+    if first is None or _aware(first) >= before:
+        return 0
+
+    total = 0
+    month = _month_start(timezone.localdate(_aware(first)))
+    while month < before:
+        end = min(_next_month(month), before)
+        # Rollup phải có đủ các ngày trước khi log bị xóa khỏi DB
+        StatsService.fill_missing_daily_rollup(user_id, month, end)
+        total += _archive_range(user_id, month, end, archive_dir, batch_size)
+        month = _next_month(month)
+    return total
+
+
+def _archive_range(user_id, start, end, archive_dir, batch_size):
+    """Chuyển log trong [start, end) (cùng 1 tháng) vào thư mục của tháng đó"""
+    month_dir = archive_month_dir(archive_dir, user_id, start.year, start.month)
+    total = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Đọc theo index (user_id, answered_at); lô trước đã bị xóa nên luôn đọc từ đầu khoảng
+            cursor.execute("""
+                SELECT id, vocabulary_id, is_correct, answered_at
+                FROM study_studylog
+                WHERE user_id = %s AND answered_at >= %s AND answered_at < %s
+                ORDER BY answered_at ASC, id ASC
+                LIMIT %s
+                FOR UPDATE
+            """, [user_id, start, end, batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                return total
+
+            # File đã nằm trên đĩa thì mới xóa log khỏi DB
+            _write_batch(os.path.join(month_dir, f'{rows[0][0]}.jsonl.gz'), rows)
+
+            ids = [row[0] for row in rows]
+            placeholders = ','.join(['%s'] * len(ids))
+            cursor.execute(f"DELETE FROM study_studylog WHERE id IN ({placeholders})", ids)
+            total += len(rows)
+
+
+# --- 2. ĐỌC LOG ĐÃ LƯU TRỮ ---
+def list_archives(user_id, archive_dir=None):
+    """Các tháng đã lưu trữ của user, theo thứ tự tháng: [(year, month, [file lô, ...]), ...]"""
+    archive_dir = archive_dir or get_archive_dir()
+    archives = []
+    for month_dir in sorted(glob.glob(os.path.join(archive_dir, str(user_id), '*-*'))):
+        try:
+            year, month = (int(part) for part in os.path.basename(month_dir).split('-'))
+        except ValueError:
+            continue
+        # File tạm (*.tmp-<pid>) của lô đang ghi / ghi dở không khớp mẫu -> không đọc
+        paths = sorted(glob.glob(os.path.join(month_dir, '*.jsonl.gz')))
+        if paths:
+            archives.append((year, month, paths))
+    return archives
+
+
+def iter_archived_logs(user_id, start=None, end=None, archive_dir=None):
+    """
+    Đọc log đã lưu trữ của user trong [start, end) theo thứ tự thời gian.
+    Trả về từng dòng (user_id, vocabulary_id, is_correct, answered_at) - cùng dạng với StatsService.write_logs
+    """
+    for year, month, paths in list_archives(user_id, archive_dir):
+        month_start = datetime(year, month, 1, tzinfo=timezone.get_current_timezone())
+        if (end and month_start >= end) or (start and _next_month(month_start) <= start):
+            continue
+
+        seen = set()
+        rows = []
+        for path in paths:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    event = json.loads(line)
+                    if event['id'] in seen:
+                        continue  # Lô bị ghi 2 lần (dừng giữa chừng, lần sau chia lô khác)
+                    seen.add(event['id'])
+                    answered_at = datetime.fromisoformat(event['answered_at'])
+                    if (start and answered_at < start) or (end and answered_at >= end):
+                        continue
+                    rows.append((user_id, event['vocabulary_id'], event['is_correct'], answered_at))
+
+        rows.sort(key=lambda row: row[3])
+        yield from rows
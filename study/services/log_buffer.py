@@ -0,0 +1,305 @@
+"""
+Ghi log học tập theo lô (write-behind) cho bảng study_studylog
+- Gom log trong bộ nhớ, ghi bằng 1 INSERT nhiều dòng khi đủ số lượng hoặc quá thời gian
+- Mỗi log được ghi ngay vào file spool (JSONL) trên đĩa -> worker chết cũng không mất log
+- File spool còn sót lại (worker chết, DB lỗi) được ghi bù bởi replay_spool()
+
+Đảm bảo "ít nhất 1 lần": nếu worker chết đúng lúc vừa INSERT xong mà chưa kịp
+xóa file spool thì lần ghi bù có thể tạo log trùng.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class StudyLogBuffer:
+
+    def __init__(self, spool_dir, max_size=100, max_age=5.0, fsync=False):
+        self.spool_dir = str(spool_dir)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.fsync = fsync
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._events = []
+        self._spool = None
+        self._spool_path = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    # --- 1. NHẬN LOG ---
+    def add(self, rows):
+        """
+        Thêm log vào bộ đệm.
+        rows: [(user_id, vocabulary_id, is_correct, answered_at), ...]
+        """
+        if not rows:
+            return
+
+        with self._lock:
+            spool = self._open_spool()
+            for user_id, vocabulary_id, is_correct, answered_at in rows:
+                event = {
+                    'user_id': user_id,
+                    'vocabulary_id': vocabulary_id,
+                    'is_correct': bool(is_correct),
+                    'answered_at': answered_at.isoformat(),
+                }
+                spool.write(json.dumps(event) + '\n')
+                self._events.append(event)
+            spool.flush()
+            if self.fsync:
+                os.fsync(spool.fileno())
+            is_full = len(self._events) >= self.max_size
+
+        self._start_timer()
+        if is_full:
+            # Đủ lô -> đánh thức luồng nền ghi ngay, request không phải chờ INSERT
+            self._wake.set()
+
+    # --- 2. GHI XUỐNG DB ---
+    def flush(self):
+        """Ghi toàn bộ log đang đệm bằng 1 INSERT nhiều dòng"""
+        with self._lock:
+            if not self._events:
+                return 0
+            # Tách file spool hiện tại thành 1 segment riêng, log mới sẽ ghi sang file khác
+            segment_path = self._close_spool()
+            self._events = []
+
+        return _replay_claimed(segment_path)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception:
+            # Log vẫn còn trong file spool, sẽ được ghi bù
+            logger.exception("Không ghi được log học tập khi tắt worker")
+
+    # --- 3. TIỆN ÍCH ---
+    def _open_spool(self):
+        if self._spool is None:
+            self._spool_path = os.path.join(
+                self.spool_dir, f'studylog-{process_token()}-{uuid.uuid4().hex}.jsonl'
+            )
+            self._spool = open(self._spool_path, 'a', encoding='utf-8')
+        return self._spool
+
+    def _close_spool(self):
+        self._spool.close()
+        segment_path = _claim(self._spool_path)
+        self._spool = None
+        self._spool_path = None
+        return segment_path
+
+    def _start_timer(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_timer, name='studylog-flush', daemon=True)
+        self._thread.start()
+
+    def _run_timer(self):
+        """Luồng nền: flush theo chu kỳ max_age và ghi bù các file spool còn sót"""
+        while True:
+            self._wake.wait(self.max_age)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.flush()
+                replay_spool(self.spool_dir)
+            except Exception:
+                logger.exception("Không ghi được log học tập, sẽ thử lại sau")
+            finally:
+                # Luồng nền có kết nối DB riêng -> đóng lại sau mỗi lượt
+                connection.close()
+
+
+# --- GHI BÙ FILE SPOOL ---
+# Vòng đời file spool:
+#   studylog-<token>-<uuid>.jsonl          đang được worker <token> ghi
+#   ... .jsonl.replay-<token>               worker <token> đang INSERT vào DB
+# <token> = <pid>.<lần khởi động máy + thời điểm process bắt đầu> (process_token): PID được dùng lại
+# cho process khác (sau khi worker chết / khởi động lại máy) vẫn khác token
+#   ... .jsonl.ready                        INSERT lỗi, chờ ghi bù
+def replay_segment(path):
+    """Ghi 1 file spool vào DB rồi xóa file. Trả về số log đã ghi."""
+    from .stats_service import StatsService
+
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # Dòng cuối bị ghi dở khi worker chết
+                continue
+            rows.append((
+                event['user_id'],
+                event['vocabulary_id'],
+                event['is_correct'],
+                datetime.fromisoformat(event['answered_at']),
+            ))
+
+    StatsService.write_logs(rows)
+    os.remove(path)
+    return len(rows)
+
+
+def _claim(path):
+    """Đổi tên file để chỉ process hiện tại xử lý nó (os.replace là atomic)"""
+    claimed = f"{path.split('.replay-')[0]}.replay-{process_token()}"
+    os.replace(path, claimed)
+    return claimed
+
+
+def _replay_claimed(claimed):
+    try:
+        return replay_segment(claimed)
+    except Exception:
+        # Trả lại file để lần sau ghi bù
+        base = claimed.split('.replay-')[0]
+        os.replace(claimed, base if base.endswith('.ready') else base + '.ready')
+        raise
+
+
+def _is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid):
+    """Lần khởi động máy + thời điểm process bắt đầu (Linux, /proc); None nếu không đọc được"""
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'rb') as f:
+            boot_id = f.read().strip().replace(b'-', b'')[:8]
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Tên lệnh (trường 2) có thể chứa khoảng trắng -> tách sau dấu ')' cuối; starttime là trường 22
+    return (boot_id + b'x' + stat.rsplit(b')', 1)[1].split()[19]).decode()
+
+
+_token = None
+_token_pid = None
+
+
+def process_token():
+    """Token của process hiện tại trong tên file spool (tạo lại nếu process được fork)"""
+    global _token, _token_pid
+    pid = os.getpid()
+    if _token_pid != pid:
+        # Không có /proc (Windows, macOS) -> uuid riêng của process
+        _token = f'{pid}.{_process_start(pid) or uuid.uuid4().hex}'
+        _token_pid = pid
+    return _token
+
+
+def _is_owner_alive(token):
+    """Process ghi / đang ghi bù file (theo token trong tên file) còn sống không"""
+    if token == process_token():
+        return True
+    pid, _, start = token.partition('.')
+    pid = int(pid)
+    if pid == os.getpid():
+        return False  # Process cũ trùng PID với process này
+    if not _is_process_alive(pid):
+        return False
+    # File đặt tên theo PID (bản cũ) hoặc không đọc được /proc -> chỉ dựa vào PID
+    current = _process_start(pid)
+    return not start or current is None or current == start
+
+
+def replay_spool(spool_dir):
+    """
+    Ghi bù các file spool còn sót: segment INSERT lỗi (.ready)
+    và file của worker đã chết. Trả về số log đã ghi.
+    """
+    total = 0
+    for path in sorted(glob.glob(os.path.join(str(spool_dir), 'studylog-*.jsonl*'))):
+        name = os.path.basename(path)
+        if '.replay-' in name:
+            owner = name.rsplit('-', 1)[1]
+        elif name.endswith('.jsonl'):
+            owner = name.split('-')[1]
+        elif name.endswith('.ready'):
+            owner = None
+        else:
+            continue
+        if owner is not None and _is_owner_alive(owner):
+            continue  # Worker còn sống đang xử lý file này
+
+        try:
+            claimed = _claim(path)
+        except FileNotFoundError:
+            continue  # Process khác đã nhận file
+        total += _replay_claimed(claimed)
+    return total
+
+
+def pending_study_dates(spool_dir):
+    """
+    Ngày học của các log còn trong file spool (chưa có trong study_studylog):
+    bộ đệm của worker đang chạy, segment đang / chờ ghi bù. Trả về {user_id: {ngày, ...}}
+    """
+    dates = {}
+    for path in glob.glob(os.path.join(str(spool_dir), 'studylog-*.jsonl*')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            continue  # Vừa ghi xong và bị xóa
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            answered_at = datetime.fromisoformat(event['answered_at'])
+            dates.setdefault(event['user_id'], set()).add(timezone.localdate(answered_at))
+    return dates
+
+
+# --- BỘ ĐỆM DÙNG CHUNG CỦA PROCESS ---
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_study_log_buffer():
+    """Mỗi process (worker) có 1 bộ đệm riêng, tạo lại nếu process được fork"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = StudyLogBuffer(
+                spool_dir=getattr(settings, 'STUDYLOG_SPOOL_DIR', settings.TEMP_ROOT / 'studylog_spool'),
+                max_size=getattr(settings, 'STUDYLOG_BUFFER_SIZE', 100),
+                max_age=getattr(settings, 'STUDYLOG_FLUSH_SECONDS', 5.0),
+                fsync=getattr(settings, 'STUDYLOG_SPOOL_FSYNC', False),
+            )
+            atexit.register(_buffer.close)
+        return _buffer
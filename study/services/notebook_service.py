@@ -1,12 +1,18 @@
 """
 Service xử lý logic Sổ tay từ vựng (Notebook)
 - Thêm/xóa/sửa từ trong sổ tay
-- Ôn tập sổ tay
+- Ôn tập sổ tay (bộ câu hỏi xếp sẵn 1 lần cho mỗi phiên). Như bộ thẻ học (DeckService): served_position là
+  câu đã hiện, position chỉ tăng khi nộp đáp án -> tải lại trang / quay lại không làm mất câu chưa trả lời
+
+Nội dung từ vựng đọc từ snapshot nội dung, SQL chỉ đọc bảng sổ tay / phiên.
 """
 from django.db import connection
+import json
 import random
-import re
 from .utils import dictfetchall
+from .deck_service import DeckService
+from .similarity import get_similarity_index, is_answer_correct
+from .content_snapshot import audio_sources, get_content_snapshot
 
 
 class NotebookService:
@@ -63,133 +69,219 @@ class NotebookService:
                     nb.id as entry_id,
                     nb.note,
                     nb.added_at,
-                    v.id as vocabulary_id,
-                    v.word,
-                    v.phonetic,
-                    v.meaning_sentence,
-                    v.audio,
-                    t.title as topic_title
+                    nb.vocabulary_id
                 FROM study_notebookentry nb
-                JOIN study_vocabulary v ON nb.vocabulary_id = v.id
-                JOIN study_topic t ON v.topic_id = t.id
                 WHERE nb.user_id = %s
                 ORDER BY nb.added_at DESC
             """, [user.id])
-            return dictfetchall(cursor)
+            entries = dictfetchall(cursor)
+
+        snapshot = get_content_snapshot()
+        notebook = []
+        for entry in entries:
+            vocabulary = snapshot.vocabulary(entry['vocabulary_id'])
+            if vocabulary is None:
+                continue
+            topic = snapshot.topic(vocabulary['topic_id'])
+            notebook.append(entry | {
+                'word': vocabulary['word'],
+                'phonetic': vocabulary['phonetic'],
+                'meaning_sentence': vocabulary['meaning_sentence'],
+                'audio_url': vocabulary['audio_url'],
+                'audio_sources': audio_sources(vocabulary),
+                'topic_title': topic['title'] if topic else '',
+            })
+        return notebook
 
     # --- 2. ÔN TẬP SỔ TAY ---
+    # Số đáp án của câu hỏi listening (1 đúng + 3 sai)
+    NOTEBOOK_OPTION_COUNT = 4
+
     @staticmethod
-    def get_notebook_review_question(user, excluded_vocab_ids=None):
+    def build_notebook_deck(user):
         """
-        Lấy 1 câu hỏi ôn tập từ sổ tay.
+        Xếp bộ câu hỏi ôn tập 1 lần khi bắt đầu phiên: thứ tự, loại câu hỏi và đáp án nhiễu của từng câu.
         Có 2 loại: listening (nghe chọn đáp án) và fill_blank (điền từ vào chỗ trống)
+        Trả về [{'id', 'type', 'options'}, ...] hoặc [] nếu sổ tay có ít hơn 2 từ
         """
-        if excluded_vocab_ids is None:
-            excluded_vocab_ids = []
-        
         with connection.cursor() as cursor:
-            # Lấy tất cả từ trong notebook
             cursor.execute("""
-                SELECT 
-                    v.id as vocabulary_id,
-                    v.word,
-                    v.phonetic,
-                    v.meaning_sentence,
-                    v.example_sentence,
-                    v.definition,
-                    v.audio
-                FROM study_notebookentry nb
-                JOIN study_vocabulary v ON nb.vocabulary_id = v.id
-                WHERE nb.user_id = %s
+                SELECT vocabulary_id FROM study_notebookentry WHERE user_id = %s
             """, [user.id])
-            all_vocabs = dictfetchall(cursor)
-            
-            if len(all_vocabs) < 2:
-                return None  # Cần ít nhất 2 từ để tạo câu hỏi
-            
-            # Lọc bỏ các từ đã ôn trong phiên
-            available_vocabs = [v for v in all_vocabs if v['vocabulary_id'] not in excluded_vocab_ids]
-            
-            if not available_vocabs:
-                return None  # Hết từ để ôn
-            
-            # Chọn ngẫu nhiên 1 từ làm câu hỏi chính
-            # Ưu tiên từ có audio cho listening
-            vocabs_with_audio = [v for v in available_vocabs if v['audio'] and v['audio'] != '']
-            vocabs_word = [v for v in available_vocabs if v['word'] and v['word'] != '']
-            
-            # Ưu tiên random giữa 2 loại nếu cả 2 đều có từ phù hợp
-            if vocabs_with_audio and vocabs_word:
+            vocabulary_ids = [row[0] for row in cursor.fetchall()]
+
+        # Chỉ cần id + có audio/word hay không, dữ liệu từ được đọc khi hiện câu hỏi
+        snapshot = get_content_snapshot()
+        rows = []
+        for vocabulary_id in vocabulary_ids:
+            vocabulary = snapshot.vocabulary(vocabulary_id)
+            if vocabulary is not None:
+                rows.append((vocabulary_id, vocabulary['word'], vocabulary['audio_url']))
+
+        if len(rows) < 2:
+            return []  # Cần ít nhất 2 từ để tạo câu hỏi
+
+        all_ids = [row[0] for row in rows]
+        similarity = get_similarity_index()
+        distractor_count = NotebookService.NOTEBOOK_OPTION_COUNT - 1
+        deck = []
+        for vocabulary_id, word, audio in rows:
+            # Random giữa 2 loại nếu từ phù hợp cả 2
+            if audio and word:
                 q_type = random.choice(['listening', 'fill_blank'])
-                if q_type == 'listening':
-                    correct_vocab = random.choice(vocabs_with_audio)
-                else:
-                    correct_vocab = random.choice(vocabs_word)
-            elif vocabs_with_audio:
+            elif audio:
                 q_type = 'listening'
-                correct_vocab = random.choice(vocabs_with_audio)
-            elif vocabs_word:
-                q_type = 'fill_blank'
-                correct_vocab = random.choice(vocabs_word)
             else:
-                # Không có từ phù hợp
-                correct_vocab = random.choice(available_vocabs)
-                q_type = 'fill_blank'  # Fallback
-            
-            result = {
-                'vocabulary_id': correct_vocab['vocabulary_id'],
-                'word': correct_vocab['word'],
-                'phonetic': correct_vocab['phonetic'],
-                'meaning': correct_vocab['meaning_sentence'],
-                'definition': correct_vocab.get('definition', correct_vocab['meaning_sentence']),
-                'audio': f"/media/{correct_vocab['audio']}" if correct_vocab['audio'] else "",
-                'type': q_type
-            }
-            
+                q_type = 'fill_blank'
+
+            item = {'id': vocabulary_id, 'type': q_type}
             if q_type == 'listening':
-                # Tạo các đáp án sai (lấy từ các từ khác)
-                other_vocabs = [v for v in all_vocabs if v['vocabulary_id'] != correct_vocab['vocabulary_id']]
-                wrong_options = random.sample(other_vocabs, min(len(other_vocabs), 3))
-                
-                # Tạo danh sách đáp án và xáo trộn
-                options = [{
-                    'vocabulary_id': correct_vocab['vocabulary_id'],
-                    'word': correct_vocab['word'],
-                    'is_correct': True
-                }]
-                
-                for v in wrong_options:
-                    options.append({
-                        'vocabulary_id': v['vocabulary_id'],
-                        'word': v['word'],
-                        'is_correct': False
-                    })
-                
+                # Đáp án nhiễu: các từ dễ nhầm nhất (cách viết / phiên âm gần giống)
+                options = [vocabulary_id] + similarity.most_similar(vocabulary_id, distractor_count)
+                if len(options) < NotebookService.NOTEBOOK_OPTION_COUNT:
+                    # Thiếu từ giống -> bổ sung ngẫu nhiên từ sổ tay (lấy thừa phòng trùng)
+                    sample = random.sample(all_ids, min(len(all_ids), NotebookService.NOTEBOOK_OPTION_COUNT * 2))
+                    options += [i for i in sample if i not in options][:NotebookService.NOTEBOOK_OPTION_COUNT - len(options)]
                 random.shuffle(options)
-                result['options'] = options
-                result['instruction'] = 'Nghe và chọn đáp án đúng'
-                
-            else:  # fill_blank
-                # Tạo câu có chỗ trống
-                example = correct_vocab['example_sentence']
-                word = correct_vocab['word']
-                masked = re.sub(re.escape(word), '_' * len(word), example, flags=re.IGNORECASE)
-                result['content'] = masked
-                result['instruction'] = f"Điền từ nghĩa là: '{correct_vocab['meaning_sentence']}'"
-            
-            return result
+                item['options'] = options
+            deck.append(item)
+
+        random.shuffle(deck)
+        return deck
 
     @staticmethod
-    def count_notebook_reviewable(user):
-        """Đếm số từ trong notebook có thể ôn tập"""
+    def get_notebook_deck(user):
+        """Phiên ôn sổ tay đang dở (chưa hết hạn): chỉ đọc phần tử card_queue[position] (câu chưa trả lời đầu tiên)"""
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT COUNT(nb.id)
-                FROM study_notebookentry nb
-                JOIN study_vocabulary v ON nb.vocabulary_id = v.id
-                WHERE nb.user_id = %s
-            """, [user.id])
-            return cursor.fetchone()[0]
+                SELECT 
+                    s.id as session_id,
+                    s.position,
+                    s.served_position,
+                    JSON_LENGTH(s.card_queue) as total,
+                    JSON_EXTRACT(s.card_queue, CONCAT('$[', s.position, ']')) as item
+                FROM study_studysession s
+                WHERE s.user_id = %s AND s.mode = %s AND s.topic_id IS NULL AND s.end_time IS NULL
+                AND s.last_activity_at >= %s
+                ORDER BY s.id DESC
+                LIMIT 1
+            """, [user.id, DeckService.MODE_NOTEBOOK, DeckService.session_cutoff()])
+            rows = dictfetchall(cursor)
+        if not rows:
+            return None
+        deck = rows[0]
+        deck['item'] = json.loads(deck['item']) if deck['item'] else None
+        return deck
+
+    @staticmethod
+    def start_notebook_deck(user):
+        """Bắt đầu phiên ôn sổ tay mới. Trả về None nếu không đủ từ để ôn"""
+        deck = NotebookService.build_notebook_deck(user)
+        if not deck:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO study_studysession (user_id, topic_id, mode, start_time, last_activity_at, score, card_queue, position)
+                VALUES (%s, NULL, %s, NOW(), NOW(), 0, %s, 0)
+            """, [user.id, DeckService.MODE_NOTEBOOK, json.dumps(deck)])
+        return NotebookService.get_notebook_deck(user)
+
+    @staticmethod
+    def next_notebook_question(user):
+        """
+        Lấy câu hỏi chưa trả lời đầu tiên của phiên ôn sổ tay, chi phí không phụ thuộc số từ trong sổ tay.
+        Không dời position: tải lại trang / quay lại vẫn là câu này, câu chỉ qua khi nộp đáp án (record_review_answer).
+        Trả về (question, số thứ tự câu, tổng số câu); hết câu -> (None, total, total);
+        sổ tay ít hơn 2 từ -> (None, 0, 0)
+        """
+        deck = NotebookService.get_notebook_deck(user) or NotebookService.start_notebook_deck(user)
+        if deck is None:
+            return None, 0, 0
+
+        question = None
+        while deck['position'] < deck['total']:
+            question = NotebookService._build_review_question(deck['item'])
+            if question is not None:
+                break
+            # Bỏ qua hẳn câu có từ không còn tồn tại (bị xóa sau khi xếp bộ câu hỏi, không trả lời được)
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE study_studysession SET position = position + 1
+                    WHERE id = %s
+                """, [deck['session_id']])
+            deck = NotebookService.get_notebook_deck(user)
+
+        if question is None:
+            DeckService.end_session(user, DeckService.MODE_NOTEBOOK)
+            return None, deck['total'], deck['total']
+
+        # Đánh dấu câu đang hiện là đã gửi (chỉ câu đã gửi mới nộp đáp án được)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE study_studysession SET served_position = position + 1, last_activity_at = NOW()
+                WHERE id = %s
+            """, [deck['session_id']])
+        return question, deck['position'] + 1, deck['total']
+
+    @staticmethod
+    def record_review_answer(user, vocabulary_id):
+        """
+        Gọi khi nộp đáp án ôn tập (kể cả bỏ qua): qua câu tiếp theo nếu đáp án là của câu đang hiện.
+        Nộp lại lần 2 / nộp từ trang cũ (quay lại) không dời thêm. Trả về True nếu đã qua câu.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE study_studysession SET position = position + 1, last_activity_at = NOW()
+                WHERE user_id = %s AND mode = %s AND topic_id IS NULL AND end_time IS NULL
+                AND position < served_position
+                AND CAST(JSON_EXTRACT(card_queue, CONCAT('$[', position, '].id')) AS UNSIGNED) = %s
+            """, [user.id, DeckService.MODE_NOTEBOOK, vocabulary_id])
+            return cursor.rowcount > 0
+
+    @staticmethod
+    def _build_review_question(item):
+        """Tạo câu hỏi từ 1 phần tử của bộ câu hỏi (đọc snapshot, không truy vấn DB)"""
+        snapshot = get_content_snapshot()
+        vocabs = {}
+        for vocabulary_id in [item['id']] + item.get('options', []):
+            vocabulary = snapshot.vocabulary(vocabulary_id)
+            if vocabulary is not None:
+                vocabs[vocabulary_id] = vocabulary
+
+        correct_vocab = vocabs.get(item['id'])
+        if correct_vocab is None:
+            return None
+
+        q_type = item['type']
+        result = {
+            'vocabulary_id': correct_vocab['vocabulary_id'],
+            'word': correct_vocab['word'],
+            'phonetic': correct_vocab['phonetic'],
+            'meaning': correct_vocab['meaning_sentence'],
+            'definition': correct_vocab['definition'],
+            'audio': correct_vocab['audio_url'],
+            'audio_sources': audio_sources(correct_vocab),
+            'type': q_type
+        }
+
+        if q_type == 'listening':
+            # Đáp án đã được xáo trộn sẵn khi xếp bộ câu hỏi
+            result['options'] = [
+                {
+                    'vocabulary_id': vocabulary_id,
+                    'word': vocabs[vocabulary_id]['word'],
+                    'is_correct': vocabulary_id == item['id']
+                }
+                for vocabulary_id in item['options'] if vocabulary_id in vocabs
+            ]
+            result['instruction'] = 'Nghe và chọn đáp án đúng'
+
+        else:  # fill_blank
+            # Câu có chỗ trống đã tính sẵn khi lưu từ vựng
+            result['content'] = correct_vocab['masked_example']
+            result['instruction'] = f"Điền từ nghĩa là: '{correct_vocab['meaning_sentence']}'"
+
+        return result
 
     @staticmethod
     def check_review_answer(vocabulary_id, selected_vocab_id):
@@ -200,14 +292,10 @@ class NotebookService:
     @staticmethod
     def check_fill_blank_review(vocabulary_id, user_answer):
         """Kiểm tra đáp án ôn tập (fill_blank)"""
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT word FROM study_vocabulary WHERE id = %s
-            """, [vocabulary_id])
-            row = cursor.fetchone()
-            if not row:
-                return {'is_correct': False}
-            
-            correct_word = row[0]
-            is_correct = user_answer.strip().lower() == correct_word.strip().lower()
-            return {'is_correct': is_correct}
+        vocabulary = get_content_snapshot().vocabulary(vocabulary_id)
+        if vocabulary is None:
+            return {'is_correct': False}
+
+        # Chấp nhận dạng chia + lỗi gõ nhẹ giống trang học
+        is_correct = is_answer_correct(user_answer, vocabulary['word'], vocabulary['answer_forms'])
+        return {'is_correct': is_correct}
@@ -0,0 +1,174 @@
+"""
+Service xử lý bảng tiến độ theo topic (UserTopicProgress)
+- Cập nhật dần số thẻ đã thuộc / đang học khi level thay đổi
+- Cập nhật tổng số từ khi admin thêm/xóa từ vựng
+- Tính lại toàn bộ từ bảng study_flashcard (lệnh rebuild_topic_progress)
+"""
+from django.db import connection, transaction
+
+# Ngưỡng level được tính là đã thuộc (giống trang danh sách topic)
+MASTERED_LEVEL = 3
+
+
+def level_bucket(level):
+    """Nhóm của 1 level: 'mastered' (>= 3), 'learning' (1 - 2) hoặc None (level 0)"""
+    if level >= MASTERED_LEVEL:
+        return 'mastered'
+    if level > 0:
+        return 'learning'
+    return None
+
+
+class ProgressService:
+
+    # --- 1. TẠO DÒNG TIẾN ĐỘ ---
+    @staticmethod
+    def create_topic_progress(user, topic_id):
+        """
+        Tạo dòng tiến độ khi user mở topic lần đầu, đếm luôn các thẻ user đã có trong topic
+        (thẻ tạo trước khi có dòng tiến độ: ôn thẻ đến hạn, dữ liệu cũ...) để bộ đếm đúng ngay từ đầu.
+        Trả về True nếu vừa tạo mới (user chưa từng mở topic này).
+        """
+        with connection.cursor() as cursor:
+            # Thẻ đọc theo unique (user_id, vocabulary_id), chỉ các từ của 1 topic
+            cursor.execute("""
+                INSERT IGNORE INTO study_usertopicprogress (user_id, topic_id, mastered_count, learning_count, total_count)
+                SELECT
+                    %s,
+                    t.id,
+                    COALESCE(SUM(fc.mastery_level >= %s), 0),
+                    COALESCE(SUM(fc.mastery_level BETWEEN 1 AND %s), 0),
+                    COUNT(v.id)
+                FROM study_topic t
+                LEFT JOIN study_vocabulary v ON v.topic_id = t.id
+                LEFT JOIN study_flashcard fc ON fc.user_id = %s AND fc.vocabulary_id = v.id
+                WHERE t.id = %s
+                GROUP BY t.id
+            """, [user.id, MASTERED_LEVEL, MASTERED_LEVEL - 1, user.id, topic_id])
+            return cursor.rowcount == 1
+
+    # --- 2. CẬP NHẬT KHI TRẢ LỜI ---
+    @staticmethod
+    def apply_level_changes(cursor, user_id, changes):
+        """
+        Cộng dồn thay đổi level vào bảng tiến độ.
+        changes: [(topic_id, old_level, new_level), ...] -> 1 UPDATE cho mỗi topic có thay đổi
+        """
+        deltas = {}
+        for topic_id, old_level, new_level in changes:
+            old_bucket, new_bucket = level_bucket(old_level), level_bucket(new_level)
+            if old_bucket == new_bucket:
+                continue
+            delta = deltas.setdefault(topic_id, {'mastered': 0, 'learning': 0})
+            if old_bucket:
+                delta[old_bucket] -= 1
+            if new_bucket:
+                delta[new_bucket] += 1
+
+        for topic_id, delta in deltas.items():
+            cursor.execute("""
+                UPDATE study_usertopicprogress
+                SET mastered_count = mastered_count + %s, learning_count = learning_count + %s
+                WHERE user_id = %s AND topic_id = %s
+            """, [delta['mastered'], delta['learning'], user_id, topic_id])
+
+    @staticmethod
+    def reset_topic_counts(user, topic_id):
+        """Reset topic -> mọi thẻ về level 0"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE study_usertopicprogress
+                SET mastered_count = 0, learning_count = 0
+                WHERE user_id = %s AND topic_id = %s
+            """, [user.id, topic_id])
+
+    # --- 3. CẬP NHẬT KHI ADMIN SỬA TỪ VỰNG ---
+    @staticmethod
+    def on_vocabulary_added(topic_id):
+        """Thêm từ -> tăng tổng số từ của topic cho mọi user (thẻ mới ở level 0)"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE study_usertopicprogress
+                SET total_count = total_count + 1
+                WHERE topic_id = %s
+            """, [topic_id])
+
+    @staticmethod
+    def on_vocabulary_deleted(vocabulary_id, topic_id):
+        """
+        Gọi TRƯỚC khi xóa từ (thẻ của từ vẫn còn) để trừ đúng nhóm level của từng user
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE study_usertopicprogress p
+                LEFT JOIN study_flashcard fc ON fc.user_id = p.user_id AND fc.vocabulary_id = %s
+                SET p.total_count = p.total_count - 1,
+                    p.mastered_count = p.mastered_count - (COALESCE(fc.mastery_level, 0) >= %s),
+                    p.learning_count = p.learning_count - (COALESCE(fc.mastery_level, 0) BETWEEN 1 AND %s)
+                WHERE p.topic_id = %s
+            """, [vocabulary_id, MASTERED_LEVEL, MASTERED_LEVEL - 1, topic_id])
+
+    # --- 4. ĐỌC TIẾN ĐỘ ---
+    @staticmethod
+    def get_topic_progress(user, topic_id):
+        """% số từ đã thuộc của topic (đọc 1 dòng theo unique index)"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT mastered_count, total_count FROM study_usertopicprogress
+                WHERE user_id = %s AND topic_id = %s
+            """, [user.id, topic_id])
+            row = cursor.fetchone()
+            if not row or not row[1]:
+                return 0
+            return int((row[0] / row[1]) * 100)
+
+    @staticmethod
+    def get_topic_list_version(user):
+        """
+        Version của trang danh sách topic (ETag), 1 câu SQL: topic (số lượng + lần sửa cuối),
+        checksum các dòng tiến độ của user (đọc theo index user_id) và số thẻ đến hạn.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM study_topic),
+                    (SELECT MAX(updated_at) FROM study_topic),
+                    (SELECT COALESCE(BIT_XOR(CRC32(CONCAT_WS(',', topic_id, mastered_count, learning_count, total_count))), 0)
+                     FROM study_usertopicprogress WHERE user_id = %s),
+                    (SELECT COUNT(*) FROM study_flashcard WHERE user_id = %s AND due_at <= NOW())
+            """, [user.id, user.id])
+            return cursor.fetchone()
+
+    # --- 5. TÍNH LẠI TỪ ĐẦU ---
+    @staticmethod
+    def rebuild_topic_progress(topic_id=None):
+        """
+        Tính lại bảng tiến độ từ study_flashcard (toàn bộ hoặc 1 topic).
+        Trả về số dòng tiến độ sau khi tính lại.
+        """
+        topic_filter = "WHERE v.topic_id = %s" if topic_id else ""
+        params = [MASTERED_LEVEL, MASTERED_LEVEL - 1] + ([topic_id] if topic_id else [])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if topic_id:
+                cursor.execute("DELETE FROM study_usertopicprogress WHERE topic_id = %s", [topic_id])
+            else:
+                cursor.execute("DELETE FROM study_usertopicprogress")
+
+            cursor.execute(f"""
+                INSERT INTO study_usertopicprogress (user_id, topic_id, mastered_count, learning_count, total_count)
+                SELECT
+                    fc.user_id,
+                    v.topic_id,
+                    SUM(fc.mastery_level >= %s),
+                    SUM(fc.mastery_level BETWEEN 1 AND %s),
+                    tc.total
+                FROM study_flashcard fc
+                JOIN study_vocabulary v ON fc.vocabulary_id = v.id
+                JOIN (
+                    SELECT topic_id, COUNT(*) as total FROM study_vocabulary GROUP BY topic_id
+                ) tc ON tc.topic_id = v.topic_id
+                {topic_filter}
+                GROUP BY fc.user_id, v.topic_id, tc.total
+            """, params)
+            return cursor.rowcount
@@ -0,0 +1,96 @@
+"""
+Dữ liệu câu hỏi tính sẵn cho Vocabulary / Topic (lưu cùng dòng, tính lại khi admin lưu)
+- masked_example: câu ví dụ đã che từ (kể cả dạng chia: cats, studied, making...)
+- answer_forms: các dạng đáp án được chấp nhận, đã chuẩn hóa
+- audio_url / image_url: đường dẫn media đầy đủ
+
+Nhờ đó đường tạo câu hỏi và chấm điểm không phải xử lý chuỗi mỗi lần.
+"""
+import re
+
+from .similarity import normalize
+
+VOWELS = 'aeiou'
+
+
+def _third_person(word):
+    """Số nhiều / ngôi thứ 3: cat -> cats, box -> boxes, study -> studies"""
+    if word.endswith(('s', 'x', 'z', 'ch', 'sh')):
+        return word + 'es'
+    if word.endswith('y') and len(word) > 1 and word[-2] not in VOWELS:
+        return word[:-1] + 'ies'
+    return word + 's'
+
+
+def _doubles_final(word):
+    """Từ ngắn kết thúc phụ âm - nguyên âm - phụ âm: stop -> stopped, stopping"""
+    return (
+        len(word) >= 3 and len(word) <= 4
+        and word[-1] not in VOWELS + 'wxy' and word[-2] in VOWELS and word[-3] not in VOWELS
+    )
+
+
+def _past(word):
+    if word.endswith('e'):
+        return word + 'd'
+    if word.endswith('y') and len(word) > 1 and word[-2] not in VOWELS:
+        return word[:-1] + 'ied'
+    if _doubles_final(word):
+        return word + word[-1] + 'ed'
+    return word + 'ed'
+
+
+def _gerund(word):
+    if word.endswith('ie'):
+        return word[:-2] + 'ying'
+    if word.endswith('e') and not word.endswith('ee') and len(word) > 2:
+        return word[:-1] + 'ing'
+    if _doubles_final(word):
+        return word + word[-1] + 'ing'
+    return word + 'ing'
+
+
+def build_answer_forms(word):
+    """Dạng gốc + các dạng chia thường gặp (cụm từ: chia từ đầu tiên, vd. give up -> gives up)"""
+    base = normalize(word)
+    if not base:
+        return []
+    head, _, rest = base.partition(' ')
+    if not head.isalpha():
+        return [base]
+
+    forms = [base]
+    for inflect in (_third_person, _past, _gerund):
+        form = ' '.join(filter(None, [inflect(head), rest]))
+        if form not in forms:
+            forms.append(form)
+    return forms
+
+
+def build_masked_example(word, example, answer_forms):
+    """Che mọi dạng của từ trong câu ví dụ (đúng độ dài); không có câu ví dụ -> chỉ có chỗ trống"""
+    if not example:
+        return '_' * len(word)
+    # Dạng dài trước để "studies" không bị che thành "studie_"
+    forms = sorted(answer_forms or [normalize(word)], key=len, reverse=True)
+    # Không dùng \b: từ bắt đầu / kết thúc bằng ký tự không phải chữ ("etc.", "C++", "U.S.") không khớp \b
+    pattern = r'(?<!\w)(' + '|'.join(re.escape(form) for form in forms) + r')(?!\w)'
+    return re.sub(pattern, lambda match: '_' * len(match.group()), example, flags=re.IGNORECASE)
+
+
+def file_url(field_file):
+    """URL của file (qua storage, giống /media/<tên file>) hoặc '' nếu không có file"""
+    return field_file.url if field_file else ''
+
+
+# --- GÁN VÀO MODEL ---
+def fill_vocabulary_artifacts(vocabulary):
+    vocabulary.answer_forms = build_answer_forms(vocabulary.word)
+    vocabulary.masked_example = build_masked_example(
+        vocabulary.word, vocabulary.example_sentence, vocabulary.answer_forms
+    )
+    vocabulary.audio_url = file_url(vocabulary.audio)
+
+
+def fill_topic_artifacts(topic):
+    topic.image_url = file_url(topic.image)
@@ -0,0 +1,49 @@
+"""
+Thuật toán lặp lại ngắt quãng (Spaced Repetition) theo SM-2
+- Tính lần ôn tiếp theo (due_at) cho 1 thẻ sau mỗi lần trả lời
+- Đáp án chỉ có đúng/sai nên quy đổi sang điểm chất lượng (quality) của SM-2
+"""
+from datetime import timedelta
+
+MIN_EASE = 1.3
+
+# Quy đổi đúng/sai -> quality (0-5) của SM-2
+QUALITY_CORRECT = 4
+QUALITY_WRONG = 2
+
+# Trả lời sai -> ôn lại sau vài phút (không đợi sang ngày hôm sau)
+RELEARN_DELAY = timedelta(minutes=10)
+
+
+def schedule_review(is_correct, repetitions, interval_days, ease_factor, now):
+    """
+    Tính lịch ôn mới cho thẻ.
+    Trả về dict: repetitions, interval_days, ease_factor, due_at
+    """
+    quality = QUALITY_CORRECT if is_correct else QUALITY_WRONG
+
+    # Cập nhật độ dễ (ease) theo công thức SM-2
+    ease_factor = ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    ease_factor = max(MIN_EASE, ease_factor)
+
+    if quality >= 3:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease_factor, 2)
+        repetitions += 1
+        due_at = now + timedelta(days=interval_days)
+    else:
+        # Sai -> học lại từ đầu
+        repetitions = 0
+        interval_days = 0
+        due_at = now + RELEARN_DELAY
+
+    return {
+        'repetitions': repetitions,
+        'interval_days': interval_days,
+        'ease_factor': round(ease_factor, 2),
+        'due_at': due_at,
+    }
@@ -0,0 +1,203 @@
+"""
+Chỉ mục độ giống nhau giữa các từ vựng (trong bộ nhớ, mỗi process 1 bản)
+- Tìm K từ dễ nhầm nhất với 1 từ (theo cách viết + phiên âm) để làm đáp án nhiễu
+- Chấm đáp án chấp nhận lỗi gõ nhẹ (khoảng cách chỉnh sửa <= STUDY_TYPO_TOLERANCE)
+
+Chỉ mục trigram được tạo từ snapshot nội dung (content_snapshot.py), tạo lại
+khi snapshot có version mới (admin sửa từ vựng) - không cần truy vấn DB.
+"""
+import heapq
+import json
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .content_snapshot import get_content_snapshot
+
+
+def normalize(text):
+    """Chuẩn hóa để so sánh: bỏ khoảng trắng thừa, chữ thường"""
+    return ' '.join((text or '').split()).lower()
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance=None):
+    """
+    Khoảng cách Levenshtein giữa 2 chuỗi.
+    max_distance: dừng sớm khi chắc chắn vượt ngưỡng (trả về max_distance + 1)
+    """
+    if a == b:
+        return 0
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) < len(b):
+        a, b = b, a
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,                        # Xóa
+                current[j - 1] + 1,                     # Thêm
+                previous[j - 1] + (char_a != char_b),   # Thay
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class SimilarityIndex:
+
+    # Trigram xuất hiện ở quá nhiều từ (" th", "ing"...) không giúp lọc ứng viên -> bỏ qua
+    MAX_POSTING = 2000
+    # Tổng số id đọc từ posting cho 1 lần tìm (trigram hiếm trước) -> chi phí có trần, không phụ thuộc cỡ chỉ mục
+    SCAN_BUDGET = 1500
+    # Số ứng viên (tỉ lệ trigram chung cao nhất) được tính khoảng cách chỉnh sửa
+    CANDIDATES = 20
+
+    def __init__(self, rows, signature=None):
+        """rows: [(vocabulary_id, word, phonetic), ...]"""
+        self.signature = signature
+        self.entries = {}
+        self.word_ids = defaultdict(list)
+        self.postings = defaultdict(list)
+        self.gram_counts = {}
+        self._similar = {}
+
+        for vocabulary_id, word, phonetic in rows:
+            word, phonetic = normalize(word), normalize(phonetic).strip('/')
+            self.entries[vocabulary_id] = (word, phonetic)
+            self.word_ids[word].append(vocabulary_id)
+            grams = self._grams(word, phonetic)
+            self.gram_counts[vocabulary_id] = len(grams)
+            for gram in grams:
+                self.postings[gram].append(vocabulary_id)
+
+    @staticmethod
+    def _grams(word, phonetic):
+        grams = trigrams(word)
+        if phonetic:
+            # Tách không gian trigram của phiên âm khỏi trigram của cách viết
+            grams |= {'/' + gram for gram in trigrams(phonetic)}
+        return grams
+
+    def contains(self, word):
+        """word (đã chuẩn hóa) có phải 1 từ vựng không"""
+        return word in self.word_ids
+
+    def most_similar(self, vocabulary_id, k=3):
+        """K từ dễ nhầm nhất với từ vocabulary_id (khác cách viết), kết quả được nhớ lại"""
+        cached = self._similar.get(vocabulary_id)
+        if cached is not None and len(cached) >= k:
+            return cached[:k]
+        if vocabulary_id not in self.entries:
+            return []
+
+        word, phonetic = self.entries[vocabulary_id]
+        grams = self._grams(word, phonetic)
+        # Trigram hiếm lọc ứng viên tốt nhất -> đọc trước, dừng khi hết SCAN_BUDGET
+        postings = sorted(
+            (posting for posting in map(self.postings.get, grams)
+             if posting and len(posting) <= self.MAX_POSTING),
+            key=len,
+        )
+        counts = Counter()
+        budget = self.SCAN_BUDGET
+        for posting in postings:
+            if len(posting) > budget:
+                break
+            counts.update(posting)
+            budget -= len(posting)
+        # Bỏ chính nó và các từ trùng cách viết (cùng từ ở topic khác)
+        for same_id in self.word_ids[word]:
+            counts.pop(same_id, None)
+
+        # Ứng viên: tỉ lệ trigram chung (Dice) cao nhất -> không thiên vị từ dài
+        candidates = heapq.nlargest(
+            self.CANDIDATES, counts,
+            key=lambda candidate: counts[candidate] / (len(grams) + self.gram_counts[candidate]),
+        )
+
+        # Giữ K từ gần nhất (mỗi cách viết 1 lần); ứng viên chắc chắn xa hơn từ thứ K thì dừng tính sớm
+        top = []
+        for candidate in candidates:
+            cutoff = top[-1][0] if len(top) == k else None
+            distance = self._distance(word, phonetic, candidate, cutoff)
+            if cutoff is not None and (distance, candidate) >= top[-1]:
+                continue
+            candidate_word = self.entries[candidate][0]
+            same = [entry for entry in top if self.entries[entry[1]][0] == candidate_word]
+            if same:
+                if same[0] < (distance, candidate):
+                    continue
+                top.remove(same[0])
+            top.append((distance, candidate))
+            top.sort()
+            del top[k:]
+
+        result = [candidate for _, candidate in top]
+        self._similar[vocabulary_id] = result
+        return result
+
+    def _distance(self, word, phonetic, candidate, max_distance=None):
+        """Khoảng cách cách viết + phiên âm; vượt max_distance thì trả về max_distance + 1"""
+        candidate_word, candidate_phonetic = self.entries[candidate]
+        # Thiếu phiên âm -> tính cách viết 2 lần để không thiên vị từ không có phiên âm
+        if not (phonetic and candidate_phonetic):
+            if max_distance is None:
+                return edit_distance(word, candidate_word) * 2
+            return min(edit_distance(word, candidate_word, max_distance // 2) * 2, max_distance + 1)
+
+        distance = edit_distance(word, candidate_word, max_distance)
+        if max_distance is None:
+            return distance + edit_distance(phonetic, candidate_phonetic)
+        if distance > max_distance:
+            return max_distance + 1
+        return distance + edit_distance(phonetic, candidate_phonetic, max_distance - distance)
+
+
+# --- CHỈ MỤC DÙNG CHUNG CỦA PROCESS ---
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    snapshot = get_content_snapshot()
+    global _index
+    with _index_lock:
+        # signature = version của snapshot đã dùng để tạo chỉ mục
+        if _index is None or _index.signature != snapshot.version:
+            _index = SimilarityIndex(snapshot.iter_vocabulary(), snapshot.version)
+        return _index
+
+
+# --- CHẤM ĐÁP ÁN ---
+def is_answer_correct(user_answer, correct_word, answer_forms=None):
+    """
+    Đúng nếu khớp 1 trong các dạng đáp án (answer_forms tính sẵn, chuỗi JSON hoặc list),
+    hoặc sai tối đa STUDY_TYPO_TOLERANCE ký tự so với từ gốc
+    (từ dài ít nhất STUDY_TYPO_MIN_LENGTH) và đáp án không phải 1 từ vựng khác.
+    """
+    if isinstance(answer_forms, str):
+        answer_forms = json.loads(answer_forms)
+    answer = normalize(user_answer)
+    # Dữ liệu cũ chưa backfill -> chỉ so với từ gốc
+    forms = answer_forms or [normalize(correct_word)]
+    if answer in forms:
+        return True
+    word = forms[0]
+
+    tolerance = getattr(settings, 'STUDY_TYPO_TOLERANCE', 1)
+    if not tolerance or not answer or len(word) < getattr(settings, 'STUDY_TYPO_MIN_LENGTH', 5):
+        return False
+    if edit_distance(answer, word, tolerance) > tolerance:
+        return False
+    # "bat" không được tính là gõ nhầm "cat"
+    return not get_similarity_index().contains(answer)
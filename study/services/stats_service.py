@@ -2,11 +2,33 @@
 Service xử lý logic Thống kê (Statistics)
 - Thống kê tổng quan
 - Thống kê chi tiết
-- Log học tập
+- Log học tập + tổng hợp theo ngày + số lần sai của từng từ
+- Bộ đếm của user (số thẻ mỗi level, streak) cập nhật ngay khi trả lời
 """
-from django.db import connection
-from datetime import date, timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 from .utils import dictfetchall
+from .log_buffer import get_study_log_buffer
+from .content_snapshot import get_content_snapshot
+
+LEVELS = range(6)
+LEVEL_COLUMNS = [f'level_{level}' for level in LEVELS]
+STREAK_COLUMNS = ['current_streak', 'longest_streak', 'last_study_date']
+
+
+def compute_streaks(dates):
+    """
+    Tính streak từ danh sách ngày học (tăng dần, không trùng).
+    Trả về (streak kết thúc ở ngày học cuối, streak dài nhất, ngày học cuối)
+    """
+    current = longest = 0
+    previous = None
+    for d in dates:
+        current = current + 1 if previous and d - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = d
+    return current, longest, previous
 
 
 class StatsService:
@@ -14,28 +36,13 @@ class StatsService:
     # --- 1. THỐNG KÊ TỔNG QUAN ---
     @staticmethod
     def get_stats(user):
-        with connection.cursor() as cursor:
-            # Đếm xem mỗi level có bao nhiêu thẻ
-            cursor.execute("""
-                SELECT mastery_level, COUNT(id) as count
-                FROM study_flashcard
-                WHERE user_id = %s
-                GROUP BY mastery_level
-            """, [user.id])
-            
-            rows = cursor.fetchall()  # Trả về dạng [(0, 5), (1, 2)...]
+        # Đọc bộ đếm số thẻ mỗi level (1 dòng theo user_id)
+        values = StatsService.read_user_stats(user.id)
 
         # Xử lý kết quả cho Frontend
-        result = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        total_learned = 0
-        
-        for row in rows:
-            level = row[0]
-            count = row[1]
-            result[level] = count
-            if level > 0:
-                total_learned += count
-                
+        result = {level: values[f'level_{level}'] for level in LEVELS}
+        total_learned = sum(count for level, count in result.items() if level > 0)
+
         return {
             'level_counts': result,
             'total_learned': total_learned
@@ -44,97 +51,359 @@ class StatsService:
     # --- 2. LOG HỌC TẬP ---
     @staticmethod
     def log_answer(user, vocabulary_id, is_correct):
-        """Lưu log mỗi lần trả lời"""
+        """Lưu log mỗi lần trả lời (ghi theo lô qua bộ đệm, không chờ INSERT)"""
+        get_study_log_buffer().add([(user.id, vocabulary_id, is_correct, timezone.now())])
+
+    @staticmethod
+    def write_logs(rows):
+        """
+        Ghi 1 lô log vào study_studylog bằng 1 INSERT nhiều dòng
+        và cộng dồn vào bảng tổng hợp theo ngày (cùng transaction).
+        rows: [(user_id, vocabulary_id, is_correct, answered_at), ...]
+        """
+        if not rows:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Phải tính số từ mới trong ngày TRƯỚC khi INSERT log của lô này
+            rollups = StatsService._aggregate_daily(cursor, rows)
+
+            # mysqlclient gộp executemany thành 1 INSERT nhiều dòng
+            cursor.executemany("""
+                INSERT INTO study_studylog (user_id, vocabulary_id, is_correct, answered_at)
+                VALUES (%s, %s, %s, %s)
+            """, rows)
+
+            cursor.executemany("""
+                INSERT INTO study_dailystudyrollup (user_id, study_date, answer_count, correct_count, distinct_words)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    answer_count = answer_count + VALUES(answer_count),
+                    correct_count = correct_count + VALUES(correct_count),
+                    distinct_words = distinct_words + VALUES(distinct_words)
+            """, rollups)
+
+    @staticmethod
+    def _aggregate_daily(cursor, rows):
+        """
+        Gom 1 lô log theo (user, ngày).
+        Từ đã có log trước đó trong ngày thì không tính vào distinct_words.
+        (Ngày tính theo TIME_ZONE = UTC, giống DATE(answered_at) trong MySQL)
+        """
+        groups = {}
+        for user_id, vocabulary_id, is_correct, answered_at in rows:
+            study_date = timezone.localdate(answered_at)
+            group = groups.setdefault((user_id, study_date), {'answers': 0, 'correct': 0, 'words': set()})
+            group['answers'] += 1
+            group['correct'] += 1 if is_correct else 0
+            group['words'].add(vocabulary_id)
+
+        rollups = []
+        for (user_id, study_date), group in groups.items():
+            day_start = datetime.combine(study_date, time.min, tzinfo=timezone.get_current_timezone())
+            words = list(group['words'])
+            placeholders = ','.join(['%s'] * len(words))
+            cursor.execute(f"""
+                SELECT DISTINCT vocabulary_id FROM study_studylog
+                WHERE user_id = %s AND answered_at >= %s AND answered_at < %s
+                AND vocabulary_id IN ({placeholders})
+            """, [user_id, day_start, day_start + timedelta(days=1)] + words)
+            seen = {row[0] for row in cursor.fetchall()}
+            rollups.append((
+                user_id, study_date, group['answers'], group['correct'], len(group['words'] - seen)
+            ))
+        return rollups
+
+    @staticmethod
+    def rebuild_daily_rollup(user_id, start, end):
+        """
+        Tính lại rollup của 1 user từ study_studylog trong khoảng [start, end).
+        Ngày không còn log (đã lưu trữ) được giữ nguyên.
+        """
         with connection.cursor() as cursor:
             cursor.execute("""
-                INSERT INTO study_studylog (user_id, vocabulary_id, is_correct, answered_at)
-                VALUES (%s, %s, %s, NOW())
-            """, [user.id, vocabulary_id, is_correct])
+                INSERT INTO study_dailystudyrollup (user_id, study_date, answer_count, correct_count, distinct_words)
+                SELECT 
+                    user_id,
+                    DATE(answered_at),
+                    COUNT(*),
+                    SUM(is_correct),
+                    COUNT(DISTINCT vocabulary_id)
+                FROM study_studylog
+                WHERE user_id = %s AND answered_at >= %s AND answered_at < %s
+                GROUP BY user_id, DATE(answered_at)
+                ON DUPLICATE KEY UPDATE
+                    answer_count = VALUES(answer_count),
+                    correct_count = VALUES(correct_count),
+                    distinct_words = VALUES(distinct_words)
+            """, [user_id, start, end])
+            return cursor.rowcount
+
+    @staticmethod
+    def fill_missing_daily_rollup(user_id, start, end):
+        """
+        Tạo rollup cho các ngày trong [start, end) còn log nhưng chưa có dòng tổng hợp
+        (dữ liệu trước khi có bảng rollup). Ngày đã có dòng được giữ nguyên.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT IGNORE INTO study_dailystudyrollup (user_id, study_date, answer_count, correct_count, distinct_words)
+                SELECT 
+                    user_id,
+                    DATE(answered_at),
+                    COUNT(*),
+                    SUM(is_correct),
+                    COUNT(DISTINCT vocabulary_id)
+                FROM study_studylog
+                WHERE user_id = %s AND answered_at >= %s AND answered_at < %s
+                GROUP BY user_id, DATE(answered_at)
+            """, [user_id, start, end])
+            return cursor.rowcount
+
+    @staticmethod
+    def record_attempts(cursor, user_id, logs):
+        """
+        Cộng dồn số lần trả lời / sai của từng từ (trong transaction chấm điểm).
+        logs: [(user_id, vocabulary_id, is_correct, answered_at), ...] của 1 user
+        """
+        attempts = {}
+        for _, vocabulary_id, is_correct, answered_at in logs:
+            row = attempts.setdefault(vocabulary_id, [user_id, vocabulary_id, 0, 0, None])
+            row[2] += 1
+            if not is_correct:
+                row[3] += 1
+                row[4] = answered_at if row[4] is None else max(row[4], answered_at)
+        if not attempts:
+            return
+
+        cursor.executemany("""
+            INSERT INTO study_wordattemptstats (user_id, vocabulary_id, attempts, wrong_count, last_wrong_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                attempts = attempts + VALUES(attempts),
+                wrong_count = wrong_count + VALUES(wrong_count),
+                last_wrong_at = COALESCE(GREATEST(last_wrong_at, VALUES(last_wrong_at)), last_wrong_at, VALUES(last_wrong_at))
+        """, list(attempts.values()))
 
     # --- 3. THỐNG KÊ CHI TIẾT ---
     @staticmethod
     def get_detailed_stats(user):
-        """Lấy thống kê chi tiết"""
+        """Lấy thống kê chi tiết (đọc bảng tổng hợp theo ngày, không quét log)"""
+        today = timezone.localdate()
+
         with connection.cursor() as cursor:
             stats = {}
             
             # 1. Tổng quan
             cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_answers,
-                    SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct_answers
-                FROM study_studylog
+                SELECT SUM(answer_count), SUM(correct_count)
+                FROM study_dailystudyrollup
                 WHERE user_id = %s
             """, [user.id])
             row = cursor.fetchone()
-            stats['total_answers'] = row[0] or 0
-            stats['correct_answers'] = row[1] or 0
+            stats['total_answers'] = int(row[0] or 0)
+            stats['correct_answers'] = int(row[1] or 0)
             stats['accuracy'] = int((stats['correct_answers'] / stats['total_answers']) * 100) if stats['total_answers'] > 0 else 0
             
             # 2. Thống kê 7 ngày gần nhất
             cursor.execute("""
                 SELECT 
-                    DATE(answered_at) as study_date,
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct
-                FROM study_studylog
-                WHERE user_id = %s 
-                AND answered_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
-                GROUP BY DATE(answered_at)
+                    study_date,
+                    answer_count as total,
+                    correct_count as correct
+                FROM study_dailystudyrollup
+                WHERE user_id = %s AND study_date >= %s
                 ORDER BY study_date ASC
-            """, [user.id])
+            """, [user.id, today - timedelta(days=7)])
             stats['daily_stats'] = dictfetchall(cursor)
             
-            # 3. Từ hay sai nhất (top 5)
+            # 3. Từ hay sai nhất (top 5) -> đọc 5 dòng đầu của index (user_id, wrong_count)
             cursor.execute("""
                 SELECT 
-                    v.word,
-                    v.meaning_sentence,
-                    COUNT(*) as total_attempts,
-                    SUM(CASE WHEN sl.is_correct = 0 THEN 1 ELSE 0 END) as wrong_count
-                FROM study_studylog sl
-                JOIN study_vocabulary v ON sl.vocabulary_id = v.id
-                WHERE sl.user_id = %s
-                GROUP BY sl.vocabulary_id, v.word, v.meaning_sentence
-                HAVING wrong_count > 0
-                ORDER BY wrong_count DESC
+                    w.vocabulary_id,
+                    w.attempts as total_attempts,
+                    w.wrong_count
+                FROM study_wordattemptstats w
+                WHERE w.user_id = %s AND w.wrong_count > 0
+                ORDER BY w.wrong_count DESC
                 LIMIT 5
             """, [user.id])
-            stats['most_wrong'] = dictfetchall(cursor)
+            # Từ + nghĩa đọc từ snapshot nội dung
+            snapshot = get_content_snapshot()
+            stats['most_wrong'] = []
+            for row in dictfetchall(cursor):
+                vocabulary = snapshot.vocabulary(row['vocabulary_id'])
+                if vocabulary is not None:
+                    stats['most_wrong'].append(row | {
+                        'word': vocabulary['word'],
+                        'meaning_sentence': vocabulary['meaning_sentence'],
+                    })
             
-            # 4. Từ đã thuộc (level 5)
-            cursor.execute("""
-                SELECT COUNT(*) FROM study_flashcard
-                WHERE user_id = %s AND mastery_level = 5
-            """, [user.id])
-            stats['mastered_count'] = cursor.fetchone()[0]
-            
-            # 5. Tổng số từ đang học
+            # 4, 5, 6. Từ đã thuộc, tổng số từ, streak -> đọc từ bộ đếm của user
+            values = StatsService.read_user_stats(user.id)
+            stats['mastered_count'] = values['level_5']
+            stats['total_words'] = sum(values[column] for column in LEVEL_COLUMNS)
+            # Streak chỉ tính khi hôm nay có học
+            stats['streak'] = values['current_streak'] if values['last_study_date'] == today else 0
+
+            return stats
+
+    # --- 4. BỘ ĐẾM CỦA USER (UserStats) ---
+    @staticmethod
+    def read_user_stats(user_id):
+        """Đọc dòng bộ đếm của user (chưa có dòng -> toàn 0)"""
+        columns = LEVEL_COLUMNS + STREAK_COLUMNS
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {', '.join(columns)} FROM study_userstats WHERE user_id = %s
+            """, [user_id])
+            row = cursor.fetchone()
+        if not row:
+            return dict.fromkeys(columns, 0) | {'last_study_date': None}
+        return dict(zip(columns, row))
+
+    @staticmethod
+    def add_new_cards(cursor, user_id, count):
+        """
+        Tạo thẻ mới (level 0) cho user -> tạo dòng bộ đếm nếu chưa có.
+        Tạo cả khi count = 0 (topic chưa có từ): từ thêm sau (on_vocabulary_cards_added) và
+        các lần trả lời (apply_answer_stats) luôn có dòng để cộng vào.
+        """
+        cursor.execute("""
+            INSERT INTO study_userstats (user_id, level_0) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE level_0 = level_0 + VALUES(level_0)
+        """, [user_id, count])
+
+    @staticmethod
+    def apply_answer_stats(cursor, user_id, level_changes, study_dates):
+        """
+        Cập nhật bộ đếm trong transaction chấm điểm.
+        level_changes: [(old_level, new_level), ...]; study_dates: các ngày có trả lời trong lô
+        """
+        deltas = [0] * len(LEVEL_COLUMNS)
+        for old_level, new_level in level_changes:
+            deltas[old_level] -= 1
+            deltas[new_level] += 1
+
+        columns = ', '.join(LEVEL_COLUMNS + STREAK_COLUMNS)
+        placeholders = ', '.join(['%s'] * (len(LEVEL_COLUMNS) + len(STREAK_COLUMNS)))
+        level_sql = ', '.join(f"{column} = {column} + %s" for column in LEVEL_COLUMNS)
+        # Lô gửi muộn có thể gồm nhiều ngày -> xét streak lần lượt từng ngày
+        for study_date in sorted(study_dates):
+            # Chưa có dòng (dữ liệu cũ) -> tạo dòng thay vì UPDATE không khớp dòng nào, streak vẫn được ghi.
+            # Số thẻ mỗi level của dòng mới chưa đúng (không tính thẻ có từ trước): lệnh verify_user_stats --repair sửa
+            # MySQL gán các cột từ trái sang phải: current_streak so với last_study_date CŨ,
+            # longest_streak dùng current_streak MỚI
+            cursor.execute(f"""
+                INSERT INTO study_userstats (user_id, {columns})
+                VALUES (%s, {placeholders})
+                ON DUPLICATE KEY UPDATE
+                    {level_sql},
+                    current_streak = CASE
+                        WHEN last_study_date IS NULL THEN 1
+                        WHEN last_study_date >= %s THEN current_streak
+                        WHEN last_study_date = %s THEN current_streak + 1
+                        ELSE 1
+                    END,
+                    longest_streak = GREATEST(longest_streak, current_streak),
+                    last_study_date = GREATEST(COALESCE(last_study_date, %s), %s)
+            """, [user_id] + [max(delta, 0) for delta in deltas] + [1, 1, study_date]
+                + deltas + [study_date, study_date - timedelta(days=1), study_date, study_date])
+            deltas = [0] * len(LEVEL_COLUMNS)
+
+    @staticmethod
+    def reset_topic_levels(cursor, user_id, topic_id):
+        """Gọi TRƯỚC khi reset topic: chuyển số thẻ của topic về level 0"""
+        sums = ', '.join(f"SUM(fc.mastery_level = {level}) as l{level}" for level in LEVELS if level > 0)
+        moves = ', '.join(f"s.level_{level} = s.level_{level} - COALESCE(c.l{level}, 0)" for level in LEVELS if level > 0)
+        cursor.execute(f"""
+            UPDATE study_userstats s
+            JOIN (
+                SELECT SUM(fc.mastery_level > 0) as moved, {sums}
+                FROM study_flashcard fc
+                JOIN study_vocabulary v ON fc.vocabulary_id = v.id
+                WHERE fc.user_id = %s AND v.topic_id = %s
+            ) c
+            SET s.level_0 = s.level_0 + COALESCE(c.moved, 0), {moves}
+            WHERE s.user_id = %s
+        """, [user_id, topic_id, user_id])
+
+    @staticmethod
+    def on_vocabulary_cards_added(cursor, vocabulary_id, topic_id):
+        """
+        Gọi TRƯỚC khi tạo thẻ cho từ mới: +1 level 0 cho user của topic chưa có thẻ này
+        (user chưa có dòng bộ đếm -> tạo dòng)
+        """
+        cursor.execute("""
+            INSERT INTO study_userstats (user_id, level_0)
+            SELECT p.user_id, 1
+            FROM study_usertopicprogress p
+            LEFT JOIN study_flashcard fc ON fc.user_id = p.user_id AND fc.vocabulary_id = %s
+            WHERE p.topic_id = %s AND fc.id IS NULL
+            ON DUPLICATE KEY UPDATE level_0 = level_0 + VALUES(level_0)
+        """, [vocabulary_id, topic_id])
+
+    @staticmethod
+    def on_vocabulary_deleted(vocabulary_id):
+        """Gọi TRƯỚC khi xóa từ: trừ thẻ của từ khỏi level hiện tại của từng user"""
+        moves = ', '.join(f"s.{column} = s.{column} - (fc.mastery_level = {level})" for level, column in zip(LEVELS, LEVEL_COLUMNS))
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE study_userstats s
+                JOIN study_flashcard fc ON fc.user_id = s.user_id AND fc.vocabulary_id = %s
+                SET {moves}
+            """, [vocabulary_id])
+
+    # --- 5. KIỂM TRA / SỬA LỆCH BỘ ĐẾM ---
+    @staticmethod
+    def compute_user_stats(user_id, pending_dates=()):
+        """
+        Tính bộ đếm từ bảng gốc: study_flashcard (level) và study_dailystudyrollup (streak).
+        pending_dates: ngày học của log còn trong bộ đệm (bộ đếm đã tính, rollup chưa có)
+        """
+        values = dict.fromkeys(LEVEL_COLUMNS, 0)
+        with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT COUNT(*) FROM study_flashcard
+                SELECT mastery_level, COUNT(id) FROM study_flashcard
                 WHERE user_id = %s
-            """, [user.id])
-            stats['total_words'] = cursor.fetchone()[0]
-            
-            # 6. Streak (số ngày học liên tục)
+                GROUP BY mastery_level
+            """, [user_id])
+            for level, count in cursor.fetchall():
+                values[f'level_{level}'] = count
+
             cursor.execute("""
-                SELECT DISTINCT DATE(answered_at) as study_date
-                FROM study_studylog
+                SELECT study_date FROM study_dailystudyrollup
                 WHERE user_id = %s
-                ORDER BY study_date DESC
-            """, [user.id])
-            dates = [row[0] for row in cursor.fetchall()]
-            
-            streak = 0
-            today = date.today()
-            
-            for i, d in enumerate(dates):
-                expected_date = today - timedelta(days=i)
-                if d == expected_date:
-                    streak += 1
-                else:
-                    break
-            
-            stats['streak'] = streak
-            
-            return stats
+                ORDER BY study_date ASC
+            """, [user_id])
+            dates = sorted({row[0] for row in cursor.fetchall()} | set(pending_dates))
+
+        values.update(zip(STREAK_COLUMNS, compute_streaks(dates)))
+        return values
+
+    @staticmethod
+    def verify_user_stats(user_id, repair=False, pending_dates=()):
+        """
+        So sánh bộ đếm với bảng gốc. Trả về {cột: (đang lưu, đúng)} của các cột bị lệch.
+        repair=True -> ghi lại giá trị đúng (khóa dòng bộ đếm trong lúc tính).
+        pending_dates: ngày học của log chưa ghi xuống DB (log_buffer.pending_study_dates)
+        """
+        with transaction.atomic():
+            if repair:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT id FROM study_userstats WHERE user_id = %s FOR UPDATE", [user_id])
+            stored = StatsService.read_user_stats(user_id)
+            expected = StatsService.compute_user_stats(user_id, pending_dates)
+            drift = {
+                column: (stored[column], value)
+                for column, value in expected.items() if stored[column] != value
+            }
+
+            if drift and repair:
+                columns = list(expected)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"""
+                        INSERT INTO study_userstats (user_id, {', '.join(columns)})
+                        VALUES (%s, {', '.join(['%s'] * len(columns))})
+                        ON DUPLICATE KEY UPDATE {', '.join(f"{c} = VALUES({c})" for c in columns)}
+                    """, [user_id] + list(expected.values()))
+        return drift
@@ -4,6 +4,8 @@ Các service  được tách ra thành:
     - flashcard_service.py: FlashcardService
     - notebook_service.py: NotebookService  
     - stats_service.py: StatsService
+    - deck_service.py: DeckService
+    - progress_service.py: ProgressService
     - utils.py: Các hàm tiện ích
 
 """
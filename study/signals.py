@@ -0,0 +1,87 @@
+"""
+Signal cho app study
+- Admin thêm/sửa từ vựng -> tạo thẻ cho các user đã học topic
+- Giữ bảng tiến độ (UserTopicProgress) và bộ đếm (UserStats) đúng khi thêm/xóa/chuyển topic từ vựng
+- Publish lại snapshot nội dung (và chỉ mục từ dễ nhầm tạo từ nó) khi Topic / Vocabulary thay đổi
+- Tính sẵn dữ liệu câu hỏi (câu ví dụ đã che từ, dạng đáp án, URL media) khi lưu
+- Chuyển mã audio mới upload thành các bản nhỏ gọn (Opus / MP3, cùng độ to)
+"""
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Topic, Vocabulary
+from .services import FlashcardService, ProgressService, StatsService
+from .services.question_artifacts import fill_topic_artifacts, fill_vocabulary_artifacts
+from .services.audio_variants import refresh_audio_variants
+from .services.content_snapshot import publish_content_snapshot
+
+
+@receiver(pre_save, sender=Vocabulary)
+def remember_old_topic(sender, instance, **kwargs):
+    # Lưu topic cũ để biết từ có bị chuyển sang topic khác không
+    instance._old_topic_id = None
+    if instance.pk:
+        instance._old_topic_id = (
+            Vocabulary.objects.filter(pk=instance.pk).values_list('topic_id', flat=True).first()
+        )
+
+
+@receiver(pre_save, sender=Vocabulary)
+def build_vocabulary_artifacts(sender, instance, **kwargs):
+    fill_vocabulary_artifacts(instance)
+
+
+@receiver(post_save, sender=Vocabulary)
+def transcode_vocabulary_audio(sender, instance, **kwargs):
+    # Sau khi lưu: file upload đã được ghi vào storage (tên file cuối cùng)
+    refresh_audio_variants(instance)
+
+
+@receiver(pre_save, sender=Topic)
+def build_topic_artifacts(sender, instance, **kwargs):
+    fill_topic_artifacts(instance)
+
+
+@receiver(post_save, sender=Vocabulary)
+def sync_cards_on_vocabulary_save(sender, instance, created, **kwargs):
+    old_topic_id = getattr(instance, '_old_topic_id', None)
+    if created:
+        FlashcardService.sync_vocabulary_cards(instance.id, instance.topic_id)
+        ProgressService.on_vocabulary_added(instance.topic_id)
+    elif old_topic_id and old_topic_id != instance.topic_id:
+        # Chuyển topic (hiếm) -> tạo thẻ cho user của topic mới, tính lại tiến độ 2 topic
+        FlashcardService.sync_vocabulary_cards(instance.id, instance.topic_id)
+        ProgressService.rebuild_topic_progress(old_topic_id)
+        ProgressService.rebuild_topic_progress(instance.topic_id)
+
+
+@receiver(pre_delete, sender=Vocabulary)
+def update_progress_on_vocabulary_delete(sender, instance, **kwargs):
+    ProgressService.on_vocabulary_deleted(instance.id, instance.topic_id)
+    StatsService.on_vocabulary_deleted(instance.id)
+
+
+# Cờ của transaction đang mở trong thread này (mỗi thread 1 kết nối DB -> 1 transaction tại 1 thời điểm):
+# nội dung đã đổi, chưa publish
+_content_changed = threading.local()
+
+
+def _publish_changed_content():
+    # Các callback on_commit của 1 transaction chạy liền nhau: chỉ callback đầu tiên publish
+    if getattr(_content_changed, 'pending', False):
+        _content_changed.pending = False
+        publish_content_snapshot(bump=True)
+
+
+@receiver(post_save, sender=Vocabulary)
+@receiver(post_delete, sender=Vocabulary)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def republish_content_snapshot(sender, **kwargs):
+    # Publish sau khi commit (snapshot đọc dữ liệu đã commit); xóa nhiều dòng trong admin
+    # chỉ publish 1 lần cho cả transaction. Transaction bị rollback: cờ còn lại, publish ở lần commit sau
+    _content_changed.pending = True
+    transaction.on_commit(_publish_changed_content)
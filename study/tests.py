@@ -1,3 +1,773 @@
-from django.test import TestCase
+"""
+Kiểm tra số câu SQL và kế hoạch thực thi (EXPLAIN) của các service / view app study
+- Tạo bộ dữ liệu giả lập đủ lớn (nhiều user, topic, thẻ, log) để MySQL chọn index như production
+- Mỗi lời gọi có giới hạn số câu SQL (bắt lỗi N+1)
+- Mỗi câu SELECT/UPDATE/DELETE được EXPLAIN: bảng lớn mà quét toàn bảng hoặc filesort -> fail
 
-# Create your tests here.
+Các câu SQL trong service viết cho MySQL nên chỉ chạy khi DB test là MySQL.
+Phần cuối file: kiểm tra logic không cần SQL của MySQL (DB được thay bằng mock / cursor giả)
+-> chạy được với DB test nào cũng được.
+"""
+import glob
+import json
+import os
+import random
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Flashcard, Topic, UserStats, Vocabulary
+from .services import StudyService, dictfetchall
+from .services import log_buffer
+from .services.content_snapshot import publish_content_snapshot
+from .services.deck_service import DeckService
+from .services.log_buffer import StudyLogBuffer, pending_study_dates, replay_spool
+from .services.notebook_service import NotebookService
+from .services.question_artifacts import build_answer_forms, build_masked_example, fill_vocabulary_artifacts
+from .services.scheduler import MIN_EASE, RELEARN_DELAY, schedule_review
+from .services.similarity import get_similarity_index
+from .services.stats_service import StatsService
+
+# Bảng lớn (tăng theo số user x số từ / số câu trả lời): không được quét toàn bảng
+WATCHED_TABLES = {
+    'study_flashcard', 'study_studylog', 'study_dailystudyrollup',
+    'study_wordattemptstats', 'study_usertopicprogress', 'study_userstats',
+}
+# Câu do transaction.atomic lồng trong TestCase sinh ra, không tính vào giới hạn
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+SQL_KEYWORDS = {'WHERE', 'ON', 'SET', 'JOIN', 'LEFT', 'INNER', 'ORDER', 'GROUP', 'LIMIT', 'USING', 'FOR'}
+
+# Kích thước bộ dữ liệu giả lập
+USER_COUNT = 30
+TOPIC_COUNT = 10
+WORDS_PER_TOPIC = 100
+LOGS_PER_USER = 2000
+NOTEBOOK_WORDS = 50
+HISTORY_DAYS = 60
+
+
+@skipUnless(connection.vendor == 'mysql', "Service dùng SQL thuần của MySQL")
+class QueryBudgetTestCase(TestCase):
+
+    # --- 1. DỮ LIỆU GIẢ LẬP ---
+    @classmethod
+    def setUpClass(cls):
+        # Snapshot nội dung của bộ dữ liệu test ghi ra thư mục tạm, không đè snapshot thật
+        snapshot_dir = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(STUDY_CONTENT_SNAPSHOT_PATH=os.path.join(snapshot_dir, 'snapshot.bin')))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        now = timezone.now()
+        User = get_user_model()
+
+        User.objects.bulk_create([User(username=f'learner{i}') for i in range(USER_COUNT)])
+        users = list(User.objects.order_by('id'))
+        cls.user = users[0]
+
+        Topic.objects.bulk_create([Topic(title=f'Topic {i}') for i in range(TOPIC_COUNT)])
+        cls.topics = list(Topic.objects.order_by('id'))
+        # bulk_create không gửi signal -> không tự tạo thẻ, tự tính dữ liệu câu hỏi
+        vocabularies = [
+            Vocabulary(
+                topic=topic, word=f'word{topic.id}x{i}', definition='definition',
+                example_sentence=f'An example with word{topic.id}x{i} inside.',
+                meaning_sentence='nghĩa', audio=f'vocab_audio/{topic.id}_{i}.mp3' if i % 2 else '',
+            )
+            for topic in cls.topics for i in range(WORDS_PER_TOPIC)
+        ]
+        for vocabulary in vocabularies:
+            fill_vocabulary_artifacts(vocabulary)
+        Vocabulary.objects.bulk_create(vocabularies)
+        publish_content_snapshot()
+        vocab_ids = list(Vocabulary.objects.order_by('id').values_list('id', flat=True))
+
+        with connection.cursor() as cursor:
+            for user in users:
+                StudyService.sync_topic_cards(user, cls.topics[0].id)
+
+                cards = []
+                for vocabulary_id in vocab_ids:
+                    level = rng.randint(0, 5)
+                    due_at = now + timedelta(days=rng.randint(-10, 30))
+                    cards.append((user.id, vocabulary_id, level, due_at, due_at - timedelta(days=3)))
+                cursor.executemany("""
+                    INSERT INTO study_flashcard (user_id, vocabulary_id, mastery_level, due_at, last_reviewed)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE mastery_level = VALUES(mastery_level)
+                """, cards)
+
+                logs = [
+                    (user.id, rng.choice(vocab_ids), rng.random() < 0.7,
+                     now - timedelta(days=rng.randint(0, HISTORY_DAYS), seconds=rng.randint(0, 86400)))
+                    for _ in range(LOGS_PER_USER)
+                ]
+                cursor.executemany("""
+                    INSERT INTO study_studylog (user_id, vocabulary_id, is_correct, answered_at)
+                    VALUES (%s, %s, %s, %s)
+                """, logs)
+                StudyService.record_attempts(cursor, user.id, logs)
+
+                cursor.executemany("""
+                    INSERT IGNORE INTO study_notebookentry (user_id, vocabulary_id, note, added_at)
+                    VALUES (%s, %s, '', %s)
+                """, [(user.id, vocabulary_id, now) for vocabulary_id in rng.sample(vocab_ids, NOTEBOOK_WORDS)])
+
+            for user in users:
+                StudyService.rebuild_daily_rollup(user.id, now - timedelta(days=HISTORY_DAYS + 1), now + timedelta(days=1))
+                StudyService.verify_user_stats(user.id, repair=True)
+            StudyService.rebuild_topic_progress()
+
+            # Cập nhật thống kê index để optimizer chọn kế hoạch như trên dữ liệu thật
+            cursor.execute(f"ANALYZE TABLE {', '.join(sorted(WATCHED_TABLES))}")
+            cursor.fetchall()
+
+    # --- 2. KIỂM TRA SỐ CÂU SQL + EXPLAIN ---
+    @contextmanager
+    def assertQueryBudget(self, max_queries, allow_filesort=False):
+        """
+        Giới hạn số câu SQL trong khối lệnh và EXPLAIN từng câu.
+        allow_filesort: cho phép sort (chỉ dùng cho câu cố ý sắp xếp ngẫu nhiên 1 nhóm nhỏ)
+        """
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        statements = [
+            query['sql'] for query in context.captured_queries
+            if not query['sql'].lstrip().upper().startswith(IGNORED_PREFIXES)
+        ]
+        self.assertLessEqual(
+            len(statements), max_queries,
+            f"{len(statements)} câu SQL (tối đa {max_queries}):\n" + '\n'.join(statements)
+        )
+        for sql in statements:
+            self.assertUsesIndex(sql, allow_filesort)
+
+    def assertUsesIndex(self, sql, allow_filesort=False):
+        # executemany được ghi lại dạng "N times: ..." -> không EXPLAIN được
+        if not re.match(r'\s*(SELECT|UPDATE|DELETE|INSERT)\b', sql, re.IGNORECASE):
+            return
+
+        # EXPLAIN trả về alias (fc, v, ...) -> đổi lại thành tên bảng (ORM bọc tên trong ``)
+        aliases = {}
+        for table, alias in re.findall(r'(?:FROM|JOIN|UPDATE|INTO)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?', sql, re.IGNORECASE):
+            aliases[table] = table
+            if alias and alias.upper() not in SQL_KEYWORDS:
+                aliases[alias] = table
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql)
+            plan = dictfetchall(cursor)
+
+        for row in plan:
+            table = aliases.get(row['table'], row['table'])
+            if table not in WATCHED_TABLES:
+                continue
+            extra = row['Extra'] or ''
+            self.assertNotIn(
+                row['type'], ('ALL', 'index'),
+                f"Quét toàn bảng {table}:\n{sql}\n{plan}"
+            )
+            if not allow_filesort:
+                self.assertNotIn('Using filesort', extra, f"Filesort trên {table}:\n{sql}\n{plan}")
+
+
+class FlashcardServiceQueryTests(QueryBudgetTestCase):
+
+    def test_sync_topic_cards_after_first_open(self):
+        with self.assertQueryBudget(1):
+            self.assertEqual(StudyService.sync_topic_cards(self.user, self.topics[0].id), 0)
+
+    def test_due_cards(self):
+        with self.assertQueryBudget(1):
+            StudyService.get_due_cards(self.user)
+        with self.assertQueryBudget(1):
+            StudyService.count_due_cards(self.user)
+
+    def test_count_cards_to_learn(self):
+        with self.assertQueryBudget(1):
+            StudyService.count_cards_to_learn(self.user, self.topics[1].id)
+
+    def test_check_answers_batch(self):
+        cards = StudyService.get_due_cards(self.user, limit=20)
+        answers = [{'card_id': card['card_id'], 'user_answer': card['word']} for card in cards]
+        topics = {card['topic_id'] for card in cards}
+        # SELECT, UPDATE, tiến độ mỗi topic, bộ đếm user, số lần sai, phiên đang học
+        with self.assertQueryBudget(5 + len(topics)):
+            results = StudyService.check_answers_batch(self.user, answers)
+        self.assertTrue(all(result['is_correct'] for result in results))
+
+    def test_reset_topic_progress(self):
+        with self.assertQueryBudget(3):
+            StudyService.reset_topic_progress(self.user, self.topics[2].id)
+
+
+class DeckServiceQueryTests(QueryBudgetTestCase):
+
+    def test_topic_deck(self):
+        topic_id = self.topics[3].id
+        # Xếp bộ thẻ 1 lần: xáo trộn các thẻ của 1 topic (cố ý dùng RAND())
+        with self.assertQueryBudget(7, allow_filesort=True):
+            StudyService.next_card(self.user, StudyService.MODE_TOPIC, topic_id)
+        with self.assertQueryBudget(3):
+            StudyService.next_card(self.user, StudyService.MODE_TOPIC, topic_id)
+
+    def test_due_deck(self):
+        with self.assertQueryBudget(6):
+            StudyService.next_card(self.user, StudyService.MODE_DUE)
+        with self.assertQueryBudget(3):
+            StudyService.next_card(self.user, StudyService.MODE_DUE)
+
+    def test_prefetch_cards(self):
+        topic_id = self.topics[5].id
+        StudyService.next_card(self.user, StudyService.MODE_TOPIC, topic_id)
+        # Đọc phiên, đoạn card_queue, các thẻ, cập nhật vị trí đã gửi -> không phụ thuộc số thẻ tải trước
+        with self.assertQueryBudget(4):
+            cards, remaining = StudyService.next_cards(self.user, StudyService.MODE_TOPIC, topic_id, 10)
+        self.assertEqual(len(cards), 10)
+
+    def test_prefetched_cards_survive_reload(self):
+        topic_id = self.topics[7].id
+        first, _, _ = StudyService.next_card(self.user, StudyService.MODE_TOPIC, topic_id)
+        prefetched, _ = StudyService.next_cards(self.user, StudyService.MODE_TOPIC, topic_id, 5)
+        # Tải lại trang khi chưa trả lời: vẫn là thẻ cũ
+        card, _, _ = StudyService.next_card(self.user, StudyService.MODE_TOPIC, topic_id)
+        self.assertEqual(card['card_id'], first['card_id'])
+
+        # Chấm thẻ đầu + 2 thẻ tải trước -> học tiếp từ thẻ tải trước chưa trả lời đầu tiên
+        answered = [first] + [card for card, _ in prefetched[:2]]
+        StudyService.check_answers_batch(self.user, [
+            {'card_id': card['card_id'], 'user_answer': card['word']} for card in answered
+        ])
+        StudyService.next_cards(self.user, StudyService.MODE_TOPIC, topic_id, 5)
+        card, _, _ = StudyService.next_card(self.user, StudyService.MODE_TOPIC, topic_id)
+        self.assertEqual(card['card_id'], prefetched[2][0]['card_id'])
+
+    def test_mistakes_deck(self):
+        with self.assertQueryBudget(6):
+            StudyService.next_card(self.user, StudyService.MODE_MISTAKES)
+        with self.assertQueryBudget(3):
+            StudyService.next_card(self.user, StudyService.MODE_MISTAKES)
+
+
+class StatsServiceQueryTests(QueryBudgetTestCase):
+
+    def test_get_stats(self):
+        with self.assertQueryBudget(1):
+            StudyService.get_stats(self.user)
+
+    def test_get_detailed_stats(self):
+        with self.assertQueryBudget(4):
+            StudyService.get_detailed_stats(self.user)
+
+    def test_write_logs(self):
+        vocab_ids = list(Vocabulary.objects.values_list('id', flat=True)[:50])
+        now = timezone.now()
+        rows = [(self.user.id, vocabulary_id, True, now) for vocabulary_id in vocab_ids]
+        # 1 ngày của 1 user: SELECT từ đã học trong ngày, INSERT log, cập nhật rollup
+        with self.assertQueryBudget(3):
+            StudyService.write_logs(rows)
+
+    def test_verify_user_stats(self):
+        with self.assertQueryBudget(3):
+            self.assertEqual(StudyService.verify_user_stats(self.user.id), {})
+
+
+class NotebookServiceQueryTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        # Chỉ mục từ dễ nhầm tạo 1 lần cho cả process, không tính vào từng lời gọi
+        get_similarity_index()
+
+    def test_get_notebook(self):
+        with self.assertQueryBudget(1):
+            StudyService.get_notebook(self.user)
+
+    def test_review_deck(self):
+        # Xếp bộ câu hỏi 1 lần: đọc sổ tay, lưu phiên, đọc lại phiên (nội dung câu hỏi từ snapshot)
+        with self.assertQueryBudget(5):
+            first, _, _ = StudyService.next_notebook_question(self.user)
+        # Tải lại trang khi chưa trả lời: vẫn là câu cũ, không đọc lại sổ tay
+        with self.assertQueryBudget(2):
+            question, current, total = StudyService.next_notebook_question(self.user)
+        self.assertEqual((question['vocabulary_id'], current, total), (first['vocabulary_id'], 1, NOTEBOOK_WORDS))
+
+        # Nộp đáp án -> qua câu tiếp theo; nộp lại lần 2 không dời thêm
+        with self.assertQueryBudget(1):
+            self.assertTrue(StudyService.record_review_answer(self.user, first['vocabulary_id']))
+        self.assertFalse(StudyService.record_review_answer(self.user, first['vocabulary_id']))
+        question, current, total = StudyService.next_notebook_question(self.user)
+        self.assertNotEqual(question['vocabulary_id'], first['vocabulary_id'])
+        self.assertEqual((current, total), (2, NOTEBOOK_WORDS))
+
+
+class StudyViewQueryTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        get_similarity_index()
+
+    def assertViewBudget(self, url, max_queries, allow_filesort=False):
+        # Tính cả 2 câu đọc session + user của request
+        with self.assertQueryBudget(max_queries, allow_filesort):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_topic_list(self):
+        # +1 câu tính version (ETag) của trang
+        self.assertViewBudget(reverse('topic_list'), 5)
+
+    def test_topic_list_not_modified(self):
+        response = self.client.get(reverse('topic_list'))
+        # Trang không đổi -> 304, chỉ chạy câu tính version (không render lại)
+        with self.assertQueryBudget(3):
+            response = self.client.get(reverse('topic_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_study_session(self):
+        url = reverse('study_session', args=[self.topics[4].id])
+        self.assertViewBudget(url, 9, allow_filesort=True)
+        self.assertViewBudget(url, 5)
+
+    def test_review_due(self):
+        self.assertViewBudget(reverse('review_due'), 8)
+        self.assertViewBudget(reverse('review_due'), 5)
+
+    def test_next_questions(self):
+        self.client.get(reverse('study_session', args=[self.topics[6].id]))
+        url = reverse('next_questions') + f'?mode=topic&topic_id={self.topics[6].id}&count=10'
+        self.assertViewBudget(url, 6)
+
+    def test_review_mistakes(self):
+        self.assertViewBudget(reverse('review_mistakes'), 8)
+
+    def test_stats_pages(self):
+        self.assertViewBudget(reverse('dashboard'), 3)
+        self.assertViewBudget(reverse('detailed_stats'), 6)
+
+    def test_notebook(self):
+        self.assertViewBudget(reverse('notebook'), 3)
+        # Bắt đầu phiên mới: đóng phiên cũ rồi xếp bộ câu hỏi
+        self.assertViewBudget(reverse('notebook_review'), 8)
+        self.assertViewBudget(reverse('notebook_review') + '?continue=1', 4)
+
+
+@skipUnless(connection.vendor == 'mysql', "Service dùng SQL thuần của MySQL")
+class UserStatsTests(TestCase):
+
+    def setUp(self):
+        snapshot_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(STUDY_CONTENT_SNAPSHOT_PATH=os.path.join(snapshot_dir, 'snapshot.bin')))
+        self.user = get_user_model().objects.create_user(username='newcomer')
+
+    def test_first_topic_without_cards(self):
+        # Topic đầu tiên user mở chưa có từ nào -> vẫn tạo dòng bộ đếm
+        topic = Topic.objects.create(title='Empty')
+        self.assertEqual(StudyService.sync_topic_cards(self.user, topic.id), 0)
+        self.assertTrue(UserStats.objects.filter(user=self.user).exists())
+
+        # Từ thêm sau (signal tạo thẻ) và lần trả lời đầu tiên được cộng vào bộ đếm
+        vocabulary = Vocabulary.objects.create(topic=topic, word='apple', definition='a fruit')
+        publish_content_snapshot()
+        self.assertEqual(StudyService.read_user_stats(self.user.id)['level_0'], 1)
+
+        card_id = Flashcard.objects.get(user=self.user, vocabulary=vocabulary).id
+        StudyService.check_answers_batch(self.user, [{'card_id': card_id, 'user_answer': 'apple'}])
+        values = StudyService.read_user_stats(self.user.id)
+        self.assertEqual(sum(values[f'level_{level}'] for level in range(6)), 1)
+        self.assertEqual(values['current_streak'], 1)
+        self.assertEqual(values['last_study_date'], timezone.localdate())
+        self.assertEqual(StudyService.verify_user_stats(self.user.id), {})
+
+
+# --- KIỂM TRA KHÔNG CẦN MYSQL ---
+class FakeCursor:
+    """Cursor giả: ghi lại các câu SQL, fetchall() trả về dòng cho trước"""
+
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((' '.join(sql.split()), params))
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def deck(position, total=3, card_id=None, served_position=None):
+    """Dòng phiên như DeckService.get_active_session trả về"""
+    return {
+        'session_id': 7, 'position': position, 'total': total, 'card_id': card_id,
+        'served_position': position if served_position is None else served_position,
+    }
+
+
+class DeckServiceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.user = mock.Mock(id=1)
+        self.cursor = FakeCursor()
+        self.enterContext(mock.patch('study.services.deck_service.connection', cursor=lambda: self.cursor))
+
+    def updates(self):
+        return [params for sql, params in self.cursor.executed if sql.startswith('UPDATE')]
+
+    def test_answer_moves_position_past_furthest_answered_card(self):
+        # Đã gửi card_queue[2..4] = 11, 12, 13; chấm 12 -> position = 4 (13 vẫn chờ)
+        self.cursor = FakeCursor([(7, 2, '[11, 12, 13]')])
+        DeckService.record_answered_cards(self.cursor, 1, [12])
+        self.assertEqual(self.updates(), [[4, 7, 2]])
+
+    def test_single_served_card(self):
+        self.cursor = FakeCursor([(7, 0, '11')])
+        DeckService.record_answered_cards(self.cursor, 1, [11])
+        self.assertEqual(self.updates(), [[1, 7, 0]])
+
+    def test_unanswered_prefetch_keeps_position(self):
+        self.cursor = FakeCursor([(7, 2, '[11, 12]'), (8, 0, None)])
+        DeckService.record_answered_cards(self.cursor, 1, [99])
+        self.assertEqual(self.updates(), [])
+
+    def test_next_card_resumes_active_session(self):
+        with mock.patch.object(DeckService, 'get_active_session', return_value=deck(1, card_id=12)), \
+                mock.patch.object(DeckService, 'start_session') as start_session, \
+                mock.patch.object(DeckService, 'get_card', return_value={'card_id': 12}):
+            card, progress, remaining = DeckService.next_card(self.user, DeckService.MODE_TOPIC, 5)
+
+        start_session.assert_not_called()
+        self.assertEqual((card, progress, remaining), ({'card_id': 12}, 33, 1))
+        # Các thẻ tải trước sau thẻ này được gửi lại
+        self.assertEqual(self.updates(), [[7]])
+        self.assertIn('served_position = position + 1', self.cursor.executed[0][0])
+
+    def test_next_card_skips_deleted_card(self):
+        decks = [deck(0, card_id=11), deck(1, card_id=12)]
+        with mock.patch.object(DeckService, 'get_active_session', side_effect=decks), \
+                mock.patch.object(DeckService, 'get_card', side_effect=[None, {'card_id': 12}]):
+            card, progress, remaining = DeckService.next_card(self.user, DeckService.MODE_DUE)
+
+        self.assertEqual((card, progress, remaining), ({'card_id': 12}, 33, 1))
+        self.assertIn('SET position = position + 1', self.cursor.executed[0][0])
+
+    def test_next_card_ends_finished_deck(self):
+        with mock.patch.object(DeckService, 'get_active_session', return_value=None), \
+                mock.patch.object(DeckService, 'start_session', return_value=deck(3)) as start_session, \
+                mock.patch.object(DeckService, 'end_session') as end_session:
+            self.assertEqual(DeckService.next_card(self.user, DeckService.MODE_TOPIC, 5), (None, 100, 0))
+        start_session.assert_called_once_with(self.user, DeckService.MODE_TOPIC, 5)
+        end_session.assert_called_once_with(self.user, DeckService.MODE_TOPIC, 5)
+
+    def test_expire_sessions_in_id_batches(self):
+        self.cursor = FakeCursor(rows=[(2500,)], rowcount=4)
+        self.assertEqual(DeckService.expire_sessions(batch_size=1000), 12)
+
+        updates = self.cursor.executed[1:]
+        self.assertEqual([params[:2] for sql, params in updates], [[0, 1000], [1000, 2000], [2000, 3000]])
+        for sql, params in updates:
+            self.assertIn('card_queue = JSON_ARRAY()', sql)
+            self.assertIn('last_activity_at < %s', sql)
+
+
+class NotebookDeckTests(SimpleTestCase):
+
+    def setUp(self):
+        self.user = mock.Mock(id=1)
+        self.cursor = FakeCursor(rowcount=1)
+        self.enterContext(mock.patch('study.services.notebook_service.connection', cursor=lambda: self.cursor))
+
+    def notebook_deck(self, position, vocabulary_id, total=3):
+        return {'session_id': 7, 'position': position, 'served_position': position, 'total': total,
+                'item': {'id': vocabulary_id, 'type': 'fill_blank'}}
+
+    def test_question_is_served_again_until_answered(self):
+        question = {'vocabulary_id': 11}
+        with mock.patch.object(NotebookService, 'get_notebook_deck', return_value=self.notebook_deck(1, 11)), \
+                mock.patch.object(NotebookService, '_build_review_question', return_value=question):
+            self.assertEqual(NotebookService.next_notebook_question(self.user), (question, 2, 3))
+            self.assertEqual(NotebookService.next_notebook_question(self.user), (question, 2, 3))
+
+        # Chỉ đánh dấu đã gửi, position (câu đã trả lời) giữ nguyên
+        self.assertEqual(len(self.cursor.executed), 2)
+        for sql, params in self.cursor.executed:
+            self.assertIn('SET served_position = position + 1', sql)
+            self.assertNotIn('SET position', sql)
+
+    def test_skips_deleted_word(self):
+        decks = [self.notebook_deck(0, 10), self.notebook_deck(1, 11)]
+        with mock.patch.object(NotebookService, 'get_notebook_deck', side_effect=decks), \
+                mock.patch.object(NotebookService, '_build_review_question', side_effect=[None, {'vocabulary_id': 11}]):
+            question, current, total = NotebookService.next_notebook_question(self.user)
+
+        self.assertEqual((question, current, total), ({'vocabulary_id': 11}, 2, 3))
+        self.assertIn('SET position = position + 1', self.cursor.executed[0][0])
+
+    def test_finished_deck_ends_session(self):
+        with mock.patch.object(NotebookService, 'get_notebook_deck', return_value=self.notebook_deck(3, None)), \
+                mock.patch.object(DeckService, 'end_session') as end_session:
+            self.assertEqual(NotebookService.next_notebook_question(self.user), (None, 3, 3))
+        end_session.assert_called_once_with(self.user, DeckService.MODE_NOTEBOOK)
+
+    def test_answer_advances_only_served_question(self):
+        self.assertTrue(NotebookService.record_review_answer(self.user, 11))
+        [(sql, params)] = self.cursor.executed
+        self.assertIn('SET position = position + 1', sql)
+        self.assertIn('position < served_position', sql)
+        self.assertEqual(params, [1, DeckService.MODE_NOTEBOOK, 11])
+
+
+class ScheduleReviewTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def test_first_correct_answers(self):
+        first = schedule_review(True, 0, 0, 2.5, self.now)
+        self.assertEqual((first['repetitions'], first['interval_days']), (1, 1))
+        self.assertEqual(first['due_at'], self.now + timedelta(days=1))
+
+        second = schedule_review(True, 1, 1, first['ease_factor'], self.now)
+        self.assertEqual((second['repetitions'], second['interval_days']), (2, 6))
+        self.assertEqual(second['due_at'], self.now + timedelta(days=6))
+
+    def test_interval_grows_with_ease(self):
+        result = schedule_review(True, 2, 6, 2.5, self.now)
+        # quality 4: ease không đổi
+        self.assertEqual(result['ease_factor'], 2.5)
+        self.assertEqual(result['interval_days'], 15)
+        self.assertEqual(result['repetitions'], 3)
+
+    def test_wrong_answer_relearns(self):
+        result = schedule_review(False, 5, 40, 2.5, self.now)
+        self.assertEqual((result['repetitions'], result['interval_days']), (0, 0))
+        self.assertEqual(result['due_at'], self.now + RELEARN_DELAY)
+        self.assertLess(result['ease_factor'], 2.5)
+
+    def test_ease_has_lower_bound(self):
+        self.assertEqual(schedule_review(False, 0, 0, MIN_EASE, self.now)['ease_factor'], MIN_EASE)
+
+
+class StudyViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='learner', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post_answers(self, data):
+        return self.client.post(reverse('submit_answers_batch'), json.dumps(data), content_type='application/json')
+
+    def test_login_required(self):
+        self.client.logout()
+        for url in (reverse('topic_list'), reverse('review_due'), reverse('submit_answers_batch')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 302)
+                self.assertIn(reverse('login'), response['Location'])
+
+    def test_submit_answers_rejects_invalid_body(self):
+        too_many = {'answers': [{'card_id': 1, 'user_answer': 'a'}] * 201}
+        for data in ([1, 2], {'answers': 'abc'}, {'answers': [1]}, {'answers': [{'card_id': 1}, None]}, too_many):
+            with self.subTest(data=str(data)[:40]):
+                with mock.patch.object(StudyService, 'check_answers_batch') as check_answers_batch:
+                    response = self.post_answers(data)
+                self.assertEqual(response.status_code, 400)
+                check_answers_batch.assert_not_called()
+
+    def test_submit_answers(self):
+        answers = [{'card_id': 1, 'user_answer': 'cat'}]
+        with mock.patch.object(StudyService, 'check_answers_batch', return_value=[{'is_correct': True}]) as check:
+            response = self.post_answers({'answers': answers})
+        self.assertEqual(response.json(), {'results': [{'is_correct': True}]})
+        check.assert_called_once_with(self.user, answers)
+
+    def test_next_questions_rejects_invalid_query(self):
+        for query in ('?mode=topic', '?mode=topic&topic_id=x', '?mode=other', '?mode=due&count=abc'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(reverse('next_questions') + query).status_code, 400)
+
+    def test_notebook_review_submit_records_answer(self):
+        url = reverse('notebook_review_submit')
+        with mock.patch.object(StudyService, 'record_review_answer') as record_review_answer:
+            response = self.client.post(url, json.dumps({'vocabulary_id': '11', 'selected_id': 11}),
+                                        content_type='application/json')
+        self.assertEqual(response.json(), {'is_correct': True})
+        record_review_answer.assert_called_once_with(self.user, 11)
+
+        with mock.patch.object(StudyService, 'record_review_answer') as record_review_answer:
+            response = self.client.post(url, json.dumps({'selected_id': 11}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        record_review_answer.assert_not_called()
+
+
+class QuestionArtifactTests(SimpleTestCase):
+
+    def test_answer_forms(self):
+        self.assertEqual(build_answer_forms('Study'), ['study', 'studies', 'studied', 'studying'])
+        self.assertEqual(build_answer_forms('stop'), ['stop', 'stops', 'stopped', 'stopping'])
+        self.assertEqual(build_answer_forms('box'), ['box', 'boxes', 'boxed', 'boxing'])
+        self.assertIn('dying', build_answer_forms('die'))
+        self.assertIn('making', build_answer_forms('make'))
+
+    def test_answer_forms_of_phrase(self):
+        self.assertEqual(build_answer_forms('give  up')[:2], ['give up', 'gives up'])
+
+    def test_answer_forms_without_inflection(self):
+        self.assertEqual(build_answer_forms('etc.'), ['etc.'])
+        self.assertEqual(build_answer_forms('  '), [])
+
+    def test_masks_every_form(self):
+        forms = build_answer_forms('study')
+        self.assertEqual(
+            build_masked_example('study', 'She studies daily. Study hard!', forms),
+            'She _______ daily. _____ hard!',
+        )
+
+    def test_masks_word_with_punctuation(self):
+        self.assertEqual(
+            build_masked_example('etc.', 'Apples, pears, etc. are fruits.', build_answer_forms('etc.')),
+            'Apples, pears, ____ are fruits.',
+        )
+
+    def test_does_not_mask_inside_other_words(self):
+        self.assertEqual(
+            build_masked_example('cat', 'Concatenate the cat list.', build_answer_forms('cat')),
+            'Concatenate the ___ list.',
+        )
+
+    def test_no_example(self):
+        self.assertEqual(build_masked_example('apple', '', ['apple']), '_____')
+
+
+class StudyLogBufferTests(SimpleTestCase):
+
+    def setUp(self):
+        self.spool_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.write_logs = self.enterContext(mock.patch.object(StatsService, 'write_logs'))
+        self.answered_at = datetime(2026, 3, 1, 10, 30, tzinfo=dt_timezone.utc)
+
+    def make_buffer(self, **kwargs):
+        # max_age lớn: luồng nền không tự flush trong lúc kiểm tra
+        buffer = StudyLogBuffer(self.spool_dir, max_age=999, **kwargs)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def spool_files(self, pattern='studylog-*'):
+        return glob.glob(os.path.join(self.spool_dir, pattern))
+
+    def write_spool(self, name, rows):
+        with open(os.path.join(self.spool_dir, name), 'w', encoding='utf-8') as f:
+            for user_id, vocabulary_id in rows:
+                f.write(json.dumps({
+                    'user_id': user_id, 'vocabulary_id': vocabulary_id,
+                    'is_correct': True, 'answered_at': self.answered_at.isoformat(),
+                }) + '\n')
+
+    def test_add_spools_then_flush_writes_batch(self):
+        buffer = self.make_buffer()
+        buffer.add([(1, 10, True, self.answered_at), (1, 11, False, self.answered_at)])
+        # Log nằm trong file spool trước khi ghi DB
+        [path] = self.spool_files()
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.write_logs.assert_not_called()
+
+        self.assertEqual(buffer.flush(), 2)
+        self.write_logs.assert_called_once_with([
+            (1, 10, True, self.answered_at), (1, 11, False, self.answered_at),
+        ])
+        self.assertEqual(self.spool_files(), [])
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_failed_flush_keeps_segment_for_replay(self):
+        buffer = self.make_buffer()
+        buffer.add([(1, 10, True, self.answered_at)])
+        self.write_logs.side_effect = RuntimeError("DB lỗi")
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        self.assertEqual(len(self.spool_files('*.ready')), 1)
+
+        self.write_logs.side_effect = None
+        self.assertEqual(replay_spool(self.spool_dir), 1)
+        self.assertEqual(self.spool_files(), [])
+
+    def test_replay_skips_live_owner(self):
+        # Worker đã chết (PID không tồn tại) -> ghi bù; file của chính process này -> giữ nguyên
+        live = f'studylog-{log_buffer.process_token()}-live.jsonl'
+        self.write_spool('studylog-999999999.0x0-dead.jsonl', [(1, 10), (2, 11)])
+        self.write_spool(live, [(1, 12)])
+
+        self.assertEqual(replay_spool(self.spool_dir), 2)
+        self.assertEqual([os.path.basename(path) for path in self.spool_files()], [live])
+
+    def test_pending_study_dates(self):
+        buffer = self.make_buffer()
+        buffer.add([(1, 10, True, self.answered_at)])
+        self.write_spool('studylog-999999999.0x0-dead.jsonl.ready', [(2, 11)])
+        self.assertEqual(pending_study_dates(self.spool_dir), {
+            1: {timezone.localdate(self.answered_at)},
+            2: {timezone.localdate(self.answered_at)},
+        })
+
+    def test_replay_skips_partial_last_line(self):
+        self.write_spool('studylog-999999999.0x0-dead.jsonl', [(1, 10)])
+        with open(self.spool_files()[0], 'a', encoding='utf-8') as f:
+            f.write('{"user_id": 1, "vocab')
+        self.assertEqual(replay_spool(self.spool_dir), 1)
+
+
+class UserStatsSqlTests(SimpleTestCase):
+    """Dòng bộ đếm luôn được tạo (upsert), không UPDATE vào dòng có thể chưa tồn tại"""
+
+    def test_add_new_cards_without_cards(self):
+        cursor = FakeCursor()
+        StatsService.add_new_cards(cursor, 1, 0)
+        [(sql, params)] = cursor.executed
+        self.assertTrue(sql.startswith('INSERT INTO study_userstats'))
+        self.assertIn('ON DUPLICATE KEY UPDATE', sql)
+        self.assertEqual(params, [1, 0])
+
+    def test_answer_stats_upsert_row(self):
+        cursor = FakeCursor()
+        today = timezone.localdate()
+        StatsService.apply_answer_stats(cursor, 1, [(0, 1)], {today - timedelta(days=1), today})
+        self.assertEqual(len(cursor.executed), 2)
+        for sql, params in cursor.executed:
+            self.assertTrue(sql.startswith('INSERT INTO study_userstats'))
+            self.assertIn('ON DUPLICATE KEY UPDATE', sql)
+            self.assertEqual(sql.count('%s'), len(params))
+        # Dòng mới: không có số thẻ âm, streak bắt đầu từ ngày đầu tiên của lô
+        self.assertEqual(cursor.executed[0][1][:10], [1, 0, 1, 0, 0, 0, 0, 1, 1, today - timedelta(days=1)])
+        # Chênh lệch level chỉ cộng ở ngày đầu tiên
+        self.assertEqual(cursor.executed[1][1][10:16], [0] * 6)
+
+    def test_cards_added_for_users_without_row(self):
+        cursor = FakeCursor()
+        StatsService.on_vocabulary_cards_added(cursor, 10, 5)
+        [(sql, params)] = cursor.executed
+        self.assertTrue(sql.startswith('INSERT INTO study_userstats'))
+        self.assertEqual(params, [10, 5])
@@ -11,10 +11,26 @@ urlpatterns = [
     # URL: /study/1/ (Học topic có ID là 1)
     path('<int:topic_id>/', views.study_session, name='study_session'),
 
+    # Ôn các thẻ đến hạn (mọi topic)
+    # URL: /study/review/
+    path('review/', views.review_due, name='review_due'),
+
+    # Ôn lại các từ trả lời sai gần đây
+    # URL: /study/mistakes/
+    path('mistakes/', views.review_mistakes, name='review_mistakes'),
+
+    # Tải trước N câu hỏi tiếp theo của phiên (JSON) + danh sách audio cần tải trước
+    # URL: /study/next_questions/?mode=topic&topic_id=1&count=5
+    path('next_questions/', views.next_questions, name='next_questions'),
+
     # 3. API nhận đáp án (Dùng cho AJAX gửi lên, không phải trang để người dùng vào)
     # URL: /study/api/submit-answer/
     path('submit_answer/', views.submit_answer, name='submit_answer'),
 
+    # Gửi nhiều đáp án 1 lần (client gom đáp án rồi gửi theo lô)
+    # URL: /study/submit_answers/
+    path('submit_answers/', views.submit_answers_batch, name='submit_answers_batch'),
+
     # 4. Trang thống kê
     # URL: /study/dashboard/
     path('dashboard/', views.study_stats, name='dashboard'),
@@ -1,54 +1,58 @@
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
-from .models import Topic, Flashcard
+from django.db.models import Count, F, FilteredRelation, Max, Q
+from .models import Topic
 from django.contrib.auth.decorators import login_required
 import json
+from PKL_English.conditional import conditional_page
 from .services.study_service import StudyService
 # Create your views here.
 
+def topics_version(request):
+    """Version của danh sách topic: số topic (bắt được xóa) + lần sửa cuối"""
+    version = Topic.objects.aggregate(count=Count('id'), last_modified=Max('updated_at'))
+    return (version['count'], version['last_modified']), version['last_modified']
+
+def topic_list_version(request):
+    # Trang có tiến độ + số thẻ đến hạn của user (không có mốc thời gian) -> chỉ dùng ETag
+    return StudyService.get_topic_list_version(request.user), None
+
+@conditional_page(topics_version)
 def index(request):
     topics = Topic.objects.all()
     context = {'topics': topics}
     return render(request, 'index.html', context)
 
 @login_required
+@conditional_page(topic_list_version)
 def topic_list(request):
     """Display list of topics with user's progress"""
-    topics = Topic.objects.all()
+    # 1 query: LEFT JOIN bảng tiến độ của user (không đếm lại từng topic)
+    topics = Topic.objects.annotate(
+        my_progress=FilteredRelation('user_progress', condition=Q(user_progress__user=request.user)),
+        mastered=F('my_progress__mastered_count'),
+        total_vocab=F('my_progress__total_count'),
+    )
     topics_with_progress = []
     
     for topic in topics:
-        # Calculate progress for each topic
-        total_vocab = topic.vocabularies.count()
-        if total_vocab > 0:
-            mastered = Flashcard.objects.filter(
-                user=request.user,
-                vocabulary__topic=topic,
-                mastery_level__gte=3  # Consider mastered at level 3+
-            ).count()
-            progress = int((mastered / total_vocab) * 100)
+        # Consider mastered at level 3+
+        if topic.total_vocab:
+            topic.progress = int((topic.mastered / topic.total_vocab) * 100)
         else:
-            progress = 0
-        
-        # Add progress as an attribute to the topic object
-        topic.progress = progress
+            topic.progress = 0
         topics_with_progress.append(topic)
     
-    return render(request, 'study/topic_list.html', {'topics': topics_with_progress}) 
+    due_count = StudyService.count_due_cards(request.user)
+    return render(request, 'study/topic_list.html', {'topics': topics_with_progress, 'due_count': due_count}) 
 
 @login_required
 def study_session(request, topic_id):
-    # Lấy danh sách card đã học trong phiên từ session
-    session_key = f'studied_cards_{topic_id}'
-    studied_cards = request.session.get(session_key, [])
-    
-    # Lấy card tiếp theo (loại bỏ các card đã học)
-    card = StudyService.get_learning_card(request.user, topic_id, excluded_card_ids=studied_cards)
+    # Lấy thẻ tiếp theo từ bộ thẻ của phiên (phiên bỏ dở sẽ được học tiếp)
+    card, session_progress, remaining = StudyService.next_card(request.user, StudyService.MODE_TOPIC, topic_id)
     
     if not card:
-        # Hết bài -> xóa session và hiển thị kết quả
-        if session_key in request.session:
-            del request.session[session_key]
+        # Hết bộ thẻ -> phiên đã đóng, hiển thị kết quả
         stats = StudyService.get_stats(request.user)
         return render(request, 'study/finished.html', {
             'message': 'Bạn đã hoàn thành tất cả thẻ trong chủ đề này!',
@@ -56,15 +60,89 @@ def study_session(request, topic_id):
             'topic_id': topic_id
         })
     
-    # Tính progress trong phiên (số từ đã học / tổng số từ cần học)
-    total_cards = StudyService.count_cards_to_learn(request.user, topic_id)
-    session_progress = int((len(studied_cards) / total_cards) * 100) if total_cards > 0 else 0
-    
     question_data = StudyService.generate_question_data(card)
     return render(request, 'study/study_page.html', {
         'question': question_data,
+        'mode': StudyService.MODE_TOPIC,
         'topic_id': topic_id,
-        'progress': session_progress
+        'progress': session_progress,
+        'is_last_card': remaining == 0
+    })
+
+@login_required
+def review_due(request):
+    """Ôn các thẻ đến hạn (lịch SM-2) của mọi topic"""
+    card, session_progress, remaining = StudyService.next_card(request.user, StudyService.MODE_DUE)
+
+    if not card:
+        stats = StudyService.get_stats(request.user)
+        return render(request, 'study/finished.html', {
+            'message': 'Bạn đã ôn hết các thẻ đến hạn!',
+            'stats': stats,
+        })
+
+    question_data = StudyService.generate_question_data(card)
+    return render(request, 'study/study_page.html', {
+        'question': question_data,
+        'mode': StudyService.MODE_DUE,
+        'progress': session_progress,
+        'is_last_card': remaining == 0
+    })
+
+@login_required
+def review_mistakes(request):
+    """Ôn lại các từ trả lời sai gần đây"""
+    card, session_progress, remaining = StudyService.next_card(request.user, StudyService.MODE_MISTAKES)
+
+    if not card:
+        stats = StudyService.get_stats(request.user)
+        return render(request, 'study/finished.html', {
+            'message': 'Bạn đã ôn lại hết các từ sai gần đây!',
+            'stats': stats,
+        })
+
+    question_data = StudyService.generate_question_data(card)
+    return render(request, 'study/study_page.html', {
+        'question': question_data,
+        'mode': StudyService.MODE_MISTAKES,
+        'progress': session_progress,
+        'is_last_card': remaining == 0
+    })
+
+# Số câu hỏi tối đa cho 1 lần tải trước
+MAX_PREFETCH = 20
+
+@login_required
+def next_questions(request):
+    """
+    API tải trước N câu hỏi tiếp theo của phiên: ?mode=topic|due|mistakes&topic_id=&count=
+    Trả về câu hỏi (cùng dạng generate_question_data + progress) và danh sách audio cần tải trước.
+    Đáp án vẫn gửi về submit_answers để server chấm + ghi log.
+    """
+    mode = request.GET.get('mode', StudyService.MODE_TOPIC)
+    try:
+        count = min(max(int(request.GET.get('count', 5)), 1), MAX_PREFETCH)
+        topic_id = int(request.GET['topic_id']) if mode == StudyService.MODE_TOPIC else None
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Dữ liệu không hợp lệ'}, status=400)
+    if mode not in (StudyService.MODE_TOPIC, StudyService.MODE_DUE, StudyService.MODE_MISTAKES):
+        return JsonResponse({'status': 'error', 'message': 'Dữ liệu không hợp lệ'}, status=400)
+
+    cards, remaining = StudyService.next_cards(request.user, mode, topic_id, count)
+    questions = []
+    for card, progress in cards:
+        question = StudyService.generate_question_data(card)
+        question['progress'] = progress
+        questions.append(question)
+
+    # Mỗi file audio 1 lần, theo thứ tự câu hỏi; mỗi phần tử là các bản của 1 file (client chọn bản phát được)
+    audio_manifest = list({
+        question['audio']: question['audio_sources'] for question in questions if question['audio']
+    }.values())
+    return JsonResponse({
+        'questions': questions,
+        'audio_manifest': audio_manifest,
+        'remaining': remaining,
     })
 
 @login_required
@@ -72,19 +150,28 @@ def submit_answer(request):
     if request.method == 'POST':
         data = json.loads(request.body)
         card_id = data.get('card_id')
-        topic_id = data.get('topic_id')
-        
-        # Lưu card_id vào session (đánh dấu đã học)
-        if topic_id:
-            session_key = f'studied_cards_{topic_id}'
-            studied_cards = request.session.get(session_key, [])
-            if int(card_id) not in studied_cards:
-                studied_cards.append(int(card_id))
-                request.session[session_key] = studied_cards
 
         result = StudyService.check_answer(request.user, card_id, data.get('user_answer'))
         return JsonResponse(result)
 
+# Số đáp án tối đa cho 1 lần gửi theo lô
+MAX_ANSWER_BATCH = 200
+
+@login_required
+def submit_answers_batch(request):
+    """API chấm nhiều đáp án 1 lần: {"answers": [{card_id, user_answer, answered_at}, ...]}"""
+    if request.method == 'POST':
+        data = json.loads(request.body)
+        answers = (data.get('answers') or []) if isinstance(data, dict) else None
+        if (
+            not isinstance(answers, list) or len(answers) > MAX_ANSWER_BATCH
+            or not all(isinstance(answer, dict) for answer in answers)
+        ):
+            return JsonResponse({'status': 'error', 'message': 'Dữ liệu không hợp lệ'}, status=400)
+
+        results = StudyService.check_answers_batch(request.user, answers)
+        return JsonResponse({'results': results})
+
 @login_required
 def study_stats(request):
     stats = StudyService.get_stats(request.user)
@@ -135,51 +222,42 @@ def update_notebook(request):
 def reset_topic(request, topic_id):
     """Reset tiến độ học của 1 topic"""
     StudyService.reset_topic_progress(request.user, topic_id)
+    # Đóng phiên đang dở -> lần học sau xếp lại bộ thẻ
+    StudyService.end_session(request.user, StudyService.MODE_TOPIC, topic_id)
     return redirect('study_session', topic_id=topic_id)
 
 @login_required
 def notebook_review(request):
     """Ôn tập từ vựng trong sổ tay"""
-    # Kiểm tra có đủ từ để ôn không
-    total_reviewable = StudyService.count_notebook_reviewable(request.user)
-    if total_reviewable < 2:
+    # Nếu là request mới (không phải từ nextQuestion) -> bắt đầu phiên ôn tập mới
+    is_continuing = request.GET.get('continue', False)
+    if not is_continuing:
+        StudyService.end_session(request.user, StudyService.MODE_NOTEBOOK)
+
+    # Lấy câu hỏi tiếp theo từ bộ câu hỏi đã xếp sẵn của phiên
+    question, current, total = StudyService.next_notebook_question(request.user)
+
+    # Không đủ từ để ôn
+    if not total:
         return render(request, 'study/notebook_review.html', {
             'error': 'Cần ít nhất 2 từ có audio trong sổ tay để ôn tập!'
         })
-    
-    session_key = 'notebook_reviewed'
-    
-    # Nếu là request mới (không phải từ nextQuestion), reset session
-    # Kiểm tra qua tham số hoặc referer
-    is_continuing = request.GET.get('continue', False)
-    if not is_continuing:
-        # Xóa session cũ khi bắt đầu ôn tập mới
-        if session_key in request.session:
-            del request.session[session_key]
-    
-    # Lấy danh sách từ đã ôn trong phiên
-    reviewed_ids = request.session.get(session_key, [])
-    
-    # Lấy câu hỏi tiếp theo
-    question = StudyService.get_notebook_review_question(request.user, excluded_vocab_ids=reviewed_ids)
-    
+
     if not question:
-        # Hết câu hỏi -> xóa session
-        if session_key in request.session:
-            del request.session[session_key]
+        # Hết câu hỏi -> phiên đã đóng
         return render(request, 'study/notebook_review.html', {
             'finished': True,
-            'total_reviewed': len(reviewed_ids)
+            'total_reviewed': total
         })
-    
+
     # Tính progress
-    progress = int((len(reviewed_ids) / total_reviewable) * 100) if total_reviewable > 0 else 0
-    
+    progress = int(((current - 1) / total) * 100)
+
     return render(request, 'study/notebook_review.html', {
         'question': question,
         'progress': progress,
-        'current': len(reviewed_ids) + 1,
-        'total': total_reviewable
+        'current': current,
+        'total': total
     })
 
 @login_required
@@ -187,16 +265,12 @@ def notebook_review_submit(request):
     """API submit đáp án ôn tập"""
     if request.method == 'POST':
         data = json.loads(request.body)
-        vocab_id = data.get('vocabulary_id')
+        try:
+            vocab_id = int(data.get('vocabulary_id'))
+        except (AttributeError, TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Dữ liệu không hợp lệ'}, status=400)
         question_type = data.get('question_type', 'listening')
         
-        # Lưu vào session
-        session_key = 'notebook_reviewed'
-        reviewed_ids = request.session.get(session_key, [])
-        if int(vocab_id) not in reviewed_ids:
-            reviewed_ids.append(int(vocab_id))
-            request.session[session_key] = reviewed_ids
-        
         # Kiểm tra đáp án theo loại câu hỏi
         if question_type == 'fill_blank':
             user_answer = data.get('user_answer', '')
@@ -204,15 +278,13 @@ def notebook_review_submit(request):
         else:  # listening
             selected_id = data.get('selected_id')
             result = StudyService.check_review_answer(vocab_id, selected_id)
-        
+
+        # Câu chỉ tính là đã ôn khi nộp đáp án -> qua câu tiếp theo của phiên
+        StudyService.record_review_answer(request.user, vocab_id)
         return JsonResponse(result)
 
 @login_required
 def notebook_review_reset(request):
     """Reset phiên ôn tập"""
-    session_key = 'notebook_reviewed'
-    if session_key in request.session:
-        del request.session[session_key]
+    StudyService.end_session(request.user, StudyService.MODE_NOTEBOOK)
     return redirect('notebook_review')
-
-